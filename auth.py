@@ -6,119 +6,774 @@ Extended with Bot Ownership Management
 """
 import sqlite3
 import hashlib
+import hmac
+import base64
+import os
 import secrets
 import datetime
 from pathlib import Path
 import string
 import random
 import json
+import ast
+import threading
+import time
+import functools
+from collections import OrderedDict, defaultdict
 
-class AuthDB:
-    def __init__(self, db_path='data/users.db'):
+# SQLite connection pool settings
+DB_POOL_SIZE = 16                    # Max idle connections kept for reuse
+DB_POOL_MAX_OPEN = 64                # Max connections open at once (idle + in use)
+DB_POOL_TIMEOUT = 10.0               # Seconds acquire() waits for a free connection
+DB_BUSY_TIMEOUT = 5.0                # Seconds to wait on a locked database
+DB_CACHE_SIZE_KB = 16 * 1024         # Page cache per connection (16 MB)
+DB_MMAP_SIZE = 256 * 1024 * 1024     # Memory-mapped I/O window (256 MB)
+
+# Session cache settings
+SESSION_CACHE_SIZE = 10000           # Max cached sessions (LRU eviction)
+SESSION_CACHE_TTL = 60               # Seconds before a cached session is re-read
+
+# Signed bot token settings
+BOT_TOKEN_PREFIX = 'bt1'             # Marks HMAC-signed tokens (vs. legacy random tokens)
+BOT_TOKEN_SECRET_ENV = 'BOT_TOKEN_SECRET'
+BOT_TOKEN_GENERATION_TTL = 30        # Seconds a cached token generation is trusted
+
+# Expired session / reset token reaper settings
+REAP_BATCH_SIZE = 500                # Rows deleted per write transaction
+REAP_BATCH_PAUSE = 0.05              # Seconds to yield the write lock between batches
+
+# Password hashing settings (stored with each hash, so they can change later)
+PASSWORD_HASH_ALGORITHM = 'scrypt'   # 'scrypt' or 'pbkdf2_sha256'
+SCRYPT_N = 2 ** 14                   # CPU/memory cost
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+PASSWORD_HASH_WORKERS = 4            # OS threads used for hashing under gevent
+SCRYPT_MAXMEM_MARGIN = 1024 * 1024   # Headroom over scrypt's own memory need (bytes)
+
+
+def _sqlite_now():
+    """Current UTC time formatted like SQLite's CURRENT_TIMESTAMP"""
+    return datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ==================== PASSWORD HASHING ====================
+
+_hash_threadpool = None
+
+
+def _run_in_os_thread(func, *args):
+    """Run a CPU-bound call on a real OS thread.
+
+    Under gevent's monkey.patch_all() a plain call (or a patched
+    threading.Thread) would stall the hub and every Socket.IO
+    connection on it, so the work goes to a native gevent ThreadPool.
+    Without gevent (CLI, threading mode) the call runs inline.
+    """
+    global _hash_threadpool
+    
+    try:
+        from gevent import monkey
+    except ImportError:
+        return func(*args)
+    
+    if not monkey.is_module_patched('threading'):
+        return func(*args)
+    
+    if _hash_threadpool is None:
+        from gevent.threadpool import ThreadPool
+        _hash_threadpool = ThreadPool(PASSWORD_HASH_WORKERS)
+    
+    return _hash_threadpool.apply(func, args)
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode()
+
+
+def _derive_password_hash(password, algorithm, params, salt):
+    """Derive the raw key for one stored hash format"""
+    if algorithm == 'scrypt':
+        n, r, p = params
+        # OpenSSL refuses anything above 32 MiB unless told otherwise (n >= 2**15 with r=8)
+        maxmem = 128 * r * (n + p + 2) + SCRYPT_MAXMEM_MARGIN
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32, maxmem=maxmem)
+    if algorithm == 'pbkdf2_sha256':
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    raise ValueError(f'Unsupported password hash algorithm: {algorithm}')
+
+
+def _current_hash_params():
+    if PASSWORD_HASH_ALGORITHM == 'scrypt':
+        return (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return (PBKDF2_ITERATIONS,)
+
+
+def _hash_password_sync(password):
+    """Hash as '<algorithm>$<param>$...$<salt>$<hash>' with current settings"""
+    params = _current_hash_params()
+    salt = secrets.token_bytes(16)
+    derived = _derive_password_hash(password, PASSWORD_HASH_ALGORITHM, params, salt)
+    fields = [PASSWORD_HASH_ALGORITHM, *map(str, params), _b64encode(salt), _b64encode(derived)]
+    return '$'.join(fields)
+
+
+def _verify_password_sync(password, password_hash):
+    if '$' not in password_hash:
+        # Legacy unsalted SHA-256 hex digest
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, password_hash)
+    
+    algorithm, *fields = password_hash.split('$')
+    try:
+        params = tuple(int(value) for value in fields[:-2])
+        salt = base64.b64decode(fields[-2])
+        expected = base64.b64decode(fields[-1])
+        derived = _derive_password_hash(password, algorithm, params, salt)
+    except (ValueError, IndexError):
+        return False
+    
+    return hmac.compare_digest(derived, expected)
+
+
+class PooledConnection:
+    """Connection proxy handed out by ConnectionPool.
+
+    Behaves like sqlite3.Connection, but close() returns the underlying
+    connection to the pool instead of closing it.
+    """
+    
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._depth = 1
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def close(self):
+        self._pool.release(self)
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections.
+    
+    A greenlet/thread gets the same connection back for nested
+    acquire() calls (e.g. update_bot_info -> verify_bot_ownership),
+    and the connection goes back to the pool when the outermost
+    caller closes it. At most `max_size` idle and `max_open` total
+    connections exist; acquire() waits up to `timeout` seconds for
+    one to come back before raising sqlite3.OperationalError.
+    """
+    
+    def __init__(self, db_path, max_size=DB_POOL_SIZE, max_open=DB_POOL_MAX_OPEN,
+                 timeout=DB_POOL_TIMEOUT):
         self.db_path = db_path
-        Path('data').mkdir(exist_ok=True)
-        self.init_db()
+        self.max_size = max_size
+        self.max_open = max(max_open, 1)
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0                    # idle + checked out
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._local = threading.local()
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0, 'waits': 0}
     
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self):
+        """Open a new connection and apply per-connection PRAGMAs once"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        # Note: makes ON DELETE CASCADE effective (delete_user removes the user's bots)
+        conn.execute('PRAGMA foreign_keys = ON')
+        self.stats['opened'] += 1
         return conn
     
-    def init_db(self):
-        """Initialize database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def acquire(self):
+        """Get the connection for the current greenlet/thread"""
+        pooled = getattr(self._local, 'conn', None)
+        if pooled is not None:
+            pooled._depth += 1
+            return pooled
+        
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while not self._idle and self._open >= self.max_open:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        f'connection pool exhausted ({self.max_open} connections in use)')
+                self.stats['waits'] += 1
+                self._available.wait(remaining)
+            
+            raw = self._idle.pop() if self._idle else None
+            if raw is None:
+                self._open += 1
+        
+        if raw is None:
+            try:
+                raw = self._connect()
+            except BaseException:
+                self._forget()
+                raise
+        else:
+            self.stats['reused'] += 1
         
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                fullname TEXT,
-                phone TEXT,
-                birthday TEXT,
-                gender TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1,
-                role TEXT DEFAULT 'user'
-            )
-        ''')
+        pooled = PooledConnection(self, raw)
+        self._local.conn = pooled
+        return pooled
+    
+    def release(self, pooled):
+        """Return a connection once its outermost user closes it"""
+        raw = pooled._conn
+        if raw is None:
+            return
         
-        # Sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                session_token TEXT UNIQUE NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        pooled._depth -= 1
+        if pooled._depth > 0:
+            return
         
-        # Password reset tokens
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS password_resets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                token TEXT UNIQUE NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                used BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        pooled._conn = None
+        if getattr(self._local, 'conn', None) is pooled:
+            self._local.conn = None
         
+        try:
+            # Don't leak an unfinished transaction into the next borrower
+            if raw.in_transaction:
+                raw.rollback()
+        except sqlite3.Error:
+            raw.close()
+            self._forget()
+            return
+        
+        with self._available:
+            if len(self._idle) < self.max_size:
+                self._idle.append(raw)
+                self._available.notify()
+                return
+        
+        self.stats['discarded'] += 1
+        raw.close()
+        self._forget()
+    
+    def _forget(self):
+        """Account for a connection that was closed instead of returned"""
+        with self._available:
+            self._open -= 1
+            self._available.notify()
+    
+    def depth(self):
+        """Nesting depth of the current greenlet/thread's connection (0 if none)"""
+        pooled = getattr(self._local, 'conn', None)
+        return pooled._depth if pooled is not None else 0
+    
+    def unwind(self, depth=0):
+        """Release the current connection down to `depth` nested users.
+        
+        Reaching 0 rolls back any open transaction and unpins the
+        connection, whatever a caller that raised left behind.
+        """
+        pooled = getattr(self._local, 'conn', None)
+        while pooled is not None and pooled._conn is not None and pooled._depth > depth:
+            self.release(pooled)
+    
+    def close_all(self):
+        """Close every idle connection"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._available.notify_all()
+        
+        for conn in idle:
+            conn.close()
+
+
+def _pooled(method):
+    """Give back the pooled connection however an AuthDB method exits.
+    
+    The methods close their connection on the normal path; this is the
+    finally clause, so an exception can't leave the connection pinned to
+    the greenlet with an open transaction.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = self.pool.depth()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.pool.unwind(depth)
+    return wrapper
+
+
+class SessionCache:
+    """LRU + TTL cache of validated sessions, keyed by session_token.
+
+    Entries hold the user dict and the session's expires_at, so an
+    expired session is rejected without touching SQLite. The TTL bounds
+    how long a cached user can lag behind the database.
+    """
+    
+    def __init__(self, max_size=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (user, expires_at, cached_at)
+        self._tokens_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def _remove(self, session_token):
+        entry = self._entries.pop(session_token, None)
+        if entry is None:
+            return False
+        
+        user_id = entry[0]['id']
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+        return True
+    
+    def get(self, session_token):
+        """Return a copy of the cached user, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(session_token)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            user, expires_at, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl or str(expires_at) <= _sqlite_now():
+                self._remove(session_token)
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(session_token)
+            self.hits += 1
+            return dict(user)
+    
+    def put(self, session_token, user, expires_at):
+        """Cache a validated session"""
+        with self._lock:
+            self._remove(session_token)
+            self._entries[session_token] = (dict(user), expires_at, time.monotonic())
+            self._tokens_by_user[user['id']].add(session_token)
+            
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def invalidate(self, session_token):
+        """Drop a single session"""
+        with self._lock:
+            if self._remove(session_token):
+                self.invalidations += 1
+    
+    def invalidate_user(self, user_id):
+        """Drop every cached session of a user"""
+        with self._lock:
+            for session_token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(session_token)
+                self.invalidations += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+    
+    def get_stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+# ==================== BOT DATA STORAGE ====================
+
+# Bot data collections stored as one row per entity (bot_id, entity_id)
+BOT_DATA_TABLES = {'groups': 'bot_groups', 'friends': 'bot_friends'}
+DATA_HASH_MODULUS = 2 ** 256
+SQL_IN_CHUNK = 500                   # Max bound variables per IN (...) query
+
+
+def _canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _chunks(items, size=SQL_IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _parse_bot_metadata(text):
+    """bots.metadata as a dict (stored as JSON or as a Python dict repr)"""
+    if not text:
+        return {}
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _metadata_has_tag(metadata, tag):
+    tags = metadata.get('tags')
+    if isinstance(tags, str):
+        tags = [tags]
+    return tag in (tags or ()) or metadata.get('tag') == tag
+
+
+def _entity_row(collection, entity):
+    """(entity_id, name, data, entity_hash) for one group/friend entry.
+
+    entity_hash = sha256("<collection>\n<entity_id>\n<canonical JSON>"),
+    and a bot's data_hash is the sum of its entity hashes mod 2**256,
+    so it can be updated incrementally from a delta.
+    """
+    data = _canonical_json(entity)
+    
+    if isinstance(entity, dict) and entity.get('id') is not None:
+        entity_id = str(entity['id'])
+    else:
+        entity_id = hashlib.sha1(data.encode()).hexdigest()[:16]
+    
+    name = entity.get('name') if isinstance(entity, dict) else None
+    if name is not None and not isinstance(name, str):
+        # Only the searchable column needs a string; data keeps the original value
+        name = str(name) if isinstance(name, (int, float)) else None
+    digest = hashlib.sha256(f'{collection}\n{entity_id}\n{data}'.encode()).hexdigest()
+    return entity_id, name, data, digest
+
+
+def _format_hash(value):
+    return f'{value % DATA_HASH_MODULUS:064x}'
+
+
+def _store_full_bot_data(cursor, bot_id, bot_data):
+    """Replace a bot's normalized groups/friends; returns the new data_hash.
+
+    Everything except the collections stays in bots.bot_data as a small
+    JSON object.
+    """
+    bot_data = bot_data if isinstance(bot_data, dict) else {}
+    total = 0
+    
+    for collection, table in BOT_DATA_TABLES.items():
+        rows = {}
+        for entity in bot_data.get(collection) or []:
+            row = _entity_row(collection, entity)
+            rows[row[0]] = row
+        
+        cursor.execute(f'DELETE FROM {table} WHERE bot_id = ?', (bot_id,))
+        cursor.executemany(f'''
+            INSERT INTO {table} (bot_id, entity_id, name, data, entity_hash)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(bot_id, *row) for row in rows.values()])
+        total += sum(int(row[3], 16) for row in rows.values())
+    
+    data_hash = _format_hash(total)
+    extra = {key: value for key, value in bot_data.items() if key not in BOT_DATA_TABLES}
+    
+    cursor.execute('''
+        UPDATE bots SET bot_data = ?, data_hash = ?
+        WHERE id = ?
+    ''', (json.dumps(extra), data_hash, bot_id))
+    
+    return data_hash
+
+
+def _migrate_bot_data_blobs(cursor):
+    """Move existing bots.bot_data blobs into bot_groups/bot_friends"""
+    cursor.execute('SELECT id, bot_data FROM bots WHERE bot_data IS NOT NULL')
+    
+    for bot in cursor.fetchall():
+        try:
+            data = json.loads(bot['bot_data'])
+        except ValueError:
+            continue
+        _store_full_bot_data(cursor, bot['id'], data)
+
+
+# Schema migrations, applied in order by AuthDB.migrate() and tracked
+# with PRAGMA user_version. A step is a list of SQL statements and/or
+# callables taking a cursor. Never edit a released step - append a new one.
+SCHEMA_MIGRATIONS = [
+    (1, 'Base tables', [
+        # Users table
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            fullname TEXT,
+            phone TEXT,
+            birthday TEXT,
+            gender TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            role TEXT DEFAULT 'user'
+        )
+        ''',
+        # Sessions table
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_token TEXT UNIQUE NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''',
+        # Password reset tokens
+        '''
+        CREATE TABLE IF NOT EXISTS password_resets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token TEXT UNIQUE NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            used BOOLEAN DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        ''',
         # Bots table - Lưu thông tin bot
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bots (
-                id TEXT PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                status TEXT DEFAULT 'offline',
-                bot_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP,
-                metadata TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        ''')
-        
+        '''
+        CREATE TABLE IF NOT EXISTS bots (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT DEFAULT 'offline',
+            bot_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP,
+            metadata TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        ''',
         # Bot access tokens - Để xác thực bot khi kết nối
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bot_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                bot_id TEXT NOT NULL,
-                token TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_used TIMESTAMP,
-                FOREIGN KEY (bot_id) REFERENCES bots(id) ON DELETE CASCADE
-            )
-        ''')
+        '''
+        CREATE TABLE IF NOT EXISTS bot_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot_id TEXT NOT NULL,
+            token TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used TIMESTAMP,
+            FOREIGN KEY (bot_id) REFERENCES bots(id) ON DELETE CASCADE
+        )
+        ''',
+        # Bot token generations - Bumped to revoke signed bot tokens
+        '''
+        CREATE TABLE IF NOT EXISTS bot_token_generations (
+            bot_id TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (bot_id) REFERENCES bots(id) ON DELETE CASCADE
+        )
+        ''',
+        # Server secrets (HMAC keys)
+        '''
+        CREATE TABLE IF NOT EXISTS server_secrets (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (2, 'Indexes for per-user lookups and session/reset purges', [
+        'CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_bots_user_created ON bots(user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_bot_tokens_bot_id ON bot_tokens(bot_id)',
+        'CREATE INDEX IF NOT EXISTS idx_password_resets_user_id ON password_resets(user_id)',
+    ]),
+    (3, 'Normalized bot groups/friends with a content hash', [
+        '''
+        CREATE TABLE IF NOT EXISTS bot_groups (
+            bot_id TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            name TEXT,
+            data TEXT NOT NULL,
+            entity_hash TEXT NOT NULL,
+            PRIMARY KEY (bot_id, entity_id),
+            FOREIGN KEY (bot_id) REFERENCES bots(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bot_friends (
+            bot_id TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            name TEXT,
+            data TEXT NOT NULL,
+            entity_hash TEXT NOT NULL,
+            PRIMARY KEY (bot_id, entity_id),
+            FOREIGN KEY (bot_id) REFERENCES bots(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        ''',
+        'ALTER TABLE bots ADD COLUMN data_hash TEXT',
+        _migrate_bot_data_blobs,
+    ]),
+    (4, 'Durable bot command queue', [
+        # Not tied to bots(id): legacy in-memory bots receive commands too
+        '''
+        CREATE TABLE IF NOT EXISTS commands (
+            id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            bot_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            body TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_commands_open
+        ON commands(seq) WHERE status IN ('pending', 'dispatched')
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_commands_bot ON commands(bot_id, seq)',
+    ]),
+    (5, 'Scheduled commands are open too', [
+        'DROP INDEX IF EXISTS idx_commands_open',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_commands_open
+        ON commands(seq) WHERE status IN ('scheduled', 'pending', 'dispatched')
+        ''',
+    ]),
+    (6, 'Purge index for closed commands', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_commands_closed
+        ON commands(updated_at) WHERE status NOT IN ('scheduled', 'pending', 'dispatched')
+        ''',
+    ]),
+]
+
+
+class AuthDB:
+    def __init__(self, db_path='data/users.db', pool_size=DB_POOL_SIZE):
+        self.db_path = db_path
+        Path('data').mkdir(exist_ok=True)
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
+        self.session_cache = SessionCache()
+        self.init_db()
         
-        conn.commit()
+        self._token_secret = self._load_token_secret()
+        self._token_generations = {}  # bot_id -> (generation, cached_at)
+        self._token_usage = {}        # bot_id -> last_used, flushed in batches
+        self._token_lock = threading.Lock()
+        
+        self.reap_stats = {'runs': 0, 'sessions': 0, 'password_resets': 0, 'last_run': None}
+    
+    def get_connection(self):
+        """Borrow a pooled connection (call close() to give it back)"""
+        return self.pool.acquire()
+    
+    def close(self):
+        """Close pooled connections"""
+        self.pool.close_all()
+    
+    def init_db(self):
+        """Initialize database tables"""
+        self.migrate()
+    
+    @_pooled
+    def get_schema_version(self):
+        """Current schema version (PRAGMA user_version)"""
+        conn = self.get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
         conn.close()
+        return version
+    
+    @_pooled
+    def migrate(self):
+        """Apply pending SCHEMA_MIGRATIONS, one transaction per step"""
+        conn = self.get_connection()
+        applied = []
+        
+        try:
+            for version, description, statements in SCHEMA_MIGRATIONS:
+                # BEGIN IMMEDIATE takes the write lock before re-checking the
+                # version, so concurrent processes never apply a step twice
+                conn.execute('BEGIN IMMEDIATE')
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                
+                if current >= version:
+                    conn.rollback()
+                    continue
+                
+                try:
+                    cursor = conn.cursor()
+                    for statement in statements:
+                        if callable(statement):
+                            statement(cursor)
+                        else:
+                            cursor.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                
+                applied.append((version, description))
+        finally:
+            conn.close()
+        
+        return applied
     
     def hash_password(self, password):
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Hash password using the configured KDF (scrypt/PBKDF2)"""
+        return _run_in_os_thread(_hash_password_sync, password)
     
     def verify_password(self, password, password_hash):
         """Verify password against hash"""
-        return self.hash_password(password) == password_hash
+        return _run_in_os_thread(_verify_password_sync, password, password_hash)
+    
+    def password_needs_rehash(self, password_hash):
+        """True if a hash was made with an old algorithm or cost"""
+        if '$' not in password_hash:
+            return True
+        
+        algorithm, *fields = password_hash.split('$')
+        params = tuple(fields[:-2])
+        return (algorithm != PASSWORD_HASH_ALGORITHM
+                or params != tuple(map(str, _current_hash_params())))
     
     # ==================== USER MANAGEMENT ====================
     
+    @_pooled
     def create_user(self, username, email, password, fullname=None):
         """Create new user"""
+        # Hash before borrowing a connection (the KDF runs on the hash threadpool)
+        password_hash = self.hash_password(password)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            password_hash = self.hash_password(password)
             cursor.execute('''
                 INSERT INTO users (username, email, password_hash, fullname)
                 VALUES (?, ?, ?, ?)
@@ -137,6 +792,7 @@ class AuthDB:
         finally:
             conn.close()
     
+    @_pooled
     def authenticate(self, username_or_email, password):
         """Authenticate user and create session"""
         conn = self.get_connection()
@@ -149,15 +805,27 @@ class AuthDB:
         ''', (username_or_email, username_or_email))
         
         user = cursor.fetchone()
+        # Give the connection back before the (slow, threadpooled) hashing
+        conn.close()
         
         if not user:
-            conn.close()
             return {'success': False, 'error': 'Invalid credentials'}
         
         if not self.verify_password(password, user['password_hash']):
-            conn.close()
             return {'success': False, 'error': 'Invalid credentials'}
         
+        # Transparently upgrade legacy/outdated hashes on successful login
+        new_hash = None
+        if self.password_needs_rehash(user['password_hash']):
+            new_hash = self.hash_password(password)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if new_hash is not None:
+            cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                          (new_hash, user['id']))
+        
         # Create session token
         session_token = secrets.token_urlsafe(32)
         expires_at = datetime.datetime.now() + datetime.timedelta(days=7)
@@ -188,8 +856,13 @@ class AuthDB:
             }
         }
     
+    @_pooled
     def validate_session(self, session_token):
         """Validate session token and return user"""
+        cached = self.session_cache.get(session_token)
+        if cached is not None:
+            return cached
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -207,7 +880,7 @@ class AuthDB:
         if not user:
             return None
         
-        return {
+        result = {
             'id': user['id'],
             'username': user['username'],
             'email': user['email'],
@@ -217,7 +890,11 @@ class AuthDB:
             'gender': user['gender'],
             'role': user['role']
         }
+        self.session_cache.put(session_token, result, user['expires_at'])
+        
+        return result
     
+    @_pooled
     def logout(self, session_token):
         """Invalidate session"""
         conn = self.get_connection()
@@ -227,8 +904,11 @@ class AuthDB:
         conn.commit()
         conn.close()
         
+        self.session_cache.invalidate(session_token)
+        
         return {'success': True}
     
+    @_pooled
     def get_user_by_id(self, user_id):
         """Get user by ID"""
         conn = self.get_connection()
@@ -254,6 +934,7 @@ class AuthDB:
             'last_login': user['last_login']
         }
     
+    @_pooled
     def update_user(self, user_id, **kwargs):
         """Update user information"""
         conn = self.get_connection()
@@ -279,11 +960,13 @@ class AuthDB:
             cursor.execute(query, values)
             conn.commit()
             conn.close()
+            self.session_cache.invalidate_user(user_id)
             return {'success': True}
         except sqlite3.IntegrityError as e:
             conn.close()
             return {'success': False, 'error': str(e)}
     
+    @_pooled
     def change_password(self, user_id, old_password, new_password):
         """Change user password"""
         conn = self.get_connection()
@@ -291,17 +974,26 @@ class AuthDB:
         
         cursor.execute('SELECT password_hash FROM users WHERE id = ?', (user_id,))
         user = cursor.fetchone()
+        # Give the connection back before the (slow, threadpooled) hashing
+        conn.close()
         
         if not user:
-            conn.close()
             return {'success': False, 'error': 'User not found'}
         
         if not self.verify_password(old_password, user['password_hash']):
-            conn.close()
             return {'success': False, 'error': 'Incorrect password'}
         
         new_hash = self.hash_password(new_password)
-        cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user_id))
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Only if the hash we verified against is still current
+        cursor.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                      (new_hash, user_id, user['password_hash']))
+        if cursor.rowcount == 0:
+            conn.close()
+            return {'success': False, 'error': 'Incorrect password'}
         
         # Invalidate all sessions
         cursor.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
@@ -309,8 +1001,11 @@ class AuthDB:
         conn.commit()
         conn.close()
         
+        self.session_cache.invalidate_user(user_id)
+        
         return {'success': True}
     
+    @_pooled
     def create_password_reset_token(self, email):
         """Create password reset token"""
         conn = self.get_connection()
@@ -336,6 +1031,7 @@ class AuthDB:
         
         return {'success': True, 'token': token}
     
+    @_pooled
     def reset_password(self, token, new_password):
         """Reset password using token"""
         conn = self.get_connection()
@@ -347,25 +1043,41 @@ class AuthDB:
         ''', (token,))
         
         reset = cursor.fetchone()
+        # Give the connection back before the (slow, threadpooled) hashing
+        conn.close()
         
         if not reset:
-            conn.close()
             return {'success': False, 'error': 'Invalid or expired token'}
         
         new_hash = self.hash_password(new_password)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Claim the token first: a concurrent reset with the same token loses here
+        cursor.execute('UPDATE password_resets SET used = 1 WHERE token = ? AND used = 0', (token,))
+        if cursor.rowcount == 0:
+            conn.close()
+            return {'success': False, 'error': 'Invalid or expired token'}
+        
         cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', 
                       (new_hash, reset['user_id']))
-        
-        cursor.execute('UPDATE password_resets SET used = 1 WHERE token = ?', (token,))
         cursor.execute('DELETE FROM sessions WHERE user_id = ?', (reset['user_id'],))
         
         conn.commit()
         conn.close()
         
+        self.session_cache.invalidate_user(reset['user_id'])
+        
         return {'success': True}
     
+    @_pooled
     def delete_user(self, user_id):
-        """Delete user account"""
+        """Delete user account.
+        
+        Foreign keys are enforced, so the user's bots (and their
+        tokens and stored groups/friends) are deleted with it.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -376,53 +1088,218 @@ class AuthDB:
         conn.commit()
         conn.close()
         
+        self.session_cache.invalidate_user(user_id)
+        
         return {'success': True}
     
-    # ==================== BOT MANAGEMENT METHODS ====================
+    # ==================== SIGNED BOT TOKENS ====================
     
-    def generate_bot_id(self):
-        """Generate unique 6-character bot ID (uppercase and lowercase)"""
-        chars = string.ascii_letters  # a-z, A-Z
-        max_attempts = 100
+    @_pooled
+    def _load_token_secret(self):
+        """Load the bot token HMAC key (env var, else persisted in the DB)"""
+        secret = os.environ.get(BOT_TOKEN_SECRET_ENV)
+        if secret:
+            return secret.encode()
         
-        for _ in range(max_attempts):
-            bot_id = ''.join(random.choice(chars) for _ in range(6))
-            
-            # Check if ID already exists
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # INSERT OR IGNORE so concurrent processes agree on one key
+        cursor.execute('''
+            INSERT OR IGNORE INTO server_secrets (name, value)
+            VALUES ('bot_token', ?)
+        ''', (secrets.token_hex(32),))
+        conn.commit()
+        
+        cursor.execute("SELECT value FROM server_secrets WHERE name = 'bot_token'")
+        secret = cursor.fetchone()['value']
+        conn.close()
+        
+        return secret.encode()
+    
+    def _sign_bot_token(self, bot_id, generation, issued_at):
+        message = f'{bot_id}.{generation}.{issued_at}'.encode()
+        digest = hmac.new(self._token_secret, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+    
+    def issue_bot_token(self, bot_id, generation):
+        """Build a signed token: bt1.<bot_id>.<generation>.<issued_at>.<signature>"""
+        issued_at = int(time.time())
+        signature = self._sign_bot_token(bot_id, generation, issued_at)
+        return f'{BOT_TOKEN_PREFIX}.{bot_id}.{generation}.{issued_at}.{signature}'
+    
+    @_pooled
+    def get_token_generation(self, bot_id):
+        """Current token generation of a bot (None if it has none)"""
+        now = time.monotonic()
+        
+        with self._token_lock:
+            cached = self._token_generations.get(bot_id)
+        
+        if cached is not None and now - cached[1] < BOT_TOKEN_GENERATION_TTL:
+            return cached[0]
+        
+        # Re-read periodically so revocations made by other processes
+        # (e.g. manage_bots.py regen-token) are picked up
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT generation FROM bot_token_generations WHERE bot_id = ?', (bot_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        generation = row['generation'] if row else None
+        with self._token_lock:
+            self._token_generations[bot_id] = (generation, now)
+        
+        return generation
+    
+    def _verify_signed_bot_token(self, bot_id, token):
+        """Check a signed token in memory (no SQL unless the generation cache is cold)"""
+        parts = token.split('.')
+        if len(parts) != 5 or parts[0] != BOT_TOKEN_PREFIX or parts[1] != bot_id:
+            return False
+        
+        try:
+            generation = int(parts[2])
+            issued_at = int(parts[3])
+        except ValueError:
+            return False
+        
+        # compare_digest raises TypeError on non-ASCII str; such a signature is never valid
+        signature = parts[4]
+        if not signature.isascii():
+            return False
+        
+        expected = self._sign_bot_token(bot_id, generation, issued_at)
+        if not hmac.compare_digest(expected.encode(), signature.encode()):
+            return False
+        
+        return self.get_token_generation(bot_id) == generation
+    
+    def _record_token_usage(self, bot_id):
+        with self._token_lock:
+            self._token_usage[bot_id] = _sqlite_now()
+    
+    @_pooled
+    def flush_token_usage(self):
+        """Write buffered bot_tokens.last_used values in one transaction"""
+        with self._token_lock:
+            usage, self._token_usage = self._token_usage, {}
+        
+        if not usage:
+            return 0
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE bot_tokens SET last_used = ?
+            WHERE bot_id = ?
+        ''', [(last_used, bot_id) for bot_id, last_used in usage.items()])
+        conn.commit()
+        conn.close()
+        
+        return len(usage)
+    
+    # ==================== EXPIRED ROW REAPER ====================
+    
+    @_pooled
+    def _reap_batches(self, table, condition, batch_size, pause, key='rowid'):
+        """Delete matching rows by key (rowid), one short transaction per batch"""
+        total = 0
+        
+        while True:
             conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute('SELECT id FROM bots WHERE id = ?', (bot_id,))
-            exists = cursor.fetchone()
+            cursor.execute(f'''
+                DELETE FROM {table} WHERE {key} IN (
+                    SELECT {key} FROM {table} WHERE {condition} LIMIT ?
+                )
+            ''', (batch_size,))
+            deleted = cursor.rowcount
+            conn.commit()
             conn.close()
             
-            if not exists:
-                return bot_id
+            total += deleted
+            if deleted < batch_size:
+                return total
+            
+            # Let other writers in between batches
+            time.sleep(pause)
+    
+    def reap_expired(self, batch_size=REAP_BATCH_SIZE, pause=REAP_BATCH_PAUSE):
+        """Delete expired sessions and used/expired password reset tokens"""
+        sessions = self._reap_batches(
+            'sessions', 'expires_at <= CURRENT_TIMESTAMP', batch_size, pause
+        )
+        password_resets = self._reap_batches(
+            'password_resets', 'used = 1 OR expires_at <= CURRENT_TIMESTAMP', batch_size, pause
+        )
+        
+        self.reap_stats['runs'] += 1
+        self.reap_stats['sessions'] += sessions
+        self.reap_stats['password_resets'] += password_resets
+        self.reap_stats['last_run'] = _sqlite_now()
+        
+        return {'sessions': sessions, 'password_resets': password_resets}
+    
+    # ==================== BOT MANAGEMENT METHODS ====================
+    
+    def _random_bot_id(self):
+        """Random 6-character bot ID (uppercase and lowercase)"""
+        chars = string.ascii_letters  # a-z, A-Z
+        return ''.join(random.choice(chars) for _ in range(6))
+    
+    def _insert_bot(self, cursor, user_id, name, metadata=None):
+        """Insert a bot with a random ID plus its token rows.
+        
+        ID collisions are handled by retrying the INSERT on the primary
+        key violation instead of pre-checking with a SELECT. Must run
+        inside the caller's transaction.
+        """
+        max_attempts = 100
+        
+        for _ in range(max_attempts):
+            bot_id = self._random_bot_id()
+            try:
+                cursor.execute('''
+                    INSERT INTO bots (id, user_id, name, metadata)
+                    VALUES (?, ?, ?, ?)
+                ''', (bot_id, user_id, name, str(metadata or {})))
+                break
+            except sqlite3.IntegrityError as e:
+                if 'bots.id' not in str(e):
+                    raise
+        else:
+            raise Exception('Failed to generate unique bot ID after maximum attempts')
+        
+        token = self.issue_bot_token(bot_id, 1)
+        
+        cursor.execute('''
+            INSERT INTO bot_token_generations (bot_id, generation)
+            VALUES (?, 1)
+        ''', (bot_id,))
         
-        raise Exception('Failed to generate unique bot ID after maximum attempts')
+        # Create bot token
+        cursor.execute('''
+            INSERT INTO bot_tokens (bot_id, token)
+            VALUES (?, ?)
+        ''', (bot_id, token))
+        
+        return bot_id, token
     
+    @_pooled
     def create_bot(self, user_id, name, metadata=None):
         """Create a new bot for user"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        bot_id = self.generate_bot_id()
-        token = secrets.token_urlsafe(32)
-        
         try:
-            # Insert bot
-            cursor.execute('''
-                INSERT INTO bots (id, user_id, name, metadata)
-                VALUES (?, ?, ?, ?)
-            ''', (bot_id, user_id, name, str(metadata or {})))
-            
-            # Create bot token
-            cursor.execute('''
-                INSERT INTO bot_tokens (bot_id, token)
-                VALUES (?, ?)
-            ''', (bot_id, token))
-            
+            bot_id, token = self._insert_bot(cursor, user_id, name, metadata)
             conn.commit()
             
+            with self._token_lock:
+                self._token_generations[bot_id] = (1, time.monotonic())
+            
             return {
                 'success': True,
                 'bot_id': bot_id,
@@ -434,6 +1311,46 @@ class AuthDB:
         finally:
             conn.close()
     
+    @_pooled
+    def create_bots_bulk(self, user_id, names):
+        """Create many bots for user in a single transaction
+        
+        `names` is an iterable of bot names, or of dicts with 'name' and
+        optional 'metadata'. Either every bot is created or none is.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        created = []
+        
+        try:
+            for item in names:
+                if isinstance(item, dict):
+                    name, metadata = item.get('name'), item.get('metadata')
+                else:
+                    name, metadata = item, None
+                
+                name = str(name or '').strip()
+                if not name:
+                    raise ValueError(f'Bot name is required (item {len(created) + 1})')
+                
+                bot_id, token = self._insert_bot(cursor, user_id, name, metadata)
+                created.append({'bot_id': bot_id, 'name': name, 'token': token})
+            
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return {'success': False, 'error': str(e)}
+        finally:
+            conn.close()
+        
+        now = time.monotonic()
+        with self._token_lock:
+            for bot in created:
+                self._token_generations[bot['bot_id']] = (1, now)
+        
+        return {'success': True, 'bots': created, 'count': len(created)}
+    
+    @_pooled
     def get_user_bots(self, user_id):
         """Get all bots owned by user"""
         conn = self.get_connection()
@@ -460,6 +1377,7 @@ class AuthDB:
             'token': bot['token']
         } for bot in bots]
     
+    @_pooled
     def get_bot(self, bot_id):
         """Get bot by ID"""
         conn = self.get_connection()
@@ -483,32 +1401,70 @@ class AuthDB:
             'metadata': bot['metadata']
         }
     
+    @_pooled
     def verify_bot_token(self, bot_id, token):
         """Verify bot token"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        if not isinstance(token, str):
+            return False
         
-        cursor.execute('''
-            SELECT bt.*, b.user_id, b.name
-            FROM bot_tokens bt
-            JOIN bots b ON bt.bot_id = b.id
-            WHERE bt.bot_id = ? AND bt.token = ?
-        ''', (bot_id, token))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            # Update last used
+        if token.startswith(BOT_TOKEN_PREFIX + '.'):
+            valid = self._verify_signed_bot_token(bot_id, token)
+        else:
+            # Legacy random token - still checked against bot_tokens
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
             cursor.execute('''
-                UPDATE bot_tokens SET last_used = CURRENT_TIMESTAMP
-                WHERE bot_id = ? AND token = ?
+                SELECT bt.id
+                FROM bot_tokens bt
+                JOIN bots b ON bt.bot_id = b.id
+                WHERE bt.bot_id = ? AND bt.token = ?
             ''', (bot_id, token))
-            conn.commit()
+            
+            valid = cursor.fetchone() is not None
+            conn.close()
         
+        if valid:
+            # last_used is written by flush_token_usage(), not per request
+            self._record_token_usage(bot_id)
+        
+        return valid
+    
+    @_pooled
+    def select_bots(self, user_id, is_admin=False, bot_ids=None, owner_id=None, status=None, tag=None):
+        """IDs of the bots a user may command, matching an explicit ID list
+        and/or a selector (owner, status, metadata tag), in one query"""
+        conditions = []
+        params = []
+        
+        if not is_admin:
+            conditions.append('user_id = ?')
+            params.append(user_id)
+        if owner_id is not None:
+            conditions.append('user_id = ?')
+            params.append(owner_id)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        if bot_ids is not None:
+            # One bound JSON array instead of thousands of placeholders
+            conditions.append('id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(list(bot_ids)))
+        
+        where = ' AND '.join(conditions) or '1'
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT id, metadata FROM bots WHERE {where} ORDER BY created_at, id', params)
+        rows = cursor.fetchall()
         conn.close()
         
-        return result is not None
+        if tag:
+            rows = [row for row in rows if _metadata_has_tag(_parse_bot_metadata(row['metadata']), tag)]
+        
+        return [row['id'] for row in rows]
     
+    @_pooled
     def verify_bot_ownership(self, user_id, bot_id):
         """Verify if user owns the bot"""
         conn = self.get_connection()
@@ -523,6 +1479,7 @@ class AuthDB:
         
         return result is not None
     
+    @_pooled
     def update_bot_status(self, bot_id, status, bot_data=None):
         """Update bot status and data"""
         conn = self.get_connection()
@@ -546,39 +1503,227 @@ class AuthDB:
         
         return {'success': True}
     
-    def update_bot_data(self, bot_id, bot_data):
-        """Update bot data (groups, friends, etc.)"""
+    @_pooled
+    def update_bot_statuses(self, updates):
+        """Apply many (bot_id, status, last_active) updates in one transaction"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
+        cursor.executemany('''
             UPDATE bots 
-            SET bot_data = ?, last_active = CURRENT_TIMESTAMP
+            SET status = ?, last_active = ?
             WHERE id = ?
-        ''', (json.dumps(bot_data), bot_id))
+        ''', [(status, last_active, bot_id) for bot_id, status, last_active in updates])
         
         conn.commit()
         conn.close()
         
         return {'success': True}
     
+    @_pooled
+    def get_bot_statuses(self):
+        """Get {bot_id: status} for every bot"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT id, status FROM bots')
+        statuses = {row['id']: row['status'] for row in cursor.fetchall()}
+        conn.close()
+        
+        return statuses
+    
+    @_pooled
+    def update_bot_data(self, bot_id, bot_data):
+        """Update bot data (groups, friends, etc.) - full sync"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            data_hash = _store_full_bot_data(cursor, bot_id, bot_data)
+            cursor.execute('''
+                UPDATE bots SET last_active = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (bot_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return {'success': True, 'hash': data_hash}
+    
+    @_pooled
+    def apply_bot_data_delta(self, bot_id, base_hash, changes, extra=None):
+        """Apply an incremental sync on top of the data identified by base_hash
+        
+        `changes` maps 'groups'/'friends' to {'added': [...], 'changed': [...],
+        'removed': [ids]}. Fails with the current hash when base_hash does
+        not match, so the bot can fall back to a full sync.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Take the write lock up front so concurrent deltas can't race on the hash
+            conn.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT data_hash, bot_data FROM bots WHERE id = ?', (bot_id,))
+            bot = cursor.fetchone()
+            
+            if not bot:
+                conn.rollback()
+                return {'success': False, 'error': 'Bot not found'}
+            
+            if bot['data_hash'] is None or bot['data_hash'] != base_hash:
+                conn.rollback()
+                return {'success': False, 'error': 'Hash mismatch', 'hash': bot['data_hash']}
+            
+            total = int(bot['data_hash'], 16)
+            
+            for collection, table in BOT_DATA_TABLES.items():
+                delta = changes.get(collection) or {}
+                
+                upserts = {}
+                for entity in (delta.get('added') or []) + (delta.get('changed') or []):
+                    row = _entity_row(collection, entity)
+                    upserts[row[0]] = row
+                
+                removed = set()
+                for entity in delta.get('removed') or []:
+                    entity_id = entity.get('id') if isinstance(entity, dict) else entity
+                    if entity_id is not None and str(entity_id) not in upserts:
+                        removed.add(str(entity_id))
+                
+                # Subtract the hashes of rows being replaced or deleted
+                touched = list(upserts.keys() | removed)
+                for ids in _chunks(touched):
+                    placeholders = ', '.join('?' * len(ids))
+                    cursor.execute(f'''
+                        SELECT entity_hash FROM {table}
+                        WHERE bot_id = ? AND entity_id IN ({placeholders})
+                    ''', (bot_id, *ids))
+                    total -= sum(int(row['entity_hash'], 16) for row in cursor.fetchall())
+                
+                cursor.executemany(f'''
+                    INSERT OR REPLACE INTO {table} (bot_id, entity_id, name, data, entity_hash)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(bot_id, *row) for row in upserts.values()])
+                cursor.executemany(f'''
+                    DELETE FROM {table} WHERE bot_id = ? AND entity_id = ?
+                ''', [(bot_id, entity_id) for entity_id in removed])
+                total += sum(int(row[3], 16) for row in upserts.values())
+            
+            data_hash = _format_hash(total)
+            
+            bot_data = bot['bot_data']
+            if extra:
+                stored = json.loads(bot_data) if bot_data else {}
+                stored.update(extra)
+                bot_data = json.dumps(stored)
+            
+            cursor.execute('''
+                UPDATE bots 
+                SET data_hash = ?, bot_data = ?, last_active = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (data_hash, bot_data, bot_id))
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return {'success': True, 'hash': data_hash}
+    
+    @_pooled
+    def get_bot_data_hash(self, bot_id):
+        """Get the content hash of a bot's synced groups/friends"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT data_hash FROM bots WHERE id = ?', (bot_id,))
+        result = cursor.fetchone()
+        conn.close()
+        
+        return result['data_hash'] if result else None
+    
+    @_pooled
+    def get_bot_data_page(self, bot_id, collection, cursor=None, limit=50, query=None):
+        """Keyset-paginated slice of a bot's groups/friends, ordered by entity id
+        
+        Returns {'items': [...], 'next_cursor': str or None}; pass next_cursor
+        back as `cursor` for the following page. `query` filters by name.
+        """
+        table = BOT_DATA_TABLES.get(collection)
+        if table is None:
+            raise ValueError(f'Unknown collection: {collection}')
+        
+        conditions = ['bot_id = ?']
+        params = [bot_id]
+        
+        if cursor:
+            conditions.append('entity_id > ?')
+            params.append(cursor)
+        
+        if query:
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        
+        conn = self.get_connection()
+        db_cursor = conn.cursor()
+        
+        # Fetch one extra row to know whether another page exists
+        db_cursor.execute(f'''
+            SELECT entity_id, data FROM {table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY entity_id
+            LIMIT ?
+        ''', (*params, limit + 1))
+        rows = db_cursor.fetchall()
+        conn.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return {
+            'items': [json.loads(row['data']) for row in rows],
+            'next_cursor': rows[-1]['entity_id'] if has_more else None
+        }
+    
+    @_pooled
     def get_bot_data(self, bot_id):
         """Get bot data"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT bot_data FROM bots WHERE id = ?', (bot_id,))
+        cursor.execute('SELECT bot_data, data_hash FROM bots WHERE id = ?', (bot_id,))
         result = cursor.fetchone()
-        conn.close()
         
         if not result or not result['bot_data']:
+            conn.close()
             return None
         
         try:
-            return json.loads(result['bot_data'])
+            data = json.loads(result['bot_data'])
         except:
+            conn.close()
             return None
+        
+        # Reassemble normalized collections
+        if result['data_hash'] is not None and isinstance(data, dict):
+            for collection, table in BOT_DATA_TABLES.items():
+                cursor.execute(f'''
+                    SELECT data FROM {table} WHERE bot_id = ?
+                    ORDER BY entity_id
+                ''', (bot_id,))
+                data[collection] = [json.loads(row['data']) for row in cursor.fetchall()]
+        
+        conn.close()
+        return data
     
+    @_pooled
     def delete_bot(self, bot_id, user_id):
         """Delete bot (must be owner)"""
         conn = self.get_connection()
@@ -593,9 +1738,13 @@ class AuthDB:
         conn.close()
         
         if affected > 0:
+            with self._token_lock:
+                self._token_generations.pop(bot_id, None)
+                self._token_usage.pop(bot_id, None)
             return {'success': True}
         return {'success': False, 'error': 'Bot not found or not authorized'}
     
+    @_pooled
     def update_bot_info(self, bot_id, user_id, **kwargs):
         """Update bot info (name, metadata)"""
         conn = self.get_connection()
@@ -628,6 +1777,7 @@ class AuthDB:
         
         return {'success': True}
     
+    @_pooled
     def get_all_bots(self):
         """Get all bots in the system (admin function)"""
         conn = self.get_connection()
@@ -655,6 +1805,7 @@ class AuthDB:
             'metadata': bot['metadata']
         } for bot in bots]
     
+    @_pooled
     def get_bot_token(self, bot_id, user_id):
         """Get bot token (only owner can access)"""
         if not self.verify_bot_ownership(user_id, bot_id):
@@ -672,6 +1823,7 @@ class AuthDB:
         
         return result['token'] if result else None
     
+    @_pooled
     def regenerate_bot_token(self, bot_id, user_id):
         """Regenerate bot token (only owner)"""
         if not self.verify_bot_ownership(user_id, bot_id):
@@ -680,9 +1832,17 @@ class AuthDB:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        new_token = secrets.token_urlsafe(32)
-        
         try:
+            # Bump the generation so every previously signed token is revoked
+            cursor.execute('''
+                INSERT INTO bot_token_generations (bot_id, generation)
+                VALUES (?, 1)
+                ON CONFLICT(bot_id) DO UPDATE SET generation = generation + 1
+            ''', (bot_id,))
+            cursor.execute('SELECT generation FROM bot_token_generations WHERE bot_id = ?', (bot_id,))
+            generation = cursor.fetchone()['generation']
+            new_token = self.issue_bot_token(bot_id, generation)
+            
             # Delete old token
             cursor.execute('DELETE FROM bot_tokens WHERE bot_id = ?', (bot_id,))
             
@@ -694,12 +1854,81 @@ class AuthDB:
             
             conn.commit()
             
+            with self._token_lock:
+                self._token_generations[bot_id] = (generation, time.monotonic())
+            
             return {'success': True, 'token': new_token}
         except Exception as e:
             conn.rollback()
             return {'success': False, 'error': str(e)}
         finally:
             conn.close()
+    
+    # ==================== COMMAND QUEUE ====================
+    
+    @_pooled
+    def save_commands(self, rows, deleted_ids=()):
+        """Upsert many (id, seq, bot_id, type, status, attempts, body) rows and
+        delete retired commands, all in one transaction"""
+        now = _sqlite_now()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO commands (id, seq, bot_id, type, status, attempts, body, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                status = excluded.status,
+                attempts = excluded.attempts,
+                body = excluded.body,
+                updated_at = excluded.updated_at
+        ''', [row + (now,) for row in rows])
+        
+        for chunk in _chunks(list(deleted_ids), SQL_IN_CHUNK):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'DELETE FROM commands WHERE id IN ({placeholders})', chunk)
+        
+        conn.commit()
+        conn.close()
+        
+        return len(rows)
+    
+    def purge_closed_commands(self, older_than, batch_size=REAP_BATCH_SIZE, pause=REAP_BATCH_PAUSE):
+        """Delete finished commands last updated more than `older_than`
+        seconds ago, including rows left behind by earlier runs"""
+        condition = (
+            "status NOT IN ('scheduled', 'pending', 'dispatched') "
+            f"AND updated_at < datetime('now', '-{int(older_than)} seconds')"
+        )
+        return self._reap_batches('commands', condition, batch_size, pause, key='id')
+    
+    @_pooled
+    def load_open_commands(self):
+        """Scheduled, pending and dispatched commands, oldest first (for replay on startup)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT body FROM commands
+            WHERE status IN ('scheduled', 'pending', 'dispatched')
+            ORDER BY seq
+        ''')
+        commands = [json.loads(row['body']) for row in cursor.fetchall()]
+        conn.close()
+        
+        return commands
+    
+    @_pooled
+    def get_max_command_seq(self):
+        """Highest command seq ever stored (0 if none)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT MAX(seq) AS seq FROM commands')
+        row = cursor.fetchone()
+        conn.close()
+        
+        return row['seq'] or 0
 
 
 # Convenience functions
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+get_user_bots / validate_session with and without the migration 2 indexes
+
+Builds a scratch database of `--users` users, `--sessions` sessions and
+`--bots` bots (one token each), then times random lookups with the
+indexes in place and again after dropping them. validate_session is
+measured uncached (the session cache is cleared before every call).
+
+    python benchmarks/bench_auth_indexes.py --users 100000 --sessions 500000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+from auth import AuthDB  # noqa: E402
+
+INDEXES = ('idx_sessions_user_id', 'idx_sessions_expires_at', 'idx_bots_user_created',
+           'idx_bot_tokens_bot_id', 'idx_password_resets_user_id')   # migration 2
+
+
+def populate(db, users, sessions, bots):
+    conn = db.get_connection()
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((i, f'user{i}', f'user{i}@example.com', 'x') for i in range(1, users + 1)))
+    conn.executemany(
+        "INSERT INTO sessions (user_id, session_token, expires_at) VALUES (?, ?, datetime('now', '+7 days'))",
+        ((random.randint(1, users), f'session-{i}') for i in range(sessions)))
+    conn.executemany(
+        'INSERT INTO bots (id, user_id, name) VALUES (?, ?, ?)',
+        ((f'bot-{i}', random.randint(1, users), f'bot {i}') for i in range(bots)))
+    conn.executemany(
+        'INSERT INTO bot_tokens (bot_id, token) VALUES (?, ?)',
+        ((f'bot-{i}', f'token-{i}') for i in range(bots)))
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def timed(func, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - started) * 1000 / len(args_list)
+
+
+def measure(db, users, sessions, lookups):
+    user_ids = [(random.randint(1, users),) for _ in range(lookups)]
+    tokens = [(f'session-{random.randrange(sessions)}',) for _ in range(lookups)]
+
+    def sessions_by_user(user_id):
+        conn = db.get_connection()
+        conn.execute('SELECT id FROM sessions WHERE user_id = ?', (user_id,)).fetchall()
+        conn.close()
+
+    def validate_uncached(token):
+        db.session_cache.clear()
+        assert db.validate_session(token) is not None
+
+    return {
+        'get_user_bots': timed(db.get_user_bots, user_ids),
+        'sessions by user': timed(sessions_by_user, user_ids),
+        'validate_session': timed(validate_uncached, tokens),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=500000)
+    parser.add_argument('--bots', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=300)
+    args = parser.parse_args()
+
+    db = AuthDB(os.path.join('data', 'bench.db'))
+    populate(db, args.users, args.sessions, args.bots)
+    indexed = measure(db, args.users, args.sessions, args.lookups)
+
+    conn = db.get_connection()
+    for name in INDEXES:
+        conn.execute(f'DROP INDEX {name}')
+    conn.commit()
+    conn.close()
+    unindexed = measure(db, args.users, args.sessions, args.lookups)
+
+    print(f'{"ms per call":<18} {"no indexes":>12} {"indexes":>12}')
+    for key in indexed:
+        print(f'{key:<18} {unindexed[key]:>12.3f} {indexed[key]:>12.3f}')
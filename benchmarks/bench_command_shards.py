@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Command store contention: one lock vs COMMAND_SHARDS shard locks
+
+`--workers` greenlets loop enqueue -> dispatch -> ack over `--bots` bots
+while `--pollers` greenlets read the overview counts and the global
+command list every 10 ms. Reports cycles/s, dispatch latency and the
+overview call time for 1 shard (the old single lock) and for N shards,
+as medians of `--repeat` interleaved runs.
+
+    python benchmarks/bench_command_shards.py --workers 100 --bots 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+import gevent  # noqa: E402
+import web_server as ws  # noqa: E402
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else 0.0
+
+
+def run_once(shards, workers, bots, pollers, duration):
+    ws.COMMAND_SHARDS = shards
+    ws.command_shards[:] = [ws.CommandShard() for _ in range(shards)]
+    ws.commands_by_id.clear()
+    client = ws.app.test_client()
+
+    cycles = [0]
+    dispatch_ms = []
+    overview_ms = []
+    stop = time.monotonic() + duration
+
+    def worker(n):
+        i = n
+        while time.monotonic() < stop:
+            bot_id = f'bench-bot-{i % bots}'
+            i += workers
+            ws._enqueue_command(bot_id, 'ping', {})
+            started = time.perf_counter()
+            shard = ws._shard_for(bot_id)
+            with shard.lock:
+                dispatched = ws._dispatch_commands(shard, bot_id, 1)
+            dispatch_ms.append((time.perf_counter() - started) * 1000)
+            for command in dispatched:
+                ws._ack_command(command['id'], 'completed', {})
+            cycles[0] += 1
+            gevent.sleep(0)
+
+    def poller():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            ws._command_overview()
+            overview_ms.append((time.perf_counter() - started) * 1000)
+            client.get('/api/commands?limit=50')
+            gevent.sleep(0.01)
+
+    greenlets = [gevent.spawn(worker, n) for n in range(workers)]
+    greenlets += [gevent.spawn(poller) for _ in range(pollers)]
+    gevent.joinall(greenlets, raise_error=True)
+
+    return {
+        'cycles/s': cycles[0] / duration,
+        'dispatch p50 ms': percentile(dispatch_ms, 0.5),
+        'dispatch p99 ms': percentile(dispatch_ms, 0.99),
+        'overview p50 ms': percentile(overview_ms, 0.5),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=100)
+    parser.add_argument('--bots', type=int, default=2000)
+    parser.add_argument('--pollers', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--shards', type=int, default=ws.COMMAND_SHARDS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Interleaved runs, medians reported: single runs vary by ~15% here
+    runs = {1: [], args.shards: []}
+    for _ in range(args.repeat):
+        for shards in runs:
+            runs[shards].append(run_once(shards, args.workers, args.bots, args.pollers, args.duration))
+    for shards, results in runs.items():
+        medians = {key: percentile([r[key] for r in results], 0.5) for key in results[0]}
+        spread = [r['cycles/s'] for r in results]
+        print(f'{shards:>3} shard(s): ' + '  '.join(f'{key} {value:.3f}' for key, value in medians.items())
+              + f'  (cycles/s range {min(spread):.0f}-{max(spread):.0f})')
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Time to first byte of log exports: buffered jsonify vs streamed JSON/NDJSON
+
+Appends `--records` logs for one bot straight into the log store, then
+exports them through the Flask test client (unbuffered, so the first
+chunk is timed as it is produced). "buffered" rebuilds the old handler:
+the whole list is read and passed to jsonify() before anything is sent.
+The buffered run goes last, since peak RSS only grows.
+
+    python benchmarks/bench_export.py --records 1000000
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+from flask import jsonify  # noqa: E402
+import web_server as ws  # noqa: E402
+
+PASSWORD = 'Passw0rd!bench'
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@ws.app.route('/bench/buffered-export/<bot_id>')
+def buffered_export(bot_id):
+    logs = list(ws.log_store.iter_records(bot_id))
+    return jsonify({'count': len(logs), 'exported_at': ws._current_time_iso(), 'logs': logs})
+
+
+def measure(client, url, headers=None):
+    rss = peak_rss_mb()
+    started = time.perf_counter()
+    response = client.get(url, headers=headers or {}, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    ttfb = time.perf_counter() - started
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    response.close()
+    return ttfb, time.perf_counter() - started, size, peak_rss_mb() - rss
+
+
+def run(records):
+    user_id = ws.auth_db.create_user('bench', 'bench@example.com', PASSWORD)['user_id']
+    bot_id = ws.auth_db.create_bot(user_id, 'bench-bot')['bot_id']
+    for i in range(records):
+        ws.log_store.append({'type': 'info', 'message': f'bench log line {i}', 'timestamp': ws._current_time_iso(),
+                             'metadata': {'i': i}, 'bot_id': bot_id})
+    ws.log_store.flush()
+
+    client = ws.app.test_client()
+    client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD})
+    modes = (
+        ('ndjson streamed', f'/api/export/logs?bot_id={bot_id}&format=ndjson', None),
+        ('ndjson + gzip', f'/api/export/logs?bot_id={bot_id}&format=ndjson', {'Accept-Encoding': 'gzip'}),
+        ('json streamed', f'/api/export/bot-data/{bot_id}', None),
+        ('buffered jsonify', f'/bench/buffered-export/{bot_id}', None),
+    )
+    print(f'{records:,} log records')
+    for name, url, headers in modes:
+        ttfb, total, size, rss = measure(client, url, headers)
+        print(f'{name:>17}: TTFB {ttfb * 1000:8.1f} ms, total {total:6.2f} s, '
+              f'{size / 1e6:7.1f} MB sent, peak RSS +{rss:.0f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.records)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+add_log -> Socket.IO delivery throughput of the batched log relay
+
+Two dashboard sockets watch one bot: a batched client (auth
+{'log_batches': true}, one new_logs event per batch) and a legacy one
+(one new_log per entry). `--logs` add_log calls are made and timed until
+both clients hold every entry. For comparison, the old relay (sleep
+100 ms, then relay one entry) is run for `--legacy-seconds`.
+
+    python benchmarks/bench_log_relay.py --logs 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+import gevent  # noqa: E402
+import web_server as ws  # noqa: E402
+
+PASSWORD = 'Passw0rd!bench'
+
+
+def connect(client, log_batches):
+    socket = ws.socketio.test_client(ws.app, flask_test_client=client, auth={'log_batches': log_batches})
+    socket.get_received()
+    return socket
+
+
+def received_logs(socket):
+    count = 0
+    for event in socket.get_received():
+        if event['name'] == 'new_logs':
+            count += event['args'][0]['count']
+        elif event['name'] == 'new_log':
+            count += 1
+    return count
+
+
+def legacy_worker():
+    """The relay before batching: one entry per 100 ms"""
+    while True:
+        time.sleep(0.1)
+        ws.emit_logs_to_clients(ws.log_queue.get_batch(0))
+
+
+def run(logs, legacy_seconds):
+    user_id = ws.auth_db.create_user('bench', 'bench@example.com', PASSWORD)['user_id']
+    bot_id = ws.auth_db.create_bot(user_id, 'bench-bot')['bot_id']
+    client = ws.app.test_client()
+    client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD})
+    batched, legacy = connect(client, True), connect(client, False)
+
+    while ws.log_queue.qsize():        # connect logs queued during setup
+        ws.log_queue.get_batch(0)
+
+    worker = gevent.spawn(ws.log_worker)
+    stats = ws.log_queue.stats
+    delivered, batches = stats['delivered'], stats['batches']
+    started = time.perf_counter()
+    for i in range(logs):
+        ws.add_log('info', f'bench log {i}', bot_id=bot_id)
+        if i % 1000 == 0:
+            gevent.sleep(0)
+
+    # Test clients receive synchronously on emit: the relay is done once the
+    # queue has handed out every entry and the worker is back waiting
+    while stats['delivered'] - delivered < logs or ws.log_queue.qsize():
+        gevent.sleep(0.001)
+    gevent.sleep(0)
+    elapsed = time.perf_counter() - started
+    worker.kill()
+    batches = stats['batches'] - batches
+    got = (received_logs(batched), received_logs(legacy))
+    assert got == (logs, logs), got
+    print(f'batched relay: {logs} logs delivered to both clients in {elapsed:.2f} s '
+          f'({logs / elapsed:,.0f} logs/s, {batches} new_logs events, '
+          f'{ws.log_queue.stats["dropped"]} dropped)')
+
+    ws.log_queue.batch_size = 1
+    worker = gevent.spawn(legacy_worker)
+    for i in range(logs):
+        ws.add_log('info', f'legacy log {i}', bot_id=bot_id)
+    gevent.sleep(legacy_seconds)
+    worker.kill()
+    delivered = received_logs(legacy)
+    print(f' sleep-per-entry relay: {delivered} logs in {legacy_seconds:.0f} s '
+          f'({delivered / legacy_seconds:,.1f} logs/s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logs', type=int, default=20000)
+    parser.add_argument('--legacy-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+    run(args.logs, args.legacy_seconds)
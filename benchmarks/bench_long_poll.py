@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Idle bots polling for commands: short poll vs long poll (?wait=)
+
+Serves the app on a local gevent WSGIServer. `--bots` bot greenlets fetch
+GET /api/bot/<id>/commands over keep-alive connections for `--window`
+seconds, either every `--interval` seconds (short poll) or with
+wait=`--wait` (long poll), while `--commands` commands are enqueued to
+random bots over the first 60% of the window. Reports the request count
+and enqueue-to-dispatch latency.
+
+    python benchmarks/bench_long_poll.py --bots 1000 --window 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+import gevent  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+import web_server as ws  # noqa: E402
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else 0.0
+
+
+def run_mode(port, bots, commands, window, query, interval):
+    requests = [0]
+    latencies = []
+    stop = time.monotonic() + window
+
+    def bot(bot_id):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        gevent.sleep(random.random() * (interval or 0.5))   # spread the first polls
+        while time.monotonic() < stop:
+            conn.request('GET', f'/api/bot/{bot_id}/commands?{query}')
+            body = json.loads(conn.getresponse().read())
+            requests[0] += 1
+            for command in body['commands']:
+                latencies.append((time.time() - command['payload']['enqueued_at']) * 1000)
+            if interval:
+                gevent.sleep(interval)
+        conn.close()
+
+    def enqueuer():
+        for _ in range(commands):
+            gevent.sleep(window * 0.6 / commands)
+            ws._enqueue_command(f'idle-bot-{random.randrange(bots)}', 'ping', {'enqueued_at': time.time()})
+
+    greenlets = [gevent.spawn(bot, f'idle-bot-{i}') for i in range(bots)]
+    greenlets.append(gevent.spawn(enqueuer))
+    gevent.joinall(greenlets, raise_error=True)
+    return requests[0], latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bots', type=int, default=1000)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--window', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--wait', type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = WSGIServer(('127.0.0.1', 0), ws.app, log=None)
+    server.start()
+    modes = (
+        (f'short poll, {args.interval:g} s interval', '', args.interval),
+        (f'long poll, wait={args.wait:g}', f'wait={args.wait:g}', 0),
+    )
+    for name, query, interval in modes:
+        count, latencies = run_mode(server.server_port, args.bots, args.commands, args.window, query, interval)
+        print(f'{name:<26} {count:>7,} requests ({count / args.window:,.0f} req/s), '
+              f'{len(latencies)} commands, enqueue-to-dispatch '
+              f'p50 {percentile(latencies, 0.5):.0f} ms / p99 {percentile(latencies, 0.99):.0f} ms')
+    server.stop()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Requests/s on GET /api/my-bots with and without the SQLite connection pool
+
+"unpooled" swaps AuthDB.get_connection back to the pre-pool behaviour
+(a fresh sqlite3.connect() per call). Runs in a scratch directory with
+the in-process Flask client, `--concurrency` greenlets sharing the load.
+
+    python benchmarks/bench_my_bots.py --requests 5000 --concurrency 50
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+import gevent  # noqa: E402
+import web_server  # noqa: E402
+from auth import AuthDB  # noqa: E402
+
+PASSWORD = 'Passw0rd!bench'
+
+
+def unpooled_connection(self):
+    conn = sqlite3.connect(self.db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def run(requests, concurrency, bots):
+    db = web_server.auth_db
+    user_id = db.create_user('bench', 'bench@example.com', PASSWORD)['user_id']
+    for i in range(bots):
+        db.create_bot(user_id, f'bench-bot-{i}')
+
+    client = web_server.app.test_client()
+    client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD})
+
+    def worker(count):
+        for _ in range(count):
+            response = client.get('/api/my-bots')
+            assert response.status_code == 200
+
+    def measure():
+        share = requests // concurrency
+        started = time.perf_counter()
+        gevent.joinall([gevent.spawn(worker, share) for _ in range(concurrency)], raise_error=True)
+        return share * concurrency / (time.perf_counter() - started)
+
+    pooled_get_connection = AuthDB.get_connection
+    results = {}
+    for mode, get_connection in (('unpooled', unpooled_connection), ('pooled', pooled_get_connection)):
+        AuthDB.get_connection = get_connection
+        measure()  # warm-up
+        results[mode] = measure()
+    AuthDB.get_connection = pooled_get_connection
+
+    for mode, rate in results.items():
+        print(f'{mode:>9}: {rate:8.0f} req/s')
+    print(f'  speedup: {results["pooled"] / results["unpooled"]:.2f}x  '
+          f'(pool stats: {db.pool.stats})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--bots', type=int, default=20)
+    args = parser.parse_args()
+    run(args.requests, args.concurrency, args.bots)
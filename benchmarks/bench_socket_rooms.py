@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Socket.IO fan-out: broadcast to every dashboard vs per-user/per-bot rooms
+
+`--users` users own `--bots` bots between them and open `--clients`
+dashboard sockets in total. The same `--events` bot_update events are
+sent once as the old namespace-wide broadcast and once through
+emit_bot_update (bot:<id> + admin rooms), counting deliveries.
+
+    python benchmarks/bench_socket_rooms.py --clients 1000 --bots 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-bench-'))
+
+import web_server as ws  # noqa: E402
+
+PASSWORD = 'Passw0rd!bench'
+
+
+def deliveries(sockets):
+    """Events queued on the test clients since the last call (cleared)"""
+    total = 0
+    for socket in sockets:
+        total += len(socket.queue)
+        socket.queue = []
+    return total
+
+
+def setup(users, bots, clients):
+    bot_ids = []
+    sockets = []
+    for u in range(users):
+        user_id = ws.auth_db.create_user(f'bench{u}', f'bench{u}@example.com', PASSWORD)['user_id']
+        bot_ids += [ws.auth_db.create_bot(user_id, f'bot {u}.{b}')['bot_id']
+                    for b in range(bots // users)]
+
+        http = ws.app.test_client()
+        http.post('/api/auth/login', json={'username': f'bench{u}', 'password': PASSWORD})
+        sockets += [ws.socketio.test_client(ws.app, flask_test_client=http)
+                    for _ in range(clients // users)]
+    return bot_ids, sockets
+
+
+def run(users, bots, clients, events):
+    bot_ids, sockets = setup(users, bots, clients)
+    deliveries(sockets)
+    updates = [(bot_ids[i % len(bot_ids)], {'bot_id': bot_ids[i % len(bot_ids)], 'status': 'online'})
+               for i in range(events)]
+
+    started = time.perf_counter()
+    for _, data in updates:
+        ws.socketio.emit('bot_update', data, namespace='/')
+    broadcast = (time.perf_counter() - started, deliveries(sockets))
+
+    started = time.perf_counter()
+    for bot_id, data in updates:
+        ws.emit_bot_update(bot_id, data)
+    rooms = (time.perf_counter() - started, deliveries(sockets))
+
+    print(f'{len(sockets)} clients, {len(bot_ids)} bots, {events} bot_update events')
+    for name, (elapsed, count) in (('broadcast', broadcast), ('rooms', rooms)):
+        print(f'{name:>10}: {elapsed:7.2f} s, {count:>9,} deliveries')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--bots', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=1000)
+    args = parser.parse_args()
+    run(args.users, args.bots, args.clients, args.events)
@@ -0,0 +1,408 @@
+# log_store.py
+# -*- coding: utf-8 -*-
+"""
+Append-only, segmented on-disk log store for Bot Manager
+
+Log records are written as NDJSON lines into segment files that are
+rotated by size. Every segment has a sparse index (<segment>.idx) of
+blocks: byte range, time range, per-bot counts and log types of up to
+LOG_INDEX_BLOCK_RECORDS records. Queries by bot_id / type / time range
+only read the blocks that can match, never whole segments.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+LOG_STORE_DIR = 'data/logs'
+LOG_SEGMENT_MAX_BYTES = 16 * 1024 * 1024  # Rotate the active segment past this size
+LOG_STORE_MAX_SEGMENTS = 64               # Oldest segments are deleted beyond this (~1 GB)
+LOG_INDEX_BLOCK_RECORDS = 512             # Records covered by one sparse index entry
+LOG_STORE_BUFFER_MAX = 2000               # Buffered records that force a flush on append
+
+_SEGMENT_RE = re.compile(r'^segment-(\d+)\.log$')
+
+
+class _Block:
+    """Sparse index entry for a contiguous run of records in a segment"""
+
+    __slots__ = ('offset', 'length', 'count', 'min_ts', 'max_ts', 'bots', 'types')
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.length = 0
+        self.count = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.bots = Counter()   # bot_id ('' for system logs) -> records
+        self.types = set()
+
+    def add(self, record, size):
+        timestamp = record.get('timestamp') or ''
+        if self.min_ts is None or timestamp < self.min_ts:
+            self.min_ts = timestamp
+        if self.max_ts is None or timestamp > self.max_ts:
+            self.max_ts = timestamp
+        self.bots[record.get('bot_id') or ''] += 1
+        self.types.add(record.get('type'))
+        self.length += size
+        self.count += 1
+
+    def matches(self, bot_id, log_type, since, until):
+        if bot_id is not None and bot_id not in self.bots:
+            return False
+        if log_type is not None and log_type not in self.types:
+            return False
+        if since is not None and self.max_ts < since:
+            return False
+        if until is not None and self.min_ts > until:
+            return False
+        return True
+
+    def copy(self):
+        block = _Block(self.offset)
+        block.length, block.count = self.length, self.count
+        block.min_ts, block.max_ts = self.min_ts, self.max_ts
+        block.bots, block.types = Counter(self.bots), set(self.types)
+        return block
+
+    def to_json(self):
+        return json.dumps({
+            'offset': self.offset, 'length': self.length, 'count': self.count,
+            'min_ts': self.min_ts, 'max_ts': self.max_ts,
+            'bots': self.bots, 'types': sorted(t for t in self.types if t is not None)
+        })
+
+    @classmethod
+    def from_json(cls, line):
+        data = json.loads(line)
+        block = cls(data['offset'])
+        block.length, block.count = data['length'], data['count']
+        block.min_ts, block.max_ts = data['min_ts'], data['max_ts']
+        block.bots, block.types = Counter(data['bots']), set(data['types'])
+        return block
+
+
+class _Segment:
+    """One segment file with its closed index blocks and the block being filled"""
+
+    def __init__(self, directory, number):
+        self.number = number
+        self.path = os.path.join(directory, f'segment-{number:08d}.log')
+        self.index_path = os.path.join(directory, f'segment-{number:08d}.idx')
+        self.blocks = []
+        self.open_block = None
+        self.size = 0
+
+
+def _segment_bots(segment):
+    """Records per bot_id across a segment's blocks"""
+    bots = Counter()
+    for block in segment.blocks + ([segment.open_block] if segment.open_block else []):
+        bots.update(block.bots)
+    return bots
+
+
+def _record_matches(record, bot_id, log_type, since, until):
+    if bot_id is not None and (record.get('bot_id') or '') != bot_id:
+        return False
+    if log_type is not None and record.get('type') != log_type:
+        return False
+    timestamp = record.get('timestamp') or ''
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp > until:
+        return False
+    return True
+
+
+class LogStore:
+    """Buffered, size-rotated, block-indexed NDJSON log store.
+
+    append() only buffers; flush() (called by a background worker, or
+    inline once LOG_STORE_BUFFER_MAX records are waiting) writes the
+    buffer with one write per segment and appends index entries for
+    blocks that filled up. Timestamps are compared as ISO 8601 strings.
+    """
+
+    def __init__(self, directory=LOG_STORE_DIR, segment_max_bytes=LOG_SEGMENT_MAX_BYTES,
+                 max_segments=LOG_STORE_MAX_SEGMENTS, block_records=LOG_INDEX_BLOCK_RECORDS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.block_records = block_records
+
+        self._buffer = []                 # (record, encoded line) not yet written
+        self._lock = threading.Lock()     # guards _buffer and _totals
+        self._totals = Counter()          # bot_id ('' for system logs) -> stored + buffered records
+        self._write_lock = threading.Lock()  # guards segments, index and the active file
+        self.stats = {'appended': 0, 'flushes': 0, 'bytes_written': 0,
+                      'segments_rotated': 0, 'segments_deleted': 0, 'blocks_read': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._load_segments()
+        if not self._segments:
+            self._segments.append(_Segment(directory, 1))
+        for segment in self._segments:
+            self._totals.update(_segment_bots(segment))
+        self._file = open(self._segments[-1].path, 'ab')
+
+    # ==================== LOADING ====================
+
+    def _load_segments(self):
+        """Read every segment's index, re-indexing any unindexed tail"""
+        numbers = sorted(
+            int(match.group(1))
+            for match in (_SEGMENT_RE.match(name) for name in os.listdir(self.directory))
+            if match
+        )
+        segments = []
+
+        for position, number in enumerate(numbers):
+            segment = _Segment(self.directory, number)
+            segment.size = os.path.getsize(segment.path)
+            if os.path.exists(segment.index_path):
+                self._load_index(segment)
+
+            indexed = segment.blocks[-1].offset + segment.blocks[-1].length if segment.blocks else 0
+            if segment.size > indexed:
+                self._index_tail(segment, indexed, last=position == len(numbers) - 1)
+            segments.append(segment)
+
+        return segments
+
+    def _load_index(self, segment):
+        """Read a segment's index up to its last good entry and cut off the rest.
+
+        A crash can leave a torn last line; _index_tail() appends after
+        the good entries, so the garbage must not stay in between.
+        """
+        good = 0
+        with open(segment.index_path, 'rb') as f:
+            for line in f:
+                try:
+                    block = _Block.from_json(line) if line.endswith(b'\n') else None
+                except (ValueError, KeyError):
+                    block = None
+                end = segment.blocks[-1].offset + segment.blocks[-1].length if segment.blocks else 0
+                if block is None or block.offset != end or block.offset + block.length > segment.size:
+                    break  # the tail scan covers whatever this entry described
+                segment.blocks.append(block)
+                good += len(line)
+
+        if good < os.path.getsize(segment.index_path):
+            with open(segment.index_path, 'r+b') as f:
+                f.truncate(good)
+
+    def _index_tail(self, segment, offset, last):
+        """Index records written after the last closed block (e.g. after a crash)"""
+        with open(segment.path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read()
+
+        # Drop a partially written last line
+        end = tail.rfind(b'\n') + 1
+        if end < len(tail):
+            with open(segment.path, 'r+b') as f:
+                f.truncate(offset + end)
+        segment.size = offset + end
+
+        closed = []
+        block = None
+        position = offset
+        for line in tail[:end].splitlines(keepends=True):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            if block is None:
+                block = _Block(position)
+            block.add(record, len(line))
+            position += len(line)
+            if block.count >= self.block_records:
+                closed.append(block)
+                block = None
+
+        if block is not None and not last:
+            closed.append(block)
+            block = None
+
+        segment.blocks.extend(closed)
+        segment.open_block = block
+        if closed:
+            with open(segment.index_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(b.to_json() + '\n' for b in closed))
+
+    # ==================== WRITING ====================
+
+    def append(self, record):
+        """Buffer a record; flushes inline if the buffer is full"""
+        line = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            self._buffer.append((record, line))
+            self._totals[record.get('bot_id') or ''] += 1
+            self.stats['appended'] += 1
+            full = len(self._buffer) >= LOG_STORE_BUFFER_MAX
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records to the active segment(s)"""
+        with self._write_lock:
+            with self._lock:
+                buffer, self._buffer = self._buffer, []
+
+            if not buffer:
+                return 0
+
+            chunk = []
+            index_lines = []
+            for record, line in buffer:
+                segment = self._segments[-1]
+                if segment.size and segment.size + len(line) > self.segment_max_bytes:
+                    self._write_chunk(chunk, index_lines)
+                    chunk, index_lines = [], []
+                    self._rotate()
+                    segment = self._segments[-1]
+
+                if segment.open_block is None:
+                    segment.open_block = _Block(segment.size)
+                segment.open_block.add(record, len(line))
+                segment.size += len(line)
+                chunk.append(line)
+
+                if segment.open_block.count >= self.block_records:
+                    segment.blocks.append(segment.open_block)
+                    index_lines.append(segment.open_block.to_json() + '\n')
+                    segment.open_block = None
+
+            self._write_chunk(chunk, index_lines)
+            self.stats['flushes'] += 1
+            return len(buffer)
+
+    def _write_chunk(self, chunk, index_lines):
+        """Write record lines, then the index entries that cover them"""
+        if chunk:
+            data = b''.join(chunk)
+            self._file.write(data)
+            self._file.flush()
+            self.stats['bytes_written'] += len(data)
+        if index_lines:
+            with open(self._segments[-1].index_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(index_lines))
+
+    def _rotate(self):
+        """Seal the active segment, start a new one and enforce max_segments"""
+        segment = self._segments[-1]
+        if segment.open_block is not None:
+            segment.blocks.append(segment.open_block)
+            with open(segment.index_path, 'a', encoding='utf-8') as f:
+                f.write(segment.open_block.to_json() + '\n')
+            segment.open_block = None
+
+        self._file.close()
+        self._segments.append(_Segment(self.directory, segment.number + 1))
+        self._file = open(self._segments[-1].path, 'ab')
+        self.stats['segments_rotated'] += 1
+
+        while len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            with self._lock:
+                self._totals -= _segment_bots(oldest)
+            for path in (oldest.path, oldest.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.stats['segments_deleted'] += 1
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            self._file.close()
+
+    # ==================== READING ====================
+
+    def _snapshot(self):
+        """(path, blocks) per segment, oldest first, plus buffered records"""
+        with self._write_lock:
+            segments = [
+                (segment.path, segment.blocks + ([segment.open_block.copy()] if segment.open_block else []))
+                for segment in self._segments
+            ]
+            with self._lock:
+                buffered = [record for record, _ in self._buffer]
+        return segments, buffered
+
+    def _read_block(self, path, block):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(block.offset)
+                data = f.read(block.length)
+        except FileNotFoundError:
+            return []  # segment deleted by rotation while we were reading
+
+        self.stats['blocks_read'] += 1
+        records = []
+        for line in data.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def iter_records(self, bot_id=None, log_type=None, since=None, until=None, reverse=False):
+        """Yield matching records oldest first (newest first with reverse=True)"""
+        segments, buffered = self._snapshot()
+
+        def from_disk(segment_list):
+            for path, blocks in segment_list:
+                for block in (reversed(blocks) if reverse else blocks):
+                    if not block.matches(bot_id, log_type, since, until):
+                        continue
+                    records = self._read_block(path, block)
+                    for record in (reversed(records) if reverse else records):
+                        if _record_matches(record, bot_id, log_type, since, until):
+                            yield record
+
+        matching_buffered = [r for r in buffered if _record_matches(r, bot_id, log_type, since, until)]
+        if reverse:
+            yield from reversed(matching_buffered)
+            yield from from_disk(reversed(segments))
+        else:
+            yield from from_disk(segments)
+            yield from matching_buffered
+
+    def query(self, bot_id=None, log_type=None, since=None, until=None, limit=100):
+        """The newest `limit` matching records, oldest first"""
+        records = []
+        if limit <= 0:
+            return records
+        for record in self.iter_records(bot_id, log_type, since, until, reverse=True):
+            records.append(record)
+            if len(records) >= limit:
+                break
+        records.reverse()
+        return records
+
+    def newest(self):
+        """The most recently appended record, or None"""
+        return next(self.iter_records(reverse=True), None)
+
+    def count(self, bot_id=None):
+        """Stored records (for one bot, if given) from the running totals"""
+        with self._lock:
+            if bot_id is None:
+                return sum(self._totals.values())
+            return self._totals.get(bot_id, 0)
+
+    def get_stats(self):
+        with self._write_lock:
+            return {
+                **self.stats,
+                'segments': len(self._segments),
+                'active_segment_bytes': self._segments[-1].size,
+                'buffered': len(self._buffer)
+            }
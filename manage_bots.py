@@ -6,6 +6,50 @@ Script quản lý bots từ command line
 from auth import AuthDB
 import sys
 import json
+import csv
+import itertools
+from pathlib import Path
+
+IMPORT_CHUNK_SIZE = 1000
+
+def iter_import_rows(path):
+    """Stream bot definitions from a .csv or .jsonl file
+
+    CSV: name[,metadata JSON] per row, optional 'name' header.
+    JSONL: one {"name": ..., "metadata": {...}} object (or a plain string) per line.
+    Raises ValueError naming the line of the first malformed row.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.jsonl'):
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"line {line_number}: invalid JSON ({e.msg})")
+                if not isinstance(item, (dict, str)):
+                    raise ValueError(f"line {line_number}: expected an object or a string")
+                yield item if isinstance(item, dict) else {'name': item}
+        else:
+            reader = csv.reader(f)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    raise ValueError(f"line {reader.line_num}: {e}")
+                if not row or not row[0].strip():
+                    continue
+                if row[0].strip().lower() == 'name':
+                    continue
+                try:
+                    metadata = json.loads(row[1]) if len(row) > 1 and row[1].strip() else None
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"line {reader.line_num}: invalid metadata JSON ({e.msg})")
+                yield {'name': row[0], 'metadata': metadata}
 
 def print_help():
     """Print help message"""
@@ -36,6 +80,11 @@ def print_help():
   python manage_bots.py token <bot_id> <user_id>
     → Xem token của bot (chỉ owner)
 
+📥 IMPORT BOTS:
+  python manage_bots.py import <user_id> <file.csv|file.jsonl> [output.csv]
+    → Tạo hàng loạt bot từ file (CSV: name,metadata | JSONL: {"name": ...})
+    → Ghi Bot ID và Token vào output.csv (mặc định: <file>_tokens.csv)
+
 ✏️  UPDATE BOT:
   python manage_bots.py rename <bot_id> <user_id> <new_name>
     → Đổi tên bot
@@ -54,6 +103,10 @@ def print_help():
   python manage_bots.py global-stats
     → Thống kê toàn hệ thống
 
+🧹 MAINTENANCE:
+  python manage_bots.py purge-sessions
+    → Xóa session hết hạn và token reset đã dùng/hết hạn
+
 ═══════════════════════════════════════════════════════════════
 """)
 
@@ -138,6 +191,62 @@ def main():
         else:
             print(f"❌ Error: {result['error']}")
     
+    # ==================== IMPORT COMMAND ====================
+    
+    elif command == 'import':
+        if len(sys.argv) < 4:
+            print("❌ Usage: python manage_bots.py import <user_id> <file.csv|file.jsonl> [output.csv]")
+            return
+        
+        user_id = int(sys.argv[2])
+        input_path = sys.argv[3]
+        output_path = sys.argv[4] if len(sys.argv) > 4 else str(Path(input_path).with_suffix('')) + '_tokens.csv'
+        
+        user = auth_db.get_user_by_id(user_id)
+        if not user:
+            print(f"❌ User ID {user_id} not found")
+            return
+        
+        print(f"\n🔄 Importing bots from {input_path} for {user['username']}...")
+        
+        rows = iter_import_rows(input_path)
+        total = 0
+        chunks = 0
+        error = None
+        
+        with open(output_path, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.writer(out)
+            writer.writerow(['bot_id', 'name', 'token'])
+            
+            # One transaction per chunk so memory stays flat on big files
+            while True:
+                try:
+                    chunk = list(itertools.islice(rows, IMPORT_CHUNK_SIZE))
+                except ValueError as e:
+                    error = f"{input_path} {e}"
+                    break
+                if not chunk:
+                    break
+                
+                result = auth_db.create_bots_bulk(user_id, chunk)
+                if not result['success']:
+                    error = result['error']
+                    break
+                
+                for bot in result['bots']:
+                    writer.writerow([bot['bot_id'], bot['name'], bot['token']])
+                
+                total += result['count']
+                chunks += 1
+                print(f"   ✅ {total} bot(s) created...")
+        
+        if error:
+            print(f"❌ Import stopped: {error}")
+            print(f"   Chunk {chunks + 1} (from bot #{total + 1}) was not imported; fix the file and re-run from there")
+            print(f"   {chunks} earlier chunk(s) of {IMPORT_CHUNK_SIZE} stay committed: {total} bot(s)")
+        print(f"\n📊 Total: {total} bot(s) imported")
+        print(f"🔑 Tokens saved to: {output_path}\n")
+    
     # ==================== INFO COMMAND ====================
     
     elif command == 'info':
@@ -387,6 +496,16 @@ def main():
         print(f"  ⚪ Unknown: {unknown}")
         print()
     
+    # ==================== PURGE-SESSIONS COMMAND ====================
+    
+    elif command == 'purge-sessions':
+        print(f"\n🧹 Purging expired sessions and password reset tokens...")
+        
+        result = auth_db.reap_expired()
+        
+        print(f"✅ Deleted {result['sessions']} expired session(s)")
+        print(f"✅ Deleted {result['password_resets']} used/expired reset token(s)\n")
+    
     # ==================== UNKNOWN COMMAND ====================
     
     else:
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures. The server keeps its database and log store under
+./data, so the whole session runs in a scratch directory.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix='botmanager-tests-'))
+
+PASSWORD = 'Passw0rd!test'
+
+
+@pytest.fixture(scope='session')
+def ws():
+    import web_server
+    return web_server
+
+
+@pytest.fixture
+def user(ws):
+    """A fresh user: {'id', 'username'}"""
+    username = f'u{uuid.uuid4().hex[:10]}'
+    result = ws.auth_db.create_user(username, f'{username}@example.com', PASSWORD)
+    assert result['success'], result
+    return {'id': result['user_id'], 'username': username}
+
+
+@pytest.fixture
+def client(ws, user):
+    """HTTP test client logged in as `user`"""
+    client = ws.app.test_client()
+    response = client.post('/api/auth/login', json={'username': user['username'], 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+@pytest.fixture
+def bot(ws, user):
+    """A bot owned by `user`: {'bot_id', 'token'}"""
+    return ws.auth_db.create_bot(user['id'], f'bot-{uuid.uuid4().hex[:6]}')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Keyset-paginated groups/friends pages"""
+import uuid
+
+import pytest
+
+from conftest import PASSWORD
+
+
+@pytest.fixture
+def synced(ws, bot):
+    friends = [{'id': i, 'name': f'friend {i}' if i % 3 else f'close friend {i}'} for i in range(1, 24)]
+    response = ws.app.test_client().post(f"/api/bot/{bot['bot_id']}/sync", json={'friends': friends},
+                                         headers={'X-Bot-Token': bot['token']})
+    assert response.status_code == 200, response.get_json()
+    return friends
+
+
+def _walk(client, url, **params):
+    """Every page of `url` following next_cursor; returns (pages, items)"""
+    pages, items, cursor = 0, [], None
+    while True:
+        query = {**params, **({'cursor': cursor} if cursor else {})}
+        body = client.get(url, query_string=query).get_json()
+        pages += 1
+        items.extend(body['friends'])
+        assert body['count'] == len(body['friends'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages, items
+
+
+def test_next_cursor_walks_every_entry_once(ws, client, bot, synced):
+    pages, items = _walk(client, f"/api/my-bots/{bot['bot_id']}/data/friends", limit=5)
+
+    assert pages == 5
+    assert sorted(item['id'] for item in items) == list(range(1, 24))
+
+
+def test_exact_multiple_of_limit_has_no_empty_last_page(ws, client, bot, synced):
+    url = f"/api/my-bots/{bot['bot_id']}/data/friends"
+    last = client.get(url, query_string={'limit': 23}).get_json()
+    assert last['count'] == 23
+    assert last['next_cursor'] is None
+
+
+def test_search_is_paginated_too(ws, client, bot, synced):
+    pages, items = _walk(client, f"/api/bot/{bot['bot_id']}/data/friends", q='close', limit=3)
+
+    assert pages == 3
+    assert sorted(item['id'] for item in items) == [3, 6, 9, 12, 15, 18, 21]
+
+
+def test_unknown_collection_and_foreign_bot(ws, client, bot, synced):
+    assert client.get(f"/api/my-bots/{bot['bot_id']}/data/nope").status_code == 404
+
+    username = f'u{uuid.uuid4().hex[:10]}'
+    ws.auth_db.create_user(username, f'{username}@example.com', PASSWORD)
+    stranger = ws.app.test_client()
+    stranger.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    assert stranger.get(f"/api/my-bots/{bot['bot_id']}/data/friends").status_code == 403
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Full and delta bot data sync"""
+import pytest
+
+
+def _sync(ws, bot, payload):
+    return ws.app.test_client().post(f"/api/bot/{bot['bot_id']}/sync", json=payload,
+                                     headers={'X-Bot-Token': bot['token']})
+
+
+def test_delta_applies_on_top_of_full_sync(ws, bot):
+    full = _sync(ws, bot, {'friends': [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]}).get_json()
+    response = _sync(ws, bot, {'mode': 'delta', 'base_hash': full['hash'],
+                               'friends': {'added': [{'id': 3, 'name': 'c'}], 'removed': [1]}})
+    assert response.status_code == 200, response.get_json()
+
+    names = {friend['name'] for friend in ws.auth_db.get_bot_data(bot['bot_id'])['friends']}
+    assert names == {'b', 'c'}
+
+
+@pytest.mark.parametrize('payload', [
+    ['not', 'an', 'object'],
+    {'mode': 'delta', 'base_hash': 'x', 'friends': ['a', 'b']},
+    {'mode': 'delta', 'base_hash': 'x', 'groups': 'abc'},
+    {'mode': 'delta', 'base_hash': 'x', 'friends': {'added': 'abc'}},
+    {'mode': 'delta', 'base_hash': 'x', 'friends': {'removed': {'id': 1}}},
+    {'friends': {'id': 1}},
+])
+def test_malformed_sync_payload_is_400(ws, bot, payload):
+    response = _sync(ws, bot, payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('mode', ['full', 'delta'])
+def test_non_string_entity_names_are_stored(ws, bot, mode):
+    entities = [{'id': 1, 'name': {'first': 'A'}}, {'id': 2, 'name': ['B']}, {'id': 3, 'name': 7}]
+    if mode == 'delta':
+        base = _sync(ws, bot, {'friends': []}).get_json()['hash']
+        payload = {'mode': 'delta', 'base_hash': base, 'friends': {'added': entities}}
+    else:
+        payload = {'friends': entities}
+
+    response = _sync(ws, bot, payload)
+    assert response.status_code == 200, response.get_json()
+    friends = {friend['id']: friend['name'] for friend in ws.auth_db.get_bot_data(bot['bot_id'])['friends']}
+    assert friends == {1: {'first': 'A'}, 2: ['B'], 3: 7}   # payloads round-trip unchanged
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""manage_bots.py import: malformed rows stop the import after committed chunks"""
+import pytest
+
+import manage_bots
+
+
+def _import(monkeypatch, capsys, user, path):
+    monkeypatch.setattr(manage_bots, 'IMPORT_CHUNK_SIZE', 2)
+    monkeypatch.setattr('sys.argv', ['manage_bots.py', 'import', str(user['id']), str(path)])
+    manage_bots.main()
+    return capsys.readouterr().out
+
+
+def test_malformed_jsonl_line_reports_line_and_committed_chunks(ws, user, tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'bots.jsonl'
+    path.write_text('{"name": "a"}\n"b"\n\n{"name": "c"}\n{"name": "d"}\n{"name": \n{"name": "f"}\n',
+                    encoding='utf-8')
+
+    out = _import(monkeypatch, capsys, user, path)
+
+    assert 'line 6: invalid JSON' in out
+    assert 'Chunk 3 (from bot #5) was not imported' in out
+    assert '2 earlier chunk(s) of 2 stay committed: 4 bot(s)' in out
+    names = sorted(bot['name'] for bot in ws.auth_db.get_user_bots(user['id']))
+    assert names == ['a', 'b', 'c', 'd']
+    assert len((tmp_path / 'bots_tokens.csv').read_text(encoding='utf-8').splitlines()) == 5
+
+
+@pytest.mark.parametrize('content, line, committed', [
+    ('name,metadata\na,{}\nb,{not json}\n', 3, 0),
+    ('a\nb,{}\nc,"{""x"": 1"\n', 3, 2),
+])
+def test_bad_csv_row_reports_line(ws, user, tmp_path, monkeypatch, capsys, content, line, committed):
+    path = tmp_path / 'bots.csv'
+    path.write_text(content, encoding='utf-8')
+
+    out = _import(monkeypatch, capsys, user, path)
+
+    assert f'line {line}: invalid metadata JSON' in out
+    assert f'stay committed: {committed} bot(s)' in out
+    assert len(ws.auth_db.get_user_bots(user['id'])) == committed
+
+
+def test_non_object_jsonl_line_is_rejected(ws, user, tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'bots.jsonl'
+    path.write_text('"a"\n[1, 2]\n', encoding='utf-8')
+
+    assert 'line 2: expected an object or a string' in _import(monkeypatch, capsys, user, path)
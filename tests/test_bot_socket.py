@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""/bot Socket.IO namespace: token auth, command push and acks"""
+import uuid
+
+import pytest
+
+
+def _connect(ws, bot):
+    socket = ws.socketio.test_client(ws.app, namespace=ws.BOT_NAMESPACE,
+                                     auth={'bot_id': bot['bot_id'], 'token': bot['token']})
+    assert socket.is_connected(ws.BOT_NAMESPACE)
+    ws.socketio.sleep(0.05)   # let the connect-time push run
+    return socket
+
+
+def _pushed(ws, socket):
+    return [e['args'][0] for e in socket.get_received(ws.BOT_NAMESPACE) if e['name'] == 'command']
+
+
+@pytest.fixture
+def socket(ws, bot):
+    socket = _connect(ws, bot)
+    yield socket
+    if socket.is_connected(ws.BOT_NAMESPACE):
+        socket.disconnect(ws.BOT_NAMESPACE)
+
+
+def test_bad_token_is_refused(ws, bot):
+    socket = ws.socketio.test_client(ws.app, namespace=ws.BOT_NAMESPACE,
+                                     auth={'bot_id': bot['bot_id'], 'token': 'wrong'})
+    assert not socket.is_connected(ws.BOT_NAMESPACE)
+    assert bot['bot_id'] not in ws.bot_socket_sids
+
+
+def test_backlog_is_pushed_on_connect_and_new_commands_live(ws, bot):
+    queued = [ws._enqueue_command(bot['bot_id'], 'ping', {'n': i}) for i in range(3)]
+    socket = _connect(ws, bot)
+
+    received = _pushed(ws, socket)
+    assert [c['id'] for c in received] == [c['id'] for c in queued]
+    assert all(c['status'] == 'dispatched' for c in queued)
+
+    live = ws._enqueue_command(bot['bot_id'], 'ping', {})
+    assert [c['id'] for c in _pushed(ws, socket)] == [live['id']]
+    socket.disconnect(ws.BOT_NAMESPACE)
+    assert bot['bot_id'] not in ws.bot_socket_sids
+
+
+def test_ack_callback_and_late_ack_complete_commands(ws, bot, socket):
+    first = ws._enqueue_command(bot['bot_id'], 'ping', {})
+    second = ws._enqueue_command(bot['bot_id'], 'ping', {})
+    assert len(_pushed(ws, socket)) == 2
+
+    # What the Socket.IO ack callback of the push does
+    ws._handle_command_ack(first['id'], {'status': 'failed', 'result': {'error': 'boom'}})
+    assert (first['status'], first['result']) == ('failed', {'error': 'boom'})
+
+    reply = socket.emit('command_ack', {'command_id': second['id'], 'result': {'ok': True}},
+                        namespace=ws.BOT_NAMESPACE, callback=True)
+    assert reply == {'status': 'ok'}
+    assert (second['status'], second['result']) == ('completed', {'ok': True})
+    assert second['completed_at']
+
+
+def test_ack_for_another_bots_command_is_rejected(ws, socket):
+    other = ws._enqueue_command(f'other-{uuid.uuid4().hex[:8]}', 'ping', {})
+
+    reply = socket.emit('command_ack', {'command_id': other['id']}, namespace=ws.BOT_NAMESPACE, callback=True)
+
+    assert reply['status'] == 'error'
+    assert other['status'] == 'pending'
+
+
+def test_status_heartbeat_over_socket(ws, bot, socket):
+    reply = socket.emit('status', {'status': 'online'}, namespace=ws.BOT_NAMESPACE, callback=True)
+
+    assert reply == {'status': 'ok'}
+    assert ws.bot_instances[bot['bot_id']]['status'] == 'online'
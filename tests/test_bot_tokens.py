@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Signed bot token verification"""
+
+
+def test_valid_token_verifies(ws, bot):
+    assert ws.auth_db.verify_bot_token(bot['bot_id'], bot['token'])
+
+
+def test_non_ascii_signature_is_rejected_not_an_error(ws, bot):
+    prefix = bot['token'].rsplit('.', 1)[0]
+    assert not ws.auth_db.verify_bot_token(bot['bot_id'], prefix + '.sïgnätüré')
+    assert not ws.auth_db.verify_bot_token(bot['bot_id'], prefix + '.\ud800')
+
+    response = ws.app.test_client().post(f"/api/bot/{bot['bot_id']}/sync", json={'token': prefix + '.ü'})
+    assert response.status_code == 401
+
+
+def test_tampered_signature_is_rejected(ws, bot):
+    prefix, signature = bot['token'].rsplit('.', 1)
+    flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+    assert not ws.auth_db.verify_bot_token(bot['bot_id'], f'{prefix}.{flipped}')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Command broadcasts to many bots and batch progress"""
+import uuid
+
+import pytest
+
+from conftest import PASSWORD
+
+
+def _bots(ws, user, count, **metadata):
+    return [ws.auth_db.create_bot(user['id'], f'b-{uuid.uuid4().hex[:6]}', metadata or None)['bot_id']
+            for _ in range(count)]
+
+
+def _other_client(ws):
+    username = f'o{uuid.uuid4().hex[:10]}'
+    ws.auth_db.create_user(username, f'{username}@example.com', PASSWORD)
+    client = ws.app.test_client()
+    client.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    return client
+
+
+def test_broadcast_to_own_bots_skips_others(ws, client, user):
+    own = _bots(ws, user, 3)
+    response = client.post('/api/commands/broadcast', json={'type': 'ping', 'bot_ids': own + ['not-mine']})
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['count'] == 3 and body['skipped'] == ['not-mine']
+    assert body['batch']['counts'] == {'pending': 3} and not body['batch']['done']
+
+
+def test_selector_matches_by_tag(ws, client, user):
+    tagged = _bots(ws, user, 2, tags=['eu'])
+    _bots(ws, user, 2, tags=['us'])
+    response = client.post('/api/commands/broadcast', json={'type': 'ping', 'selector': {'tag': 'eu'}})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['count'] == 2
+    for bot_id in tagged:
+        assert [c['type'] for c in ws.app.test_client().get(f'/api/bot/{bot_id}/commands').get_json()['commands']] == ['ping']
+
+
+@pytest.mark.parametrize('selector', [
+    {'owner_id': {'$ne': 1}},
+    {'status': ['online', 'offline']},
+    {'tag': {'a': 1}},
+    {'owner_id': True},
+    'online',
+])
+def test_malformed_selector_is_400(ws, client, user, selector):
+    _bots(ws, user, 1)
+    response = client.post('/api/commands/broadcast', json={'type': 'ping', 'selector': selector})
+    assert response.status_code == 400
+    assert 'selector' in response.get_json()['error']
+
+
+def test_batch_progress_follows_acks(ws, client, user):
+    bot_ids = _bots(ws, user, 2)
+    batch_id = client.post('/api/commands/broadcast',
+                           json={'type': 'ping', 'bot_ids': bot_ids}).get_json()['batch']['id']
+
+    bot_client = ws.app.test_client()
+    commands = [bot_client.get(f'/api/bot/{bot_id}/commands').get_json()['commands'][0] for bot_id in bot_ids]
+    bot_client.post(f"/api/commands/{commands[0]['id']}/ack", json={'status': 'completed'})
+
+    batch = client.get(f'/api/commands/batches/{batch_id}').get_json()['batch']
+    assert batch['counts'] == {'completed': 1, 'dispatched': 1} and not batch['done']
+
+    bot_client.post(f"/api/commands/{commands[1]['id']}/ack", json={'status': 'failed'})
+    batch = client.get(f'/api/commands/batches/{batch_id}').get_json()['batch']
+    assert batch['counts'] == {'completed': 1, 'failed': 1} and batch['done']
+
+    assert _other_client(ws).get(f'/api/commands/batches/{batch_id}').status_code == 403
+    assert client.get('/api/commands/batches/batch_missing').status_code == 404
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Per-bot status/type counters stay equal to a recount of the history window"""
+from collections import Counter
+
+import pytest
+
+
+@pytest.fixture
+def small_history(monkeypatch, ws):
+    """Fresh shards whose per-bot history keeps only four commands"""
+    monkeypatch.setattr(ws, 'MAX_COMMANDS_PER_BOT', 4)
+    monkeypatch.setattr(ws, 'command_shards', [ws.CommandShard() for _ in range(ws.COMMAND_SHARDS)])
+
+
+def _assert_counters_match_history(ws, bot_id):
+    shard = ws._shard_for(bot_id)
+    with shard.lock:
+        history = list(shard.history[bot_id])
+        counts = +shard.counts[bot_id]     # unary + drops zero entries
+        types = +shard.types[bot_id]
+    assert counts == Counter(c['status'] for c in history)
+    assert types == Counter(c['type'] for c in history)
+
+
+def _fetch(ws, bot_id, limit):
+    response = ws.app.test_client().get(f'/api/bot/{bot_id}/commands', query_string={'limit': limit})
+    return response.get_json()['commands']
+
+
+def test_counters_follow_enqueue_dispatch_ack_and_eviction(ws, client, bot, small_history):
+    bot_id = bot['bot_id']
+    commands = [ws._enqueue_command(bot_id, 'ping' if i % 2 else 'restart', {}) for i in range(3)]
+    ws._enqueue_command(bot_id, 'ping', {}, run_at=4102444800)   # 2100-01-01, stays scheduled
+    _assert_counters_match_history(ws, bot_id)
+
+    assert len(_fetch(ws, bot_id, 2)) == 2
+    _assert_counters_match_history(ws, bot_id)
+
+    ws._ack_command(commands[0]['id'], 'completed', {})
+    ws._ack_command(commands[1]['id'], 'failed', {})
+    _assert_counters_match_history(ws, bot_id)
+
+    stats = client.get(f'/api/stats/bot/{bot_id}').get_json()
+    assert stats['total_commands'] == 4
+    assert (stats['pending_commands'], stats['scheduled_commands']) == (1, 1)
+    assert (stats['completed_commands'], stats['failed_commands']) == (1, 1)
+    assert stats['command_types'] == {'ping': 2, 'restart': 2}
+
+    # Two more push the completed and failed commands out of the window
+    ws._enqueue_command(bot_id, 'status', {})
+    ws._enqueue_command(bot_id, 'status', {})
+    _assert_counters_match_history(ws, bot_id)
+
+    stats = client.get(f'/api/stats/bot/{bot_id}').get_json()
+    assert stats['total_commands'] == 4
+    assert (stats['pending_commands'], stats['completed_commands'], stats['failed_commands']) == (3, 0, 0)
+    assert stats['command_types'] == {'ping': 1, 'restart': 1, 'status': 2}
+
+
+def test_undelivered_command_evicted_from_window_counts_as_gone(ws, bot, small_history):
+    bot_id = bot['bot_id']
+    first = ws._enqueue_command(bot_id, 'ping', {})
+    for _ in range(4):
+        ws._enqueue_command(bot_id, 'ping', {})
+
+    assert first['status'] == 'expired'
+    _assert_counters_match_history(ws, bot_id)
+    delivered = [c['id'] for c in _fetch(ws, bot_id, 10)]
+    assert len(delivered) == 4 and first['id'] not in delivered
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""At-least-once delivery: visibility timeout requeue, dead-letter, replay after restart"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def bot_id():
+    return f'delivery-{uuid.uuid4().hex[:8]}'
+
+
+@pytest.fixture
+def expire_at_once(monkeypatch, ws):
+    """Dispatched commands become visible again on the next sweep (fresh shards,
+    so no deadline left by another test sits ahead in the in-flight queue)"""
+    monkeypatch.setattr(ws, 'COMMAND_VISIBILITY_TIMEOUT', 0)
+    monkeypatch.setattr(ws, 'command_shards', [ws.CommandShard() for _ in range(ws.COMMAND_SHARDS)])
+
+
+def _fetch(ws, bot_id):
+    response = ws.app.test_client().get(f'/api/bot/{bot_id}/commands')
+    assert response.status_code == 200
+    return response.get_json()['commands']
+
+
+def _stored_status(ws, command_id):
+    ws.command_journal.flush()
+    conn = ws.auth_db.get_connection()
+    row = conn.execute('SELECT status, attempts FROM commands WHERE id = ?', (command_id,)).fetchone()
+    conn.close()
+    return tuple(row) if row else None
+
+
+def test_expired_command_is_requeued(ws, bot_id, expire_at_once):
+    command = ws._enqueue_command(bot_id, 'ping', {})
+    assert [c['id'] for c in _fetch(ws, bot_id)] == [command['id']]
+    assert _fetch(ws, bot_id) == []             # invisible until the sweep
+
+    assert ws._requeue_expired_commands()[0] >= 1
+    assert command['status'] == 'pending'
+    redelivered = _fetch(ws, bot_id)
+    assert [c['id'] for c in redelivered] == [command['id']]
+    assert redelivered[0]['attempts'] == 2
+
+
+def test_acked_command_is_not_requeued(ws, bot_id, expire_at_once):
+    command = ws._enqueue_command(bot_id, 'ping', {})
+    _fetch(ws, bot_id)
+    ws._ack_command(command['id'], 'completed', {})
+
+    ws._requeue_expired_commands()
+    assert command['status'] == 'completed'
+    assert _fetch(ws, bot_id) == []
+
+
+def test_dead_letter_after_max_attempts(monkeypatch, ws, bot_id, expire_at_once):
+    monkeypatch.setattr(ws, 'COMMAND_MAX_ATTEMPTS', 2)
+    command = ws._enqueue_command(bot_id, 'ping', {})
+
+    for _ in range(2):
+        assert len(_fetch(ws, bot_id)) == 1
+        ws._requeue_expired_commands()
+
+    assert command['status'] == 'dead_letter'
+    assert _fetch(ws, bot_id) == []
+    assert _stored_status(ws, command['id']) == ('dead_letter', 2)
+
+
+def test_open_commands_are_replayed_after_restart(monkeypatch, ws, bot_id):
+    dispatched = ws._enqueue_command(bot_id, 'first', {})
+    _fetch(ws, bot_id)
+    done = ws._enqueue_command(bot_id, 'second', {})
+    _fetch(ws, bot_id)
+    ws._ack_command(done['id'], 'completed', {})
+    pending = ws._enqueue_command(bot_id, 'third', {})
+    ws.command_journal.flush()
+    last_seq = pending['seq']
+
+    # Restart: empty in-memory state, rebuilt from the command table
+    monkeypatch.setattr(ws, 'command_shards', [ws.CommandShard() for _ in range(ws.COMMAND_SHARDS)])
+    monkeypatch.setattr(ws, 'commands_by_id', {})
+    monkeypatch.setattr(ws, 'command_counter', ws.command_counter)
+    ws._replay_commands()
+
+    assert ws.commands_by_id[pending['id']]['status'] == 'pending'
+    assert ws.commands_by_id[dispatched['id']]['status'] == 'dispatched'
+    assert done['id'] not in ws.commands_by_id
+    assert [c['id'] for c in _fetch(ws, bot_id)] == [pending['id']]
+
+    inflight = {command_id for _, command_id, _ in ws._shard_for(bot_id).inflight}
+    assert dispatched['id'] in inflight          # still awaits its ack, with a fresh timeout
+    assert next(ws.command_counter) > last_seq   # new commands never reuse a seq
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Bot command polling: ?wait= long polls and argument validation"""
+import time
+import uuid
+
+import gevent
+import pytest
+
+
+@pytest.mark.parametrize('wait', ['nan', 'NaN', 'inf', '-inf', 'soon'])
+def test_non_finite_or_non_numeric_wait_is_rejected(ws, wait):
+    client = ws.app.test_client()
+    # Must answer at once: a NaN wait used to park the request forever
+    with gevent.Timeout(2):
+        response = client.get(f'/api/bot/poll-{uuid.uuid4().hex[:6]}/commands?wait={wait}')
+    assert response.status_code == 400
+    assert 'wait' in response.get_json()['error']
+
+
+def test_bad_limit_is_rejected(ws):
+    response = ws.app.test_client().get('/api/bot/poll-x/commands?limit=ten')
+    assert response.status_code == 400
+
+
+def test_long_poll_returns_when_a_command_arrives(ws):
+    bot_id = f'poll-{uuid.uuid4().hex[:6]}'
+    client = ws.app.test_client()
+    gevent.spawn_later(0.1, ws._enqueue_command, bot_id, 'ping', {})
+
+    started = time.monotonic()
+    response = client.get(f'/api/bot/{bot_id}/commands?wait=5')
+    assert response.status_code == 200
+    assert [c['type'] for c in response.get_json()['commands']] == ['ping']
+    assert time.monotonic() - started < 2
+
+
+def test_long_poll_times_out_empty(ws):
+    response = ws.app.test_client().get(f'/api/bot/poll-{uuid.uuid4().hex[:6]}/commands?wait=0.2')
+    assert response.get_json() == {'commands': [], 'count': 0}
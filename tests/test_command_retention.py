@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Command retention: in-memory trim and DB purge of closed commands"""
+import json
+import time
+import uuid
+
+
+def _insert_command(ws, status, updated_at):
+    command_id = f'old-{uuid.uuid4().hex[:8]}'
+    conn = ws.auth_db.get_connection()
+    conn.execute('''
+        INSERT INTO commands (id, seq, bot_id, type, status, attempts, body, updated_at)
+        VALUES (?, 0, 'gone', 'ping', ?, 1, ?, ?)
+    ''', (command_id, status, json.dumps({'id': command_id, 'status': status}), updated_at))
+    conn.commit()
+    conn.close()
+    return command_id
+
+
+def _stored_ids(ws):
+    conn = ws.auth_db.get_connection()
+    ids = {row['id'] for row in conn.execute('SELECT id FROM commands')}
+    conn.close()
+    return ids
+
+
+def test_purge_deletes_only_old_closed_rows(ws):
+    old_done = _insert_command(ws, 'completed', '2000-01-01 00:00:00')
+    old_open = _insert_command(ws, 'pending', '2000-01-01 00:00:00')
+    recent_done = _insert_command(ws, 'failed', '2999-01-01 00:00:00')
+
+    assert ws.auth_db.purge_closed_commands(3600, batch_size=1, pause=0) >= 1
+    stored = _stored_ids(ws)
+    assert old_done not in stored
+    assert {old_open, recent_done} <= stored
+
+
+def test_retention_skips_open_commands_in_place(monkeypatch, ws):
+    monkeypatch.setattr(ws, 'COMMAND_RETENTION_MAX', 3 * ws.COMMAND_SHARDS)
+    shard = ws.CommandShard()
+    old = time.monotonic() - ws.COMMAND_RETENTION_SECONDS - 10
+    commands = [{'id': f'r{i}', 'status': status}
+                for i, status in enumerate(['dispatched', 'completed', 'completed', 'completed'])]
+    for command in commands:
+        ws.commands_by_id[command['id']] = command
+        ws._adjust_totals(shard, (command['status'], 1))
+    shard.retired.extend([(old, commands[0]), (old, commands[1]),
+                          (time.monotonic(), commands[2]), (time.monotonic(), commands[3])])
+
+    assert ws._enforce_command_retention(shard) == 1
+    assert [command['id'] for _, command in shard.retired] == ['r0', 'r2', 'r3']
+    assert shard.retired[0][0] == old  # original timestamp, still at the front
+
+
+def test_dead_lettered_row_is_stored_with_completed_at(monkeypatch, ws):
+    monkeypatch.setattr(ws, 'COMMAND_VISIBILITY_TIMEOUT', 0)
+    monkeypatch.setattr(ws, 'COMMAND_MAX_ATTEMPTS', 1)
+    # Fresh shards: in-flight deadlines left by other tests would sit ahead of this one
+    monkeypatch.setattr(ws, 'command_shards', [ws.CommandShard() for _ in range(ws.COMMAND_SHARDS)])
+    bot_id = f'dead-{uuid.uuid4().hex[:6]}'
+    command = ws._enqueue_command(bot_id, 'ping', {})
+    ws.app.test_client().get(f'/api/bot/{bot_id}/commands')
+    ws._requeue_expired_commands()
+    ws.command_journal.flush()
+
+    conn = ws.auth_db.get_connection()
+    row = conn.execute('SELECT status, body FROM commands WHERE id = ?', (command['id'],)).fetchone()
+    conn.close()
+    assert row['status'] == 'dead_letter'
+    assert json.loads(row['body'])['completed_at'] == command['completed_at']
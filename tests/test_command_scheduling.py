@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Scheduled commands: run_at parsing and validation"""
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize('run_at', [1e20, -1e20, float('inf'), float('nan'), '10000-01-01T00:00:00', 'soon', [1]])
+def test_invalid_run_at_is_rejected(ws, run_at):
+    client = ws.app.test_client()
+    response = client.post('/api/commands', json={'bot_id': 'b', 'type': 'ping', 'run_at': run_at})
+    assert response.status_code == 400
+    assert 'run_at' in response.get_json()['error']
+
+
+def test_future_run_at_is_scheduled_as_naive_utc(ws):
+    client = ws.app.test_client()
+    run_at = int(time.time()) + 3600
+    response = client.post('/api/commands', json={'bot_id': 'sched-bot', 'type': 'ping', 'run_at': run_at})
+    assert response.status_code == 200
+    command = response.get_json()['command']
+    assert command['status'] == 'scheduled'
+    assert ws._parse_run_at(command['run_at']) == run_at
+    assert '+' not in command['run_at']
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""SQLite connection pool: total bound, exception safety, no connection held while hashing"""
+import sqlite3
+
+import gevent
+import pytest
+
+import auth
+from conftest import PASSWORD
+
+
+def test_total_open_connections_are_bounded(ws, tmp_path):
+    # ws: the server's gevent monkey-patching makes the pool greenlet-local
+    pool = auth.ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, max_open=2, timeout=0.2)
+
+    def hold():
+        conn = pool.acquire()
+        gevent.sleep(0.5)
+        conn.close()
+
+    workers = [gevent.spawn(hold) for _ in range(2)]
+    gevent.sleep(0.05)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+
+    gevent.joinall(workers)
+    conn = pool.acquire()   # a returned connection can be borrowed again
+    conn.close()
+    assert pool.stats['opened'] == 2
+    assert pool._open == 1  # the surplus one was closed, not kept idle
+
+
+def test_waiter_gets_released_connection(ws, tmp_path):
+    pool = auth.ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, max_open=1, timeout=2)
+    first = pool.acquire()
+    gevent.spawn_later(0.1, first.close)
+
+    second = gevent.spawn(pool.acquire).get(timeout=2)
+    second.close()
+    assert pool.stats['waits'] >= 1
+    assert pool.stats['opened'] == 1
+
+
+def test_exception_rolls_back_and_unpins(tmp_path):
+    class Store:
+        pool = auth.ConnectionPool(str(tmp_path / 'pool.db'))
+
+        @auth._pooled
+        def write_then_fail(self):
+            conn = self.pool.acquire()
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError('before commit/close')
+
+    store = Store()
+    setup = store.pool.acquire()
+    setup.execute('CREATE TABLE t (x INTEGER)')
+    setup.commit()
+    setup.close()
+
+    with pytest.raises(RuntimeError):
+        store.write_then_fail()
+
+    assert store.pool.depth() == 0
+    conn = store.pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    conn.close()
+
+
+def test_nested_failure_keeps_outer_connection(ws):
+    pool = ws.auth_db.pool
+    outer = pool.acquire()
+    pool.acquire()               # nested user that never closes
+    pool.unwind(1)
+    assert pool.depth() == 1 and outer._conn is not None
+    outer.close()
+    assert pool.depth() == 0
+
+
+@pytest.fixture
+def hashing_depths(monkeypatch, ws):
+    """Pool depth of the calling greenlet each time a KDF call is offloaded"""
+    depths = []
+    offload = auth._run_in_os_thread
+
+    def spy(func, *args):
+        depths.append(ws.auth_db.pool.depth())
+        return offload(func, *args)
+
+    monkeypatch.setattr(auth, '_run_in_os_thread', spy)
+    return depths
+
+
+def test_authenticate_releases_connection_while_hashing(monkeypatch, ws, user, hashing_depths):
+    monkeypatch.setattr(auth, 'SCRYPT_N', 2 ** 15)   # forces a rehash: verify + hash
+    assert ws.auth_db.authenticate(user['username'], PASSWORD)['success']
+    assert hashing_depths == [0, 0]
+
+
+def test_create_and_change_password_release_connection_while_hashing(ws, user, hashing_depths):
+    assert ws.auth_db.create_user(f"{user['username']}x", f"{user['username']}x@example.com", PASSWORD)['success']
+    assert ws.auth_db.change_password(user['id'], PASSWORD, PASSWORD + '2')['success']
+    assert hashing_depths == [0, 0, 0]
+
+
+def test_reset_password_releases_connection_and_token_is_single_use(ws, user, hashing_depths):
+    token = ws.auth_db.create_password_reset_token(f"{user['username']}@example.com")['token']
+    assert ws.auth_db.reset_password(token, PASSWORD + '3')['success']
+    assert hashing_depths == [0]
+    assert not ws.auth_db.reset_password(token, PASSWORD + '4')['success']
+    assert ws.auth_db.authenticate(user['username'], PASSWORD + '3')['success']
+
+
+def test_change_password_loses_to_a_concurrent_change(monkeypatch, ws, user):
+    verify = ws.auth_db.verify_password
+
+    def verify_then_race(password, password_hash):
+        ok = verify(password, password_hash)
+        conn = ws.auth_db.get_connection()   # another request changes it meanwhile
+        conn.execute("UPDATE users SET password_hash = 'other' WHERE id = ?", (user['id'],))
+        conn.commit()
+        conn.close()
+        return ok
+
+    monkeypatch.setattr(ws.auth_db, 'verify_password', verify_then_race)
+    assert not ws.auth_db.change_password(user['id'], PASSWORD, 'new-password')['success']
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Streamed JSON / NDJSON exports"""
+import gzip
+import json
+
+
+def test_bot_data_export_formats_return_the_same_logs(ws, client, bot):
+    bot_id = bot['bot_id']
+    count = ws.MAX_LOGS + 50            # more than the in-memory tail holds
+    for i in range(count):
+        ws.add_log('info', f'export {i}', bot_id=bot_id)
+
+    document = json.loads(client.get(f'/api/export/bot-data/{bot_id}').get_data())
+    lines = [json.loads(line) for line in client.get(f'/api/export/bot-data/{bot_id}?format=ndjson').get_data().splitlines()]
+    ndjson_logs = [line['record'] for line in lines if line['section'] == 'log']
+
+    assert [log['message'] for log in document['logs']] == [f'export {i}' for i in range(count)]
+    assert document['logs'] == ndjson_logs
+    assert document['bot']['id'] == bot_id
+
+
+def test_export_is_gzipped_when_accepted(ws, client, bot):
+    ws.add_log('info', 'gzipped', bot_id=bot['bot_id'])
+    response = client.get(f"/api/export/logs?bot_id={bot['bot_id']}&format=ndjson",
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    records = [json.loads(line) for line in gzip.decompress(response.get_data()).splitlines()]
+    assert [r['message'] for r in records] == ['gzipped']
+
+
+def test_unknown_export_format_is_400(client, bot):
+    assert client.get(f"/api/export/bot-data/{bot['bot_id']}?format=xml").status_code == 400
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""seq cursors on /api/logs and /api/messages"""
+import uuid
+
+
+def _add_logs(ws, bot_id, count, log_type='info'):
+    for i in range(count):
+        ws.add_log(log_type, f'{log_type} {i}', bot_id=bot_id)
+
+
+def test_since_seq_pages_forward_and_before_seq_backward(ws):
+    bot_id = f'cursor-{uuid.uuid4().hex[:6]}'
+    start = ws.logs_storage.last_seq
+    _add_logs(ws, bot_id, 25)
+    client = ws.app.test_client()
+
+    seqs, cursor = [], start
+    while True:
+        page = client.get(f'/api/logs?bot_id={bot_id}&since_seq={cursor}&limit=10').get_json()
+        assert not page['gap']
+        if not page['logs']:
+            break
+        seqs += [log['seq'] for log in page['logs']]
+        cursor = page['logs'][-1]['seq']
+    assert seqs == list(range(start + 1, start + 26))
+
+    page = client.get(f'/api/logs?bot_id={bot_id}&before_seq={start + 11}&limit=5').get_json()
+    assert [log['seq'] for log in page['logs']] == list(range(start + 6, start + 11))
+
+
+def test_cursor_combines_with_type_and_time_filters(ws):
+    bot_id = f'cursor-{uuid.uuid4().hex[:6]}'
+    start = ws.logs_storage.last_seq
+    for i in range(10):
+        ws.add_log('error' if i % 2 else 'info', f'm{i}', bot_id=bot_id)
+    client = ws.app.test_client()
+
+    page = client.get(f'/api/logs?bot_id={bot_id}&since_seq={start}&type=error&limit=3').get_json()
+    assert [log['type'] for log in page['logs']] == ['error'] * 3
+    assert [log['seq'] for log in page['logs']] == [start + 2, start + 4, start + 6]
+
+    page = client.get(f'/api/logs?bot_id={bot_id}&before_seq={start + 100}&type=info&limit=2').get_json()
+    assert [log['seq'] for log in page['logs']] == [start + 7, start + 9]
+
+    page = client.get(f'/api/logs?bot_id={bot_id}&since_seq={start}&until=2000-01-01').get_json()
+    assert page['logs'] == []
+
+
+def test_gap_when_cursor_range_was_evicted(ws):
+    buffer = ws.BotIndexedBuffer(5)
+    for i in range(12):
+        buffer.append({'bot_id': 'b', 'i': i})
+
+    records, gap = buffer.after(2, 10)
+    assert gap and records[0]['seq'] == 8
+    records, gap = buffer.after(8, 10)
+    assert not gap and [r['seq'] for r in records] == [9, 10, 11, 12]
+    records, gap = buffer.after(99, 10)
+    assert gap  # cursor from before a restart
+    records, gap = buffer.before(9, 10)
+    assert gap and [r['seq'] for r in records] == [8]
+
+
+def test_since_seq_refresh_payload_is_smaller(ws):
+    """Bytes per dashboard refresh: last 100 every time vs. only new entries"""
+    client = ws.app.test_client()
+    bot_id = f'cursor-{uuid.uuid4().hex[:6]}'
+    _add_logs(ws, bot_id, 100)
+    cursor = ws.logs_storage.last_seq
+    full_bytes = cursor_bytes = 0
+
+    for _ in range(10):
+        _add_logs(ws, bot_id, 5)
+        full_bytes += len(client.get('/api/logs?limit=100').data)
+        response = client.get(f'/api/logs?since_seq={cursor}&limit=100')
+        cursor_bytes += len(response.data)
+        cursor = response.get_json()['last_seq']
+
+    print(f'bytes/refresh: limit=100 {full_bytes / 10:.0f}, since_seq {cursor_bytes / 10:.0f}')
+    assert cursor_bytes * 5 < full_bytes
+
+
+def test_out_of_range_timestamps_are_rejected(ws, client):
+    for value in ('inf', '-inf', 'nan', '1e20'):
+        assert ws.app.test_client().get(f'/api/logs?since={value}').status_code == 400
+        assert client.get(f'/api/export/logs?until={value}').status_code == 400
+
+
+def test_non_positive_limit_is_rejected(ws, client):
+    assert client.get('/api/logs?limit=0').status_code == 400
+    assert client.get('/api/logs?limit=-5&type=info').status_code == 400
+    assert client.get('/api/export/logs?limit=0').status_code == 400
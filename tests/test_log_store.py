@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""LogStore: crash recovery, rotation and block-pruned queries"""
+import json
+import os
+
+from log_store import LogStore
+
+
+def _record(i, bot_id='bot-a', log_type='info'):
+    return {'timestamp': f'2026-01-01T00:{i // 60:02d}:{i % 60:02d}', 'bot_id': bot_id,
+            'type': log_type, 'message': f'message {i}'}
+
+
+def _fill(store, count, **kwargs):
+    for i in range(count):
+        store.append(_record(i, **kwargs))
+    store.flush()
+
+
+def _segment_files(directory, suffix):
+    return sorted(name for name in os.listdir(directory) if name.endswith(suffix))
+
+
+def test_reopen_reads_index_and_unindexed_tail(tmp_path):
+    store = LogStore(str(tmp_path), block_records=10)
+    _fill(store, 25)    # two closed blocks, five records in the open block
+    store.close()
+
+    reopened = LogStore(str(tmp_path), block_records=10)
+    assert reopened.count() == 25
+    assert [r['message'] for r in reopened.query(limit=3)] == ['message 22', 'message 23', 'message 24']
+
+
+def test_torn_segment_line_is_dropped(tmp_path):
+    store = LogStore(str(tmp_path), block_records=10)
+    _fill(store, 5)
+    store.close()
+    segment = os.path.join(tmp_path, _segment_files(tmp_path, '.log')[0])
+    with open(segment, 'ab') as f:
+        f.write(b'{"timestamp": "2026-01-01T00:00:06", "bot_')
+
+    reopened = LogStore(str(tmp_path), block_records=10)
+    assert reopened.count() == 5
+    reopened.append(_record(6))
+    reopened.close()
+    assert LogStore(str(tmp_path), block_records=10).query(limit=1)[0]['message'] == 'message 6'
+
+
+def test_torn_index_line_is_truncated_before_reindexing(tmp_path):
+    store = LogStore(str(tmp_path), block_records=10)
+    _fill(store, 20)
+    store.close()
+    index = os.path.join(tmp_path, _segment_files(tmp_path, '.idx')[0])
+    with open(index, 'rb') as f:
+        first_line = f.readline()
+    with open(index, 'r+b') as f:
+        f.truncate(len(first_line) + 15)     # second entry torn mid-line
+
+    reopened = LogStore(str(tmp_path), block_records=10)
+    assert reopened.count() == 20
+    _fill(reopened, 10)
+    reopened.close()
+
+    with open(index, 'rb') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3                    # garbage gone, re-indexed entries follow the good one
+    blocks = [json.loads(line) for line in lines]
+    assert all(b['offset'] == a['offset'] + a['length'] for a, b in zip(blocks, blocks[1:]))
+    final = LogStore(str(tmp_path), block_records=10)
+    assert final.count() == 30
+    assert sum(1 for _ in final.iter_records()) == 30
+
+
+def test_rotation_deletes_oldest_segments(tmp_path):
+    store = LogStore(str(tmp_path), segment_max_bytes=2000, max_segments=3, block_records=5)
+    _fill(store, 200)
+    stats = store.get_stats()
+
+    assert stats['segments_rotated'] > 3
+    assert stats['segments_deleted'] == stats['segments_rotated'] + 1 - 3
+    assert len(_segment_files(tmp_path, '.log')) == 3
+    assert len(_segment_files(tmp_path, '.idx')) == 3
+    assert store.query(limit=1)[0]['message'] == 'message 199'
+    messages = [r['message'] for r in store.iter_records()]
+    assert messages == sorted(messages, key=lambda m: int(m.split()[1]))  # ordered across segments
+    store.close()
+
+    assert LogStore(str(tmp_path), segment_max_bytes=2000, max_segments=3, block_records=5).count() == len(messages)
+
+
+def test_queries_only_read_matching_blocks(tmp_path):
+    store = LogStore(str(tmp_path), block_records=10)
+    for i in range(100):
+        store.append(_record(i, bot_id='bot-a' if i < 50 else 'bot-b',
+                             log_type='error' if i == 75 else 'info'))
+    store.flush()
+
+    store.stats['blocks_read'] = 0
+    assert len(store.query(bot_id='bot-b', limit=1000)) == 50
+    assert store.stats['blocks_read'] == 5
+
+    store.stats['blocks_read'] = 0
+    assert [r['message'] for r in store.query(log_type='error')] == ['message 75']
+    assert store.stats['blocks_read'] == 1
+
+    store.stats['blocks_read'] = 0
+    in_range = store.query(since='2026-01-01T00:00:20', until='2026-01-01T00:00:29', limit=1000)
+    assert len(in_range) == 10
+    assert store.stats['blocks_read'] == 1
+    assert store.count(bot_id='bot-a') == 50
+
+
+def test_non_positive_limit_returns_nothing(tmp_path):
+    store = LogStore(str(tmp_path), block_records=10)
+    _fill(store, 5)
+    assert store.query(limit=0) == []
+    assert store.query(limit=-1) == []
+    assert len(store.query(limit=1)) == 1
+
+
+def test_per_bot_totals_track_appends_rotation_and_reopen(tmp_path):
+    options = {'segment_max_bytes': 2000, 'max_segments': 3, 'block_records': 5}
+    store = LogStore(str(tmp_path), **options)
+    for i in range(200):
+        store.append(_record(i, bot_id='bot-a' if i % 4 else 'bot-b'))
+    assert store.count(bot_id='bot-b') == 50   # buffered records count before any flush
+    store.flush()
+
+    assert store.get_stats()['segments_deleted'] > 0
+    on_disk = list(store.iter_records())
+    for bot_id in ('bot-a', 'bot-b', 'missing'):
+        assert store.count(bot_id=bot_id) == sum(1 for r in on_disk if r['bot_id'] == bot_id)
+    assert store.count() == len(on_disk)
+
+    store.stats['blocks_read'] = 0
+    store.count(bot_id='bot-a')
+    assert store.stats['blocks_read'] == 0
+    store.close()
+
+    reopened = LogStore(str(tmp_path), **options)
+    assert reopened.count(bot_id='bot-b') == sum(1 for r in on_disk if r['bot_id'] == 'bot-b')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Password hashing: KDF cost, transparent rehash, hub responsiveness"""
+import time
+
+import gevent
+
+import auth
+from conftest import PASSWORD
+
+
+def test_scrypt_above_openssl_default_memory_limit(monkeypatch, ws):
+    monkeypatch.setattr(auth, 'SCRYPT_N', 2 ** 15)
+    password_hash = ws.auth_db.hash_password('secret')
+    assert password_hash.startswith('scrypt$32768$')
+    assert ws.auth_db.verify_password('secret', password_hash)
+    assert not ws.auth_db.verify_password('wrong', password_hash)
+
+
+def test_login_rehashes_after_cost_increase(monkeypatch, ws, user):
+    monkeypatch.setattr(auth, 'SCRYPT_N', 2 ** 15)
+    result = ws.auth_db.authenticate(user['username'], PASSWORD)
+    assert result['success'], result
+
+    conn = ws.auth_db.get_connection()
+    stored = conn.execute(
+        'SELECT password_hash FROM users WHERE id = ?', (user['id'],)).fetchone()['password_hash']
+    conn.close()
+    assert stored.startswith('scrypt$32768$')
+    assert ws.auth_db.authenticate(user['username'], PASSWORD)['success']
+
+
+def test_hub_stays_responsive_during_login_burst(ws, user):
+    """A greenlet ticking every 5 ms stands in for Socket.IO pings while
+    20 logins hash concurrently; hashing off the hub keeps its delay low."""
+    delays = []
+    running = True
+
+    def ticker():
+        while running:
+            start = time.perf_counter()
+            gevent.sleep(0.005)
+            delays.append(time.perf_counter() - start - 0.005)
+
+    tick = gevent.spawn(ticker)
+    logins = [gevent.spawn(ws.auth_db.authenticate, user['username'], PASSWORD) for _ in range(20)]
+    gevent.joinall(logins)
+    running = False
+    tick.join()
+
+    assert all(login.value['success'] for login in logins)
+    assert len(delays) > 10
+    assert max(delays) < 0.25, f'hub stalled for {max(delays) * 1000:.0f} ms'
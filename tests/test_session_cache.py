@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""SessionCache: cached sessions are dropped on logout, password change and account deletion"""
+import pytest
+
+from conftest import PASSWORD
+
+
+def _login(ws, user):
+    client = ws.app.test_client()
+    response = client.post('/api/auth/login', json={'username': user['username'], 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def _token(client):
+    return client.get_cookie('session_token').value
+
+
+@pytest.fixture
+def sessions(ws, user):
+    """Two logged-in clients of `user`, both sessions already in the cache"""
+    clients = [_login(ws, user), _login(ws, user)]
+    for client in clients:
+        assert client.get('/api/auth/me').status_code == 200
+        assert ws.auth_db.session_cache.get(_token(client)) is not None
+    return clients
+
+
+def test_logout_drops_only_that_session(ws, sessions):
+    first, second = sessions
+    token = _token(first)
+
+    assert first.post('/api/auth/logout').status_code == 200
+
+    assert ws.auth_db.session_cache.get(token) is None
+    assert ws.auth_db.validate_session(token) is None
+    assert second.get('/api/auth/me').status_code == 200
+
+
+def test_password_change_drops_every_session_of_the_user(ws, user, sessions):
+    first, second = sessions
+    tokens = [_token(first), _token(second)]
+
+    response = first.post('/api/auth/change-password',
+                          json={'old_password': PASSWORD, 'new_password': 'N3w-password!'})
+    assert response.status_code == 200, response.get_json()
+
+    for token in tokens:
+        assert ws.auth_db.session_cache.get(token) is None
+        assert ws.auth_db.validate_session(token) is None
+    assert second.get('/api/auth/me').status_code == 401
+
+
+def test_account_deletion_drops_every_session_of_the_user(ws, sessions):
+    first, second = sessions
+    tokens = [_token(first), _token(second)]
+
+    assert first.post('/api/auth/delete-account', json={'password': PASSWORD}).status_code == 200
+
+    for token in tokens:
+        assert ws.auth_db.session_cache.get(token) is None
+    assert second.get('/api/auth/me').status_code == 401
+
+
+def test_other_users_sessions_stay_cached(ws, user, sessions):
+    other = {'username': 'other-' + user['username']}
+    other['id'] = ws.auth_db.create_user(other['username'], f"{other['username']}@example.com", PASSWORD)['user_id']
+    other_client = _login(ws, other)
+    assert other_client.get('/api/auth/me').status_code == 200
+
+    ws.auth_db.delete_user(user['id'])
+
+    assert ws.auth_db.session_cache.get(_token(other_client)) is not None
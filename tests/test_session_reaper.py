@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""AuthDB.reap_expired: expired sessions and spent reset tokens are deleted in batches"""
+import datetime
+import secrets
+
+import pytest
+
+import auth
+
+
+def _insert(ws, table, user_id, expires_in, used=None):
+    conn = ws.auth_db.get_connection()
+    expires_at = datetime.datetime.now() + expires_in
+    if table == 'sessions':
+        conn.execute('INSERT INTO sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)',
+                     (user_id, secrets.token_urlsafe(16), expires_at))
+    else:
+        conn.execute('INSERT INTO password_resets (user_id, token, expires_at, used) VALUES (?, ?, ?, ?)',
+                     (user_id, secrets.token_urlsafe(16), expires_at, used))
+    conn.commit()
+    conn.close()
+
+
+def _count(ws, table, user_id):
+    conn = ws.auth_db.get_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE user_id = ?', (user_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+@pytest.fixture
+def pauses(ws, monkeypatch):
+    """Pauses taken between batches; the table starts with nothing to reap"""
+    ws.auth_db.reap_expired(pause=0)
+    taken = []
+    monkeypatch.setattr(auth.time, 'sleep', taken.append)
+    return taken
+
+
+def test_expired_sessions_are_deleted_in_batches(ws, user, pauses):
+    for _ in range(7):
+        _insert(ws, 'sessions', user['id'], datetime.timedelta(days=-1))
+    for _ in range(2):
+        _insert(ws, 'sessions', user['id'], datetime.timedelta(days=7))
+
+    result = ws.auth_db.reap_expired(batch_size=3, pause=0.25)
+
+    assert result['sessions'] == 7
+    assert pauses == [0.25, 0.25]   # batches of 3, 3 and 1
+    assert _count(ws, 'sessions', user['id']) == 2
+
+
+def test_used_and_expired_reset_tokens_are_deleted(ws, user, pauses):
+    _insert(ws, 'password_resets', user['id'], datetime.timedelta(days=-1), used=0)
+    _insert(ws, 'password_resets', user['id'], datetime.timedelta(hours=1), used=1)
+    _insert(ws, 'password_resets', user['id'], datetime.timedelta(hours=1), used=0)
+    runs = ws.auth_db.reap_stats['runs']
+
+    result = ws.auth_db.reap_expired(batch_size=10)
+
+    assert result == {'sessions': 0, 'password_resets': 2}
+    assert pauses == []
+    assert _count(ws, 'password_resets', user['id']) == 1
+    assert ws.auth_db.reap_stats['runs'] == runs + 1
+
+
+def test_live_session_still_validates_after_reaping(ws, client, pauses):
+    ws.auth_db.session_cache.clear()
+    ws.auth_db.reap_expired(batch_size=1)
+    assert client.get('/api/auth/me').status_code == 200
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Reconnect replay ring for dashboard Socket.IO events"""
+
+
+def test_ring_stores_copies_and_is_bounded_by_bytes(ws):
+    ring = ws.SocketReplayRing(maxlen=100, max_bytes=2000)
+    command = {'id': 'c1', 'status': 'pending'}
+    seq = ring.record(['admin'], 'command_update', command)
+    command['status'] = 'completed'
+
+    assert ring.since(seq - 1, ['admin'])[0]['data']['status'] == 'pending'
+
+    for _ in range(50):
+        ring.record(['admin'], 'new_log', {'message': 'x' * 100})
+    assert ring.size_bytes() <= 2000
+    assert len(ring) < 50
+    assert ring.since(seq, ['admin']) is None  # dropped: client needs a snapshot
+
+
+def test_only_listed_events_are_recorded(ws, bot):
+    before = ws.replay_ring.last_seq
+    ws.emit_to_bot(bot['bot_id'], 'new_command', {'id': 'c1'})
+    ws.emit_to_bot(bot['bot_id'], 'bot_data_sync', {'bot_id': bot['bot_id'], 'records': {}})
+    assert ws.replay_ring.last_seq == before
+
+    ws.emit_to_bot(bot['bot_id'], 'bot_update', {'bot_id': bot['bot_id'], 'status': 'online'})
+    assert ws.replay_ring.last_seq == before + 1
+
+
+def test_reconnect_replays_missed_events_for_own_bots(ws, client, user, bot):
+    other = ws.auth_db.create_bot(ws.auth_db.create_user('replay-other', 'ro@example.com', 'Passw0rd!x')['user_id'], 'o')
+
+    socket = ws.socketio.test_client(ws.app, flask_test_client=client, auth={})
+    established = next(e for e in socket.get_received() if e['name'] == 'connection_established')
+    last_seq = established['args'][0]['event_seq']
+    socket.disconnect()
+
+    ws.emit_bot_update(bot['bot_id'], {'bot_id': bot['bot_id'], 'status': 'online'})
+    ws.emit_bot_update(other['bot_id'], {'bot_id': other['bot_id'], 'status': 'online'})
+
+    socket = ws.socketio.test_client(ws.app, flask_test_client=client, auth={'last_seq': last_seq})
+    replay = next(e for e in socket.get_received() if e['name'] == 'replay')['args'][0]
+    assert [e['data']['bot_id'] for e in replay['events']] == [bot['bot_id']]
+    socket.disconnect()
+
+
+def test_bot_data_sync_emits_only_a_summary(ws, client, bot):
+    socket = ws.socketio.test_client(ws.app, flask_test_client=client)
+    socket.get_received()
+
+    friends = [{'id': str(i), 'name': f'f{i}'} for i in range(50)]
+    response = client.post(f"/api/bot/{bot['bot_id']}/sync", json={'friends': friends},
+                           headers={'X-Bot-Token': bot['token']})
+    assert response.status_code == 200, response.get_json()
+
+    sync = next(e for e in socket.get_received() if e['name'] == 'bot_data_sync')['args'][0]
+    assert 'data' not in sync
+    assert sync['records']['friends'] == 50
+    socket.disconnect()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""BotStatusBuffer: heartbeats are coalesced, status transitions are written at once"""
+import pytest
+
+
+@pytest.fixture
+def buffer(ws):
+    return ws.BotStatusBuffer(ws.auth_db)
+
+
+def _db_status(ws, bot_id):
+    return ws.auth_db.get_bot(bot_id)['status']
+
+
+def test_transition_is_flushed_immediately(ws, bot, buffer):
+    bot_id = bot['bot_id']
+    old_status = _db_status(ws, bot_id)
+
+    buffer.record(bot_id, 'online')
+
+    assert old_status != 'online'
+    assert _db_status(ws, bot_id) == 'online'
+    assert buffer.get(bot_id) is None
+    assert buffer.stats['transition_flushes'] == 1
+
+    buffer.record(bot_id, 'offline')
+    assert _db_status(ws, bot_id) == 'offline'
+    assert buffer.stats['transition_flushes'] == 2
+
+
+def test_same_status_heartbeats_stay_buffered_until_flush(ws, bot, buffer):
+    bot_id = bot['bot_id']
+    buffer.record(bot_id, 'online')
+    last_active = ws.auth_db.get_bot(bot_id)['last_active']
+
+    for _ in range(5):
+        buffer.record(bot_id, 'online')
+
+    assert buffer.stats['transition_flushes'] == 1
+    assert buffer.get(bot_id)[0] == 'online'
+    assert ws.auth_db.get_bot(bot_id)['last_active'] == last_active
+
+    assert buffer.flush() == 1
+    assert buffer.get(bot_id) is None
+    assert buffer.stats['rows_written'] == 2   # one for the transition, one for five heartbeats
+
+
+def test_transition_flush_carries_other_bots_heartbeats(ws, user, buffer):
+    first, second = (ws.auth_db.create_bot(user['id'], name)['bot_id'] for name in ('first', 'second'))
+    buffer.record(first, 'online')
+    buffer.record(first, 'online')     # buffered
+
+    buffer.record(second, 'online')    # transition: flushes both rows
+
+    assert buffer.get(first) is None
+    assert buffer.stats['rows_written'] == 3
+
+
+def test_status_get_overlays_unflushed_heartbeat(ws, bot):
+    bot_id = bot['bot_id']
+    ws.status_buffer.record(bot_id, 'online')
+    ws.status_buffer.record(bot_id, 'online')
+    status, last_active = ws.status_buffer.get(bot_id)
+
+    response = ws.app.test_client().get(f'/api/bot/{bot_id}/status')
+
+    assert response.get_json()['status'] == status == 'online'
+    assert response.get_json()['last_active'] == last_active
@@ -13,20 +13,29 @@ monkey.patch_all()
 
 # ------------------------------
 
-from flask import Flask, jsonify, request, send_file
-from flask_socketio import SocketIO
+from flask import Flask, Response, jsonify, request, send_file
+from flask_socketio import SocketIO, join_room
 from flask_cors import CORS
+from gevent.event import Event
 import threading
 import os
-from datetime import datetime
-import queue
-from collections import deque, defaultdict
+import time
+import atexit
+from datetime import datetime, timezone
+from collections import deque, defaultdict, Counter, OrderedDict
 import itertools
+import json
+import math
+import gzip
+import heapq
+import bisect
+import zlib
 import uuid
-from functools import wraps
+from functools import wraps, partial
 
 # Import authentication module
 from auth import AuthDB
+from log_store import LogStore
 
 # Configure Flask app với web folder
 base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -53,9 +62,232 @@ socketio = SocketIO(
 # Initialize AuthDB
 auth_db = AuthDB()
 
-# Queue để relay log tới Socket.IO
-log_queue = queue.Queue()
+# Log relay tới Socket.IO
+LOG_QUEUE_MAX = 10000     # Bounded relay queue, oldest entries dropped when full
+LOG_BATCH_SIZE = 200      # Max entries per new_logs event
+LOG_BATCH_WAIT_MS = 50    # Max time to wait for a batch to fill after the first entry
+
+# Reconnect replay of dashboard events
+SOCKET_REPLAY_MAX = 5000      # Recently emitted events kept for replay
+SOCKET_REPLAY_MAX_BYTES = 16 * 1024 * 1024  # Serialized size bound of the replay ring
+SOCKET_REPLAY_EVENTS = ('new_log', 'bot_update', 'command_update', 'new_message', 'command_batch')
+SOCKET_SNAPSHOT_LIMIT = 100   # Logs / messages in the snapshot sent when replay is impossible
+
+class LogRelayQueue:
+    """Bounded queue feeding log_worker, with a drop-oldest policy"""
+
+    def __init__(self, maxsize, batch_size):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.stats = {'enqueued': 0, 'dropped': 0, 'delivered': 0, 'batches': 0}
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.stats['dropped'] += 1
+            self._items.append(item)
+            self.stats['enqueued'] += 1
+
+            # Wake the consumer on first arrival and once a batch is full
+            if len(self._items) == 1 or len(self._items) >= self.batch_size:
+                self._cond.notify()
+
+    def get_batch(self, max_wait):
+        """Block until an entry arrives, then return up to batch_size
+        entries, waiting at most max_wait seconds for the batch to fill"""
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+
+            deadline = time.monotonic() + max_wait
+            while len(self._items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self.stats['delivered'] += count
+            self.stats['batches'] += 1
+            return batch
+
+    def qsize(self):
+        return len(self._items)
+
+def _record_seq(record):
+    return record['seq']
+
+class BotIndexedBuffer:
+    """Bounded ring of records plus one ring per bot_id holding the same
+    records. Records leave the bot ring when they fall out of the global
+    one, so per-bot reads are O(results) and per-bot counts O(1).
+
+    append() stamps every record with a monotonically increasing 'seq',
+    which after()/before() use as a cursor."""
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self._items = deque()
+        self._by_bot = {}                  # bot_id -> deque of that bot's records
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+
+    def resume(self, last_seq):
+        """Continue numbering after last_seq (e.g. from the persistent log store)"""
+        with self._lock:
+            self.last_seq = max(self.last_seq, last_seq)
+            self._seq = itertools.count(self.last_seq + 1)
+
+    def append(self, record):
+        with self._lock:
+            record['seq'] = self.last_seq = next(self._seq)
+            if len(self._items) >= self.maxlen:
+                evicted = self._items.popleft()
+                bot_id = evicted.get('bot_id')
+                if bot_id is not None:
+                    bot_items = self._by_bot[bot_id]
+                    bot_items.popleft()  # the oldest record overall is its bot's oldest too
+                    if not bot_items:
+                        del self._by_bot[bot_id]
+            self._items.append(record)
+            bot_id = record.get('bot_id')
+            if bot_id is not None:
+                self._by_bot.setdefault(bot_id, deque()).append(record)
+
+    def tail(self, limit):
+        """Newest `limit` records, oldest first"""
+        with self._lock:
+            return self._tail(self._items, limit)
+
+    def for_bot(self, bot_id, limit=None):
+        """Newest `limit` records of one bot (all if None), oldest first"""
+        with self._lock:
+            bot_items = self._by_bot.get(bot_id, ())
+            return list(bot_items) if limit is None else self._tail(bot_items, limit)
+
+    def count(self, bot_id):
+        return len(self._by_bot.get(bot_id, ()))
+
+    def after(self, seq, limit, bot_id=None, match=None):
+        """(records, gap): up to `limit` records with seq > `seq` (and
+        match(record), if given), oldest first. gap is set when records after
+        `seq` were already evicted, or `seq` is from before a restart; the
+        page then starts at the oldest record still held."""
+        with self._lock:
+            oldest = self._items[0]['seq'] if self._items else self.last_seq + 1
+            gap = seq + 1 < oldest or seq > self.last_seq
+            items = self._items if bot_id is None else self._by_bot.get(bot_id, ())
+            start = 0 if gap else bisect.bisect_right(items, seq, key=_record_seq)
+            page = []
+            for i in range(start, len(items)):
+                if len(page) >= limit:
+                    break
+                if match is None or match(items[i]):
+                    page.append(items[i])
+            return page, gap
+
+    def before(self, seq, limit, bot_id=None, match=None):
+        """(records, gap): the newest `limit` records with seq < `seq` (and
+        match(record), if given), oldest first. gap is set when the page
+        reaches back past evicted records."""
+        with self._lock:
+            items = self._items if bot_id is None else self._by_bot.get(bot_id, ())
+            end = bisect.bisect_left(items, seq, key=_record_seq)
+            page = []
+            i = end - 1
+            while i >= 0 and len(page) < limit:
+                if match is None or match(items[i]):
+                    page.append(items[i])
+                i -= 1
+            page.reverse()
+            evicted = bool(self._items) and self._items[0]['seq'] > 1
+            return page, i < 0 and evicted
+
+    @staticmethod
+    def _tail(items, limit):
+        if limit <= 0:
+            return []
+        if limit >= len(items):
+            return list(items)
+        return list(itertools.islice(reversed(items), limit))[::-1]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.tail(self.maxlen))
+
+class SocketReplayRing:
+    """Bounded ring of recently emitted dashboard events, numbered by a
+    monotonic event_seq, for clients reconnecting with the last seq they saw.
+
+    Events are kept serialized: the ring holds what was sent even if the
+    source dict changes later, and is bounded by max_bytes as well as maxlen."""
+
+    def __init__(self, maxlen, max_bytes):
+        self.maxlen = maxlen
+        self.max_bytes = max_bytes
+        self._events = deque()                # (seq, rooms, event, json payload)
+        self._bytes = 0
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self.last_seq = 0
+        self.stats = {'recorded': 0, 'replays': 0, 'replayed_events': 0, 'snapshots': 0}
+
+    def record(self, rooms, event, data):
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            seq = self.last_seq = next(self._seq)
+            self._events.append((seq, tuple(rooms), event, payload))
+            self._bytes += len(payload)
+            while len(self._events) > 1 and (len(self._events) > self.maxlen or self._bytes > self.max_bytes):
+                self._bytes -= len(self._events.popleft()[3])
+            self.stats['recorded'] += 1
+            return seq
+
+    def since(self, seq, rooms):
+        """Events after seq emitted to any of rooms, oldest first, or None if
+        some were already dropped (or seq is from before a restart)"""
+        with self._lock:
+            oldest = self._events[0][0] if self._events else self.last_seq + 1
+            if seq + 1 < oldest or seq > self.last_seq:
+                return None
+            events = [self._events[i] for i in range(seq + 1 - oldest, len(self._events))]
+
+        rooms = set(rooms)
+        return [
+            {'event_seq': event_seq, 'event': event, 'data': json.loads(payload)}
+            for event_seq, event_rooms, event, payload in events
+            if rooms.intersection(event_rooms)
+        ]
+
+    def __len__(self):
+        return len(self._events)
+
+    def size_bytes(self):
+        return self._bytes
+
+log_queue = LogRelayQueue(LOG_QUEUE_MAX, LOG_BATCH_SIZE)
+replay_ring = SocketReplayRing(SOCKET_REPLAY_MAX, SOCKET_REPLAY_MAX_BYTES)
 connected_clients = set()
+
+# Socket.IO rooms: user:<id>, bot:<id> and the admin firehose. Every room
+# has "<room>|new_logs" / "<room>|new_log" companions so batched and
+# legacy log clients can be targeted separately.
+ADMIN_ROOM = 'admin'
+socket_clients = {}            # sid -> {'user_id': ..., 'log_batches': bool}
+user_sids = defaultdict(set)   # user_id -> sids
+
+# Bot clients connected to the /bot namespace get commands pushed to them
+BOT_NAMESPACE = '/bot'
+BOT_PUSH_BATCH = 50            # Commands dispatched per push to a bot socket
+bot_socket_sids = {}           # bot_id -> sid on the /bot namespace
+bot_socket_ids = {}            # sid -> bot_id
 bot_instances = {}
 bot_data_store = defaultdict(dict)
 
@@ -63,71 +295,810 @@ bot_data_store = defaultdict(dict)
 MAX_LOGS = 500
 MAX_MESSAGES = 500
 MAX_COMMANDS_PER_BOT = 200
-logs_storage = deque(maxlen=MAX_LOGS)
-messages_storage = deque(maxlen=MAX_MESSAGES)
-commands_by_bot = defaultdict(lambda: deque(maxlen=MAX_COMMANDS_PER_BOT))
-commands_by_id = {}
-commands_lock = threading.Lock()
+MAX_BULK_BOTS = 5000
+SYNC_COLLECTIONS = ('groups', 'friends')
+DATA_PAGE_DEFAULT = 50
+DATA_PAGE_MAX = 500
+EXPORT_FORMATS = ('json', 'ndjson')
+EXPORT_CHUNK_RECORDS = 500     # Records serialized per streamed export chunk
+EXPORT_GZIP_LEVEL = 6
+logs_storage = BotIndexedBuffer(MAX_LOGS)    # Hot tail of log_store
+messages_storage = BotIndexedBuffer(MAX_MESSAGES)
+commands_by_id = {}                            # command_id -> command (all shards; get() needs no lock)
+commands_by_id_lock = threading.Lock()         # guards inserts/removals and iteration of commands_by_id
 command_counter = itertools.count(1)
+COMMAND_WAIT_MAX = 30                          # Upper bound for ?wait= on command polls (seconds)
+COMMAND_SHARDS = 16                            # Command state partitions, by crc32(bot_id)
+
+# Durable command queue
+COMMAND_FLUSH_INTERVAL_MS = 20   # Group commit window for the command journal
+COMMAND_VISIBILITY_TIMEOUT = 60  # Seconds a dispatched command may stay unacked
+COMMAND_MAX_ATTEMPTS = 5         # Deliveries before a command is dead-lettered
+COMMAND_REDELIVERY_INTERVAL = 5  # Seconds between visibility timeout sweeps
+
+# Retention of commands that fell out of their bot's history deque
+COMMAND_RETENTION_MAX = 10000    # Retired commands kept in commands_by_id (split across shards)
+COMMAND_RETENTION_SECONDS = 3600 # Max age of a retired command in memory, and of a closed row in the DB
+COMMAND_PURGE_INTERVAL = 60      # Seconds between DB purges of closed commands
+COMMAND_ARCHIVE_DIR = os.environ.get('COMMAND_ARCHIVE_DIR')  # gzip JSONL archive of dropped commands (optional)
+COMMAND_OPEN_STATUSES = ('scheduled', 'pending', 'dispatched')
+COMMAND_PAGE_DEFAULT = 100
+COMMAND_PAGE_MAX = 1000
+
+# Persistent log store (segmented NDJSON files with a sparse block index)
+LOG_STORE_DIR = os.environ.get('LOG_STORE_DIR', 'data/logs')
+LOG_STORE_FLUSH_INTERVAL_MS = 200  # Write-behind window for log records
+
+# Broadcast batches: batch_id -> {'total', 'counts' (status -> n), ...}
+COMMAND_BATCH_MAX = 1000         # Most recent batches kept for progress queries
+command_batches = OrderedDict()
+command_batches_lock = threading.Lock()
+
+# Delayed commands: one scheduler greenlet sleeps until the earliest run_at
+scheduled_commands = []          # heap of (run_at epoch, seq, command_id)
+scheduler_lock = threading.Lock()
+scheduler_wakeup = Event()       # Set when a new earliest deadline is scheduled
+
+class CommandShard:
+    """One partition of the command state.
+
+    A bot's history, pending heap, counters, long-poll waiters, in-flight
+    and retired commands live in the shard its bot_id hashes to, guarded
+    by that shard's lock. Lock order: shard -> batches/scheduler/journal/commands_by_id.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history = defaultdict(lambda: deque(maxlen=MAX_COMMANDS_PER_BOT))  # bot_id -> recent commands
+        self.pending = defaultdict(list)     # bot_id -> heap of (-priority, seq, command)
+        self.counts = defaultdict(Counter)   # bot_id -> status -> count (history window)
+        self.types = defaultdict(Counter)    # bot_id -> type -> count (history window)
+        self.waiters = {}                    # bot_id -> [Event, waiter count] for long polls
+        self.inflight = deque()              # (visible_at, command_id, attempt) in dispatch order
+        self.retired = deque()               # (retired_at, command) in eviction order
+        self.totals = {}                     # status -> count in commands_by_id; copy-on-write, read lock-free
+
+command_shards = [CommandShard() for _ in range(COMMAND_SHARDS)]
+
+# Background flush intervals
+TOKEN_USAGE_FLUSH_INTERVAL = 30  # seconds between bot_tokens.last_used flushes
+STATUS_FLUSH_INTERVAL_MS = 1000  # ms between write-behind flushes of bot heartbeats
+SESSION_REAP_INTERVAL = 300      # seconds between expired session/reset token sweeps
 
 def _current_time_iso():
     """Get current time in ISO format"""
     return datetime.utcnow().isoformat()
 
-def _generate_command_id():
+class BotStatusBuffer:
+    """Write-behind buffer for bot heartbeats.
+
+    Keeps the latest status/last_active per bot in memory and writes
+    dirty rows with a single executemany on flush(). A real status
+    change (e.g. online -> offline) is flushed immediately.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._dirty = {}      # bot_id -> (status, last_active)
+        self._written = None  # bot_id -> status last written to the DB
+        self._lock = threading.Lock()
+        self.stats = {'heartbeats': 0, 'flushes': 0, 'rows_written': 0, 'transition_flushes': 0}
+
+    def record(self, bot_id, status):
+        """Buffer a heartbeat; flush right away on a status transition"""
+        if self._written is None:
+            written = self.db.get_bot_statuses()
+            with self._lock:
+                if self._written is None:
+                    self._written = written
+
+        last_active = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self.stats['heartbeats'] += 1
+            self._dirty[bot_id] = (status, last_active)
+            transition = self._written.get(bot_id) != status
+
+        if transition:
+            self.stats['transition_flushes'] += 1
+            self.flush()
+
+    def get(self, bot_id):
+        """Buffered (status, last_active) not yet written, or None"""
+        with self._lock:
+            return self._dirty.get(bot_id)
+
+    def flush(self):
+        """Write every dirty row in one transaction"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+
+        if not dirty:
+            return 0
+
+        try:
+            self.db.update_bot_statuses(
+                (bot_id, status, last_active) for bot_id, (status, last_active) in dirty.items()
+            )
+        except Exception:
+            # Put rows back unless a newer heartbeat already replaced them
+            with self._lock:
+                for bot_id, entry in dirty.items():
+                    self._dirty.setdefault(bot_id, entry)
+            raise
+
+        with self._lock:
+            for bot_id, (status, _) in dirty.items():
+                self._written[bot_id] = status
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(dirty)
+
+        return len(dirty)
+
+    def forget(self, bot_id):
+        """Drop buffered state of a deleted bot"""
+        with self._lock:
+            self._dirty.pop(bot_id, None)
+            if self._written is not None:
+                self._written.pop(bot_id, None)
+
+status_buffer = BotStatusBuffer(auth_db)
+
+class CommandJournal:
+    """Group-commit journal that persists command state changes.
+
+    mark() snapshots a command (called with its shard lock held) and
+    flush() upserts every changed command in one transaction, so a
+    burst of enqueues/acks costs one commit per flush window.
+    """
+
+    def __init__(self, db, archive_dir=None):
+        self.db = db
+        self.archive_dir = archive_dir
+        self._dirty = {}      # command_id -> row snapshot
+        self._dropped = {}    # command_id -> command dropped by retention
+        self._lock = threading.Lock()
+        self.stats = {'marked': 0, 'flushes': 0, 'rows_written': 0, 'rows_deleted': 0, 'archived': 0}
+
+    def mark(self, command):
+        row = (command['id'], command['seq'], command['bot_id'], command['type'],
+               command['status'], command.get('attempts', 0), json.dumps(command, default=str))
+        with self._lock:
+            self._dirty[command['id']] = row
+            self.stats['marked'] += 1
+
+    def drop(self, command):
+        """Delete a finished command from the store (archiving it first if enabled)"""
+        with self._lock:
+            self._dropped[command['id']] = command
+
+    def _archive(self, commands):
+        """Append commands to today's gzip JSONL archive"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"commands-{datetime.utcnow():%Y%m%d}.jsonl.gz")
+        # Each append adds a gzip member; gzip readers see one continuous stream
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for command in commands:
+                f.write(json.dumps(command, default=str) + '\n')
+
+    def flush(self):
+        """Write every changed command and delete dropped ones in one transaction"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            dropped, self._dropped = self._dropped, {}
+
+        if not dirty and not dropped:
+            return 0
+
+        try:
+            if dropped and self.archive_dir:
+                self._archive(dropped.values())
+                self.stats['archived'] += len(dropped)
+            # A dropped command's last snapshot may still be waiting here
+            rows = [row for command_id, row in dirty.items() if command_id not in dropped]
+            self.db.save_commands(rows, deleted_ids=list(dropped))
+        except Exception:
+            # Put rows back unless a newer snapshot already replaced them
+            with self._lock:
+                for command_id, row in dirty.items():
+                    self._dirty.setdefault(command_id, row)
+                for command_id, command in dropped.items():
+                    self._dropped.setdefault(command_id, command)
+            raise
+
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(rows)
+            self.stats['rows_deleted'] += len(dropped)
+
+        return len(rows) + len(dropped)
+
+    def pending(self):
+        return len(self._dirty)
+
+command_journal = CommandJournal(auth_db, archive_dir=COMMAND_ARCHIVE_DIR)
+log_store = LogStore(LOG_STORE_DIR)
+logs_storage.resume((log_store.newest() or {}).get('seq', 0))  # keep log seq monotonic across restarts
+
+def _generate_command_id(seq):
     """Generate unique command ID"""
-    return f"cmd_{next(command_counter)}_{uuid.uuid4().hex[:6]}"
+    return f"cmd_{seq}_{uuid.uuid4().hex[:6]}"
+
+def _shard_for(bot_id):
+    """The command shard owning a bot"""
+    return command_shards[zlib.crc32(str(bot_id).encode('utf-8')) % COMMAND_SHARDS]
+
+def _in_history(shard, command):
+    """True while a command is still in its bot's history deque (shard lock held)"""
+    history = shard.history.get(command['bot_id'])
+    return bool(history) and command['seq'] >= history[0]['seq']
+
+def _adjust_totals(shard, *changes):
+    """Apply (status, delta) changes to a copy of shard.totals and swap it
+    in, so lock-free readers always see a complete snapshot (shard lock held)"""
+    totals = dict(shard.totals)
+    for status, delta in changes:
+        totals[status] = totals.get(status, 0) + delta
+    shard.totals = totals
+
+def _set_command_status(shard, command, status):
+    """Change a command's status, keeping per-bot, shard and batch counters in sync (shard lock held)"""
+    if _in_history(shard, command):
+        counts = shard.counts[command['bot_id']]
+        counts[command['status']] -= 1
+        counts[status] += 1
+    _adjust_totals(shard, (command['status'], -1), (status, 1))
+    if command.get('batch_id'):
+        with command_batches_lock:
+            batch = command_batches.get(command['batch_id'])
+            if batch:
+                batch['counts'][command['status']] -= 1
+                batch['counts'][status] += 1
+    command['status'] = status
+    command_journal.mark(command)
+
+def _append_command(shard, command, journal=True):
+    """Add a new command to the history and pending index (shard lock held)"""
+    bot_id = command['bot_id']
+    history = shard.history[bot_id]
+    pending = shard.pending[bot_id]
+
+    if len(history) == history.maxlen:
+        # The oldest command falls out of the history window
+        evicted = history[0]
+        if evicted['status'] == 'pending':
+            # Never delivered before falling out of the window; its heap
+            # entry is skipped lazily
+            evicted['completed_at'] = _current_time_iso()
+            _set_command_status(shard, evicted, 'expired')
+        shard.counts[bot_id][evicted['status']] -= 1
+        shard.types[bot_id][evicted['type']] -= 1
+        shard.retired.append((time.monotonic(), evicted))
+        _enforce_command_retention(shard)
+
+        if len(pending) > 2 * history.maxlen:
+            # Compact entries of commands acked or expired before dispatch
+            pending[:] = [entry for entry in pending if entry[2]['status'] == 'pending']
+            heapq.heapify(pending)
+
+    history.append(command)
+    with commands_by_id_lock:
+        commands_by_id[command['id']] = command
+    _adjust_totals(shard, (command['status'], 1))
+    shard.counts[bot_id][command['status']] += 1
+    shard.types[bot_id][command['type']] += 1
+    if command['status'] == 'pending':
+        _push_pending(shard, command)
+    elif command['status'] == 'scheduled':
+        _schedule(command)
+    if journal:
+        command_journal.mark(command)
+
+def _push_pending(shard, command):
+    """Add a command to its bot's priority queue (shard lock held)"""
+    heapq.heappush(shard.pending[command['bot_id']],
+                   (-command.get('priority', 0), command['seq'], command))
+
+def _schedule(command):
+    """Add a delayed command to the scheduler heap"""
+    entry = (_parse_run_at(command['run_at']), command['seq'], command['id'])
+    with scheduler_lock:
+        heapq.heappush(scheduled_commands, entry)
+        if scheduled_commands[0] is entry:
+            scheduler_wakeup.set()
+
+def _parse_run_at(value):
+    """run_at as a unix timestamp; accepts epoch seconds or an ISO 8601 string (UTC if naive)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        timestamp = float(value)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('run_at must be an ISO 8601 string or a unix timestamp')
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        timestamp = parsed.timestamp()
+    else:
+        raise ValueError('run_at must be an ISO 8601 string or a unix timestamp')
+    
+    # NaN/Infinity or beyond year 9999 can't be stored back as a datetime
+    try:
+        _run_at_iso(timestamp)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError('run_at is out of range')
+    return timestamp
 
-def _enqueue_command(bot_id, command_type, payload, source="api"):
-    """Enqueue a command for bot execution"""
+def _run_at_iso(timestamp):
+    """Naive UTC ISO string for a run_at timestamp (same format as created_at)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+def _command_options(payload):
+    """(priority, run_at) from a request payload; raises ValueError"""
+    try:
+        priority = int(payload.get('priority', 0))
+    except (TypeError, ValueError):
+        raise ValueError('priority must be an integer')
+    run_at = payload.get('run_at')
+    if run_at is not None:
+        run_at = _parse_run_at(run_at)
+    return priority, run_at
+
+def _enforce_command_retention(shard):
+    """Drop a shard's retired commands beyond its share of COMMAND_RETENTION_MAX
+    or older than COMMAND_RETENTION_SECONDS from commands_by_id (shard lock
+    held). Commands still awaiting an ack are kept until they finish."""
+    max_retired = COMMAND_RETENTION_MAX // COMMAND_SHARDS
+    cutoff = time.monotonic() - COMMAND_RETENTION_SECONDS
+    retired = shard.retired
+    skipped = []  # open commands: stay at the front, in age order
+    dropped = Counter()
+
+    while retired and (len(retired) + len(skipped) > max_retired or retired[0][0] < cutoff):
+        retired_at, command = retired.popleft()
+        if command['status'] in COMMAND_OPEN_STATUSES:
+            skipped.append((retired_at, command))
+            continue
+        with commands_by_id_lock:
+            removed = commands_by_id.pop(command['id'], None)
+        if removed is not None:
+            command_journal.drop(command)
+            dropped[command['status']] += 1
+
+    retired.extendleft(reversed(skipped))
+    if dropped:
+        _adjust_totals(shard, *((status, -n) for status, n in dropped.items()))
+    return sum(dropped.values())
+
+def _dispatch_commands(shard, bot_id, limit):
+    """Pop up to `limit` pending commands for a bot, highest priority
+    first, then oldest first (shard lock held)"""
+    pending = shard.pending.get(bot_id)
+    dispatched = []
+
+    while pending and len(dispatched) < limit:
+        command = heapq.heappop(pending)[2]
+        if command['status'] != 'pending':
+            continue  # acked or expired before it was ever dispatched
+        command['attempts'] = command.get('attempts', 0) + 1
+        command['dispatched_at'] = _current_time_iso()
+        _set_command_status(shard, command, 'dispatched')
+        shard.inflight.append((time.monotonic() + COMMAND_VISIBILITY_TIMEOUT,
+                               command['id'], command['attempts']))
+        dispatched.append(command)
+
+    return dispatched
+
+def _bot_command_stats(shard, bot_id):
+    """Command counters of a bot's history window (shard lock held)"""
+    counts = shard.counts.get(bot_id, Counter())
+    return {
+        'total_commands': len(shard.history.get(bot_id, ())),
+        'pending_commands': counts['pending'],
+        'scheduled_commands': counts['scheduled'],
+        'completed_commands': counts['completed'],
+        'failed_commands': counts['failed']
+    }
+
+def _bot_command_history(bot_id):
+    """Copy of a bot's history deque, oldest first"""
+    shard = _shard_for(bot_id)
+    with shard.lock:
+        return list(shard.history.get(bot_id, ()))
+
+def _command_overview():
+    """Global status counts summed from the per-shard totals snapshots,
+    without taking any lock: each shard.totals dict is replaced, never
+    mutated, so reading it is safe from greenlets and OS threads alike"""
+    totals = Counter()
+    for shard in command_shards:
+        totals.update(shard.totals)
+    return totals
+
+def _new_command(bot_id, command_type, payload, source, batch_id=None, priority=0, run_at=None):
+    """Build a pending command, or a scheduled one if run_at is in the future"""
+    seq = next(command_counter)
     command = {
-        'id': _generate_command_id(),
+        'id': _generate_command_id(seq),
+        'seq': seq,
         'bot_id': bot_id,
         'type': command_type,
         'payload': payload or {},
+        'priority': priority,
         'status': 'pending',
         'created_at': _current_time_iso(),
         'created_by': source
     }
-    with commands_lock:
-        commands_by_bot[bot_id].append(command)
-        commands_by_id[command['id']] = command
-    socketio.emit('new_command', command, namespace='/')
+    if run_at is not None and run_at > time.time():
+        command['status'] = 'scheduled'
+        command['run_at'] = _run_at_iso(run_at)
+    if batch_id:
+        command['batch_id'] = batch_id
+    return command
+
+def _enqueue_command(bot_id, command_type, payload, source="api", priority=0, run_at=None):
+    """Enqueue a command for bot execution"""
+    shard = _shard_for(bot_id)
+    with shard.lock:
+        command = _new_command(bot_id, command_type, payload, source, priority=priority, run_at=run_at)
+        _append_command(shard, command)
+
+    emit_to_bot(bot_id, 'new_command', command)
+    _wake_bot(bot_id)
+    return command
+
+def _batch_summary(batch):
+    """Progress snapshot of a broadcast batch (command_batches_lock held)"""
+    counts = {status: n for status, n in batch['counts'].items() if n > 0}
+    return {
+        **{key: value for key, value in batch.items() if key != 'counts'},
+        'counts': counts,
+        'done': not any(counts.get(status) for status in COMMAND_OPEN_STATUSES)
+    }
+
+def _enqueue_broadcast(bot_ids, command_type, payload, user, source='broadcast', priority=0, run_at=None):
+    """Enqueue one command per bot with one lock acquisition per shard and
+    announce the batch with one summary event"""
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    batch = {
+        'id': batch_id,
+        'type': command_type,
+        'total': len(bot_ids),
+        'counts': Counter(),
+        'created_at': _current_time_iso(),
+        'created_by': user['id']
+    }
+
+    with command_batches_lock:
+        command_batches[batch_id] = batch
+        while len(command_batches) > COMMAND_BATCH_MAX:
+            command_batches.popitem(last=False)
+
+    by_shard = defaultdict(list)
+    for bot_id in bot_ids:
+        by_shard[_shard_for(bot_id)].append(bot_id)
+
+    for shard, shard_bot_ids in by_shard.items():
+        with shard.lock:
+            counts = Counter()
+            for bot_id in shard_bot_ids:
+                command = _new_command(bot_id, command_type, payload, source, batch_id=batch_id,
+                                       priority=priority, run_at=run_at)
+                counts[command['status']] += 1
+                _append_command(shard, command)
+            # Counted before the shard lock is released, i.e. before any dispatch
+            with command_batches_lock:
+                batch['counts'].update(counts)
+
+    with command_batches_lock:
+        summary = _batch_summary(batch)
+
+    for bot_id in bot_ids:
+        _wake_bot(bot_id)
+
+    _emit_recorded('command_batch', summary, [_user_room(user['id']), ADMIN_ROOM])
+    return summary
+
+def _wake_bot(bot_id):
+    """Tell a bot that commands are pending: release long polls, push to its socket"""
+    waiter = _shard_for(bot_id).waiters.get(bot_id)
+    if waiter:
+        waiter[0].set()
+    if bot_id in bot_socket_sids:
+        _push_commands(bot_id)
+
+def _requeue_expired_commands():
+    """Return dispatched commands whose visibility timeout expired to their
+    bot's pending queue, or dead-letter them after COMMAND_MAX_ATTEMPTS"""
+    now = time.monotonic()
+    requeued = set()
+    dead = []
+
+    for shard in command_shards:
+        with shard.lock:
+            while shard.inflight and shard.inflight[0][0] <= now:
+                _, command_id, attempt = shard.inflight.popleft()
+                command = commands_by_id.get(command_id)
+                # Skip acked commands and stale entries of an earlier delivery
+                if not command or command['status'] != 'dispatched' or command.get('attempts') != attempt:
+                    continue
+
+                if attempt >= COMMAND_MAX_ATTEMPTS:
+                    # Before the status change, which snapshots the row for the journal
+                    command['completed_at'] = _current_time_iso()
+                    _set_command_status(shard, command, 'dead_letter')
+                    dead.append(command)
+                else:
+                    # Keeps its priority and goes ahead of newer commands of the same priority
+                    _set_command_status(shard, command, 'pending')
+                    _push_pending(shard, command)
+                    requeued.add(command['bot_id'])
+
+    for command in dead:
+        _emit_command_update(command)
+    for bot_id in requeued:
+        _wake_bot(bot_id)
+
+    return len(requeued), len(dead)
+
+def _replay_commands():
+    """Rebuild the in-memory queues from the command table on startup"""
+    global command_counter
+
+    commands = auth_db.load_open_commands()
+    command_counter = itertools.count(auth_db.get_max_command_seq() + 1)
+
+    for command in commands:
+        shard = _shard_for(command['bot_id'])
+        with shard.lock:
+            _append_command(shard, command, journal=False)
+            if command['status'] == 'dispatched':
+                # Give the bot a full visibility timeout to ack after the restart
+                shard.inflight.append((time.monotonic() + COMMAND_VISIBILITY_TIMEOUT,
+                                       command['id'], command.get('attempts', 1)))
+
+    return len(commands)
+
+def _release_due_commands():
+    """Move scheduled commands whose run_at has passed to their bot's
+    pending queue; returns seconds until the next deadline, or None"""
+    due = []
+
+    with scheduler_lock:
+        now = time.time()
+        while scheduled_commands and scheduled_commands[0][0] <= now:
+            due.append(heapq.heappop(scheduled_commands)[2])
+
+        scheduler_wakeup.clear()
+        next_in = scheduled_commands[0][0] - now if scheduled_commands else None
+
+    due_bots = set()
+    for command_id in due:
+        command = commands_by_id.get(command_id)
+        if not command:
+            continue
+        shard = _shard_for(command['bot_id'])
+        with shard.lock:
+            if command['status'] != 'scheduled':
+                continue  # cancelled/acked while waiting
+            _set_command_status(shard, command, 'pending')
+            _push_pending(shard, command)
+        due_bots.add(command['bot_id'])
+
+    for bot_id in due_bots:
+        _wake_bot(bot_id)
+
+    return next_in
+
+def _push_commands(bot_id):
+    """Dispatch pending commands straight to a bot's /bot socket; each
+    command is acknowledged through its Socket.IO ack callback"""
+    sid = bot_socket_sids.get(bot_id)
+    if not sid:
+        return 0
+
+    shard = _shard_for(bot_id)
+    pushed = 0
+    while True:
+        with shard.lock:
+            commands = _dispatch_commands(shard, bot_id, BOT_PUSH_BATCH)
+        for command in commands:
+            socketio.emit('command', command, to=sid, namespace=BOT_NAMESPACE,
+                          callback=partial(_handle_command_ack, command['id']))
+        pushed += len(commands)
+        if len(commands) < BOT_PUSH_BATCH:
+            return pushed
+
+def _handle_command_ack(command_id, ack=None, *args):
+    """Socket.IO ack for a pushed command: {'status': ..., 'result': ...}"""
+    ack = ack if isinstance(ack, dict) else {}
+    _ack_command(command_id, ack.get('status', 'completed'), ack.get('result', {}))
+
+def _ack_command(command_id, status, result):
+    """Record a command's final status and notify dashboards"""
+    command = commands_by_id.get(command_id)
+    if not command:
+        return None
+
+    shard = _shard_for(command['bot_id'])
+    with shard.lock:
+        command['result'] = result
+        command['completed_at'] = _current_time_iso()
+        _set_command_status(shard, command, status)
+
+    _emit_command_update(command)
     return command
 
-def emit_log_to_clients(log_data):
-    """Emit log to all connected clients"""
+def _user_room(user_id):
+    return f'user:{user_id}'
+
+def _bot_room(bot_id):
+    return f'bot:{bot_id}'
+
+def _rooms_for_bot(bot_id):
+    return [_bot_room(bot_id), ADMIN_ROOM]
+
+def _join_rooms(rooms, log_batches, sid=None):
+    """Join rooms (and the matching log-format companion rooms)"""
+    log_suffix = '|new_logs' if log_batches else '|new_log'
+    for room in rooms:
+        if sid is None:
+            join_room(room)
+            join_room(room + log_suffix)
+        else:
+            socketio.server.enter_room(sid, room, namespace='/')
+            socketio.server.enter_room(sid, room + log_suffix, namespace='/')
+
+def _subscribe_user_to_bots(user_id, bot_ids):
+    """Add a user's open sockets to the rooms of newly created bots"""
+    for sid in list(user_sids.get(user_id, ())):
+        client = socket_clients.get(sid)
+        if client:
+            _join_rooms([_bot_room(bot_id) for bot_id in bot_ids], client['log_batches'], sid=sid)
+
+def _close_bot_rooms(bot_id):
+    room = _bot_room(bot_id)
+    for name in (room, room + '|new_logs', room + '|new_log'):
+        socketio.server.close_room(name, namespace='/')
+
+def _emit_recorded(event, data, rooms):
+    """Emit a dashboard event; SOCKET_REPLAY_EVENTS are tagged with their
+    event_seq and kept for replay"""
+    if event not in SOCKET_REPLAY_EVENTS:
+        socketio.emit(event, data, to=rooms, namespace='/')
+        return
+    seq = replay_ring.record(rooms, event, data)
+    socketio.emit(event, {**data, 'event_seq': seq}, to=rooms, namespace='/')
+
+def emit_to_bot(bot_id, event, data):
+    """Emit an event to the owner/admin sockets watching a bot"""
+    _emit_recorded(event, data, _rooms_for_bot(bot_id))
+
+def _log_rooms(log_data):
+    """Rooms interested in a log entry"""
+    if log_data.get('bot_id'):
+        return tuple(_rooms_for_bot(log_data['bot_id']))
+
+    user_id = (log_data.get('metadata') or {}).get('user_id')
+    if user_id is not None:
+        return (_user_room(user_id), ADMIN_ROOM)
+
+    return (ADMIN_ROOM,)
+
+def emit_logs_to_clients(batch):
+    """Emit a batch of logs to the rooms that care: one new_logs event for
+    clients that opted in (connect auth {'log_batches': true}), per-entry
+    new_log for older clients"""
     try:
-        socketio.emit('new_log', log_data, namespace='/')
+        by_rooms = defaultdict(list)
+        for log_data in batch:
+            by_rooms[_log_rooms(log_data)].append(log_data)
+
+        # event_seqs are taken group by group so they increase in emission order
+        for rooms, logs in by_rooms.items():
+            seqs = [replay_ring.record(rooms, 'new_log', log_data) for log_data in logs]
+            socketio.emit('new_logs', {'logs': logs, 'count': len(logs), 'event_seq': seqs[-1]},
+                          to=[room + '|new_logs' for room in rooms], namespace='/')
+            for seq, log_data in zip(seqs, logs):
+                socketio.emit('new_log', {**log_data, 'event_seq': seq},
+                              to=[room + '|new_log' for room in rooms], namespace='/')
     except Exception as e:
-        print(f'Error emitting log: {e}')
+        print(f'Error emitting logs: {e}')
 
-def emit_bot_update(bot_data):
-    """Emit bot update to all connected clients"""
+def emit_bot_update(bot_id, bot_data):
+    """Emit bot update to clients watching the bot"""
     try:
-        socketio.emit('bot_update', bot_data, namespace='/')
+        emit_to_bot(bot_id, 'bot_update', bot_data)
     except Exception as e:
         print(f'Error emitting bot update: {e}')
 
 def _emit_command_update(command):
     """Emit command update to clients"""
-    socketio.emit('command_update', command, namespace='/')
+    emit_to_bot(command['bot_id'], 'command_update', command)
 
 def log_worker():
-    """Background worker to process log queue"""
+    """Background worker to relay queued logs in batches"""
     while True:
         try:
-            # Sleep để tránh block CPU 100% trong vòng lặp while True
-            import time
-            time.sleep(0.1) 
-            log_data = log_queue.get(timeout=1)
-            if log_data:
-                emit_log_to_clients(log_data)
-        except queue.Empty:
-            continue
+            batch = log_queue.get_batch(LOG_BATCH_WAIT_MS / 1000)
+            emit_logs_to_clients(batch)
         except Exception as e:
             print(f'Error in log worker: {e}')
 
+def token_usage_worker():
+    """Background worker to flush bot token last_used timestamps"""
+    while True:
+        time.sleep(TOKEN_USAGE_FLUSH_INTERVAL)
+        try:
+            auth_db.flush_token_usage()
+        except Exception as e:
+            print(f'Error flushing token usage: {e}')
+
+def status_flush_worker():
+    """Background worker to flush buffered bot heartbeats"""
+    while True:
+        time.sleep(STATUS_FLUSH_INTERVAL_MS / 1000)
+        try:
+            status_buffer.flush()
+        except Exception as e:
+            print(f'Error flushing bot statuses: {e}')
+
+def command_journal_worker():
+    """Background worker to group-commit command state changes"""
+    while True:
+        time.sleep(COMMAND_FLUSH_INTERVAL_MS / 1000)
+        try:
+            command_journal.flush()
+        except Exception as e:
+            print(f'Error flushing command journal: {e}')
+
+def log_store_worker():
+    """Background worker to write buffered log records to the log store"""
+    while True:
+        time.sleep(LOG_STORE_FLUSH_INTERVAL_MS / 1000)
+        try:
+            log_store.flush()
+        except Exception as e:
+            print(f'Error flushing log store: {e}')
+
+def command_scheduler_worker():
+    """Single greenlet releasing delayed commands: sleeps until the earliest
+    run_at, or until an earlier one is scheduled"""
+    while True:
+        try:
+            next_in = _release_due_commands()
+        except Exception as e:
+            print(f'Error releasing scheduled commands: {e}')
+            next_in = 1
+        scheduler_wakeup.wait(next_in)
+
+def command_redelivery_worker():
+    """Background worker to enforce the command visibility timeout and
+    the age limit of retired commands, in memory and in the DB"""
+    next_purge = time.monotonic() + COMMAND_PURGE_INTERVAL
+    while True:
+        time.sleep(COMMAND_REDELIVERY_INTERVAL)
+        try:
+            _requeue_expired_commands()
+            for shard in command_shards:
+                with shard.lock:
+                    _enforce_command_retention(shard)
+            if time.monotonic() >= next_purge:
+                next_purge = time.monotonic() + COMMAND_PURGE_INTERVAL
+                auth_db.purge_closed_commands(COMMAND_RETENTION_SECONDS)
+        except Exception as e:
+            print(f'Error requeueing commands: {e}')
+
+def session_reaper_worker():
+    """Background worker to delete expired sessions and reset tokens"""
+    while True:
+        try:
+            reaped = auth_db.reap_expired()
+            if reaped['sessions'] or reaped['password_resets']:
+                print(f"🧹 Reaped {reaped['sessions']} sessions, {reaped['password_resets']} reset tokens")
+        except Exception as e:
+            print(f'Error reaping expired sessions: {e}')
+        time.sleep(SESSION_REAP_INTERVAL)
+
 def add_log(log_type, message, metadata=None, bot_id=None):
     """Add log entry to storage and queue"""
     log_data = {
@@ -138,8 +1109,74 @@ def add_log(log_type, message, metadata=None, bot_id=None):
         'bot_id': bot_id
     }
     logs_storage.append(log_data)
+    log_store.append(log_data)
     log_queue.put(log_data)
 
+def _parse_log_time(value):
+    """since/until as a naive UTC ISO string comparable with log timestamps;
+    accepts epoch seconds or an ISO 8601 string (UTC if naive)"""
+    try:
+        timestamp = float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    else:
+        # inf/nan or beyond year 9999: same 400 path as a malformed string
+        try:
+            parsed = datetime.fromtimestamp(timestamp, timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise ValueError(f'timestamp out of range: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+def _log_query_args():
+    """(bot_id, type, since, until) from the query string; raises ValueError"""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    return (
+        request.args.get('bot_id') or None,
+        request.args.get('type') or None,
+        _parse_log_time(since) if since else None,
+        _parse_log_time(until) if until else None
+    )
+
+def _seq_cursor_args():
+    """(since_seq, before_seq) from the query string; raises ValueError"""
+    since_seq = request.args.get('since_seq')
+    before_seq = request.args.get('before_seq')
+    return (
+        int(since_seq) if since_seq else None,
+        int(before_seq) if before_seq else None
+    )
+
+def _log_filter(log_type=None, since=None, until=None):
+    """Record predicate for type/since/until, or None when nothing is filtered"""
+    if not (log_type or since or until):
+        return None
+
+    def match(record):
+        timestamp = record.get('timestamp') or ''
+        return ((not log_type or record.get('type') == log_type)
+                and (not since or timestamp >= since)
+                and (not until or timestamp <= until))
+    return match
+
+def _page_by_seq(buffer, since_seq, before_seq, limit, bot_id=None, match=None):
+    """(records, gap) for a seq cursor request; since_seq wins if both are given"""
+    if since_seq is not None:
+        return buffer.after(since_seq, limit, bot_id, match)
+    return buffer.before(before_seq, limit, bot_id, match)
+
+def _query_logs(bot_id=None, log_type=None, since=None, until=None, limit=100):
+    """Newest `limit` matching logs: from the in-memory tail when it can
+    answer the request, otherwise from log_store"""
+    if not (log_type or since or until):
+        if not bot_id and limit <= len(logs_storage):
+            return logs_storage.tail(limit)
+        if bot_id and limit <= logs_storage.count(bot_id):
+            return logs_storage.for_bot(bot_id, limit)
+    return log_store.query(bot_id, log_type, since, until, limit)
+
 class WebLogger:
     """Logger class for bot events"""
     
@@ -204,6 +1241,11 @@ def require_auth(f):
     
     return decorated_function
 
+@app.teardown_request
+def release_db_connection(exc):
+    """Roll back and unpin a pooled connection a route left behind (e.g. on an exception)"""
+    auth_db.pool.unwind()
+
 # ==================== AUTHENTICATION ROUTES ====================
 
 @app.route('/api/auth/register', methods=['POST'])
@@ -469,6 +1511,8 @@ def api_create_my_bot(user):
     if not result['success']:
         return jsonify({'error': result['error']}), 400
     
+    _subscribe_user_to_bots(user['id'], [result['bot_id']])
+    
     add_log('event', f'New bot created: {result["bot_id"]}', {
         'bot_id': result['bot_id'],
         'user_id': user['id']
@@ -480,6 +1524,38 @@ def api_create_my_bot(user):
         'token': result['token']
     })
 
+@app.route('/api/my-bots/bulk', methods=['POST'])
+@require_auth
+def api_create_my_bots_bulk(user):
+    """Create many bots in one transaction"""
+    data = request.get_json(silent=True) or {}
+    
+    bots = data.get('bots') or data.get('names') or []
+    
+    if not isinstance(bots, list) or not bots:
+        return jsonify({'error': 'bots must be a non-empty list'}), 400
+    
+    if len(bots) > MAX_BULK_BOTS:
+        return jsonify({'error': f'At most {MAX_BULK_BOTS} bots per request'}), 400
+    
+    result = auth_db.create_bots_bulk(user['id'], bots)
+    
+    if not result['success']:
+        return jsonify({'error': result['error']}), 400
+    
+    _subscribe_user_to_bots(user['id'], [bot['bot_id'] for bot in result['bots']])
+    
+    add_log('event', f'Bulk created {result["count"]} bots', {
+        'user_id': user['id'],
+        'count': result['count']
+    })
+    
+    return jsonify({
+        'success': True,
+        'bots': result['bots'],
+        'count': result['count']
+    })
+
 @app.route('/api/my-bots/<bot_id>', methods=['GET'])
 @require_auth
 def api_get_my_bot(user, bot_id):
@@ -518,6 +1594,9 @@ def api_delete_my_bot(user, bot_id):
     if not result['success']:
         return jsonify({'error': result['error']}), 403
     
+    status_buffer.forget(bot_id)
+    _close_bot_rooms(bot_id)
+    
     add_log('event', f'Bot deleted: {bot_id}', {'bot_id': bot_id, 'user_id': user['id']})
     
     return jsonify({'success': True})
@@ -536,6 +1615,39 @@ def api_get_my_bot_data(user, bot_id):
     
     return jsonify({'data': data})
 
+def _bot_data_page_response(bot_id, collection):
+    """Build a paginated groups/friends response from query args"""
+    if collection not in SYNC_COLLECTIONS:
+        return jsonify({'error': f'Unknown collection: {collection}'}), 404
+    
+    try:
+        limit = min(max(int(request.args.get('limit', DATA_PAGE_DEFAULT)), 1), DATA_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    page = auth_db.get_bot_data_page(
+        bot_id,
+        collection,
+        cursor=request.args.get('cursor') or None,
+        limit=limit,
+        query=request.args.get('q', '').strip() or None
+    )
+    
+    return jsonify({
+        collection: page['items'],
+        'count': len(page['items']),
+        'next_cursor': page['next_cursor']
+    })
+
+@app.route('/api/my-bots/<bot_id>/data/<collection>', methods=['GET'])
+@require_auth
+def api_get_my_bot_data_page(user, bot_id, collection):
+    """Get a page of bot groups/friends"""
+    if not auth_db.verify_bot_ownership(user['id'], bot_id):
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    return _bot_data_page_response(bot_id, collection)
+
 @app.route('/api/my-bots/<bot_id>/token', methods=['GET'])
 @require_auth
 def api_get_my_bot_token(user, bot_id):
@@ -612,7 +1724,7 @@ def api_register_bot():
         'metadata': payload.get('metadata', {})
     }
     
-    emit_bot_update({'action': 'register', 'bot': bot_instances[bot_id]})
+    emit_bot_update(bot_id, {'action': 'register', 'bot': bot_instances[bot_id]})
     add_log('event', f'Bot registered: {bot_id}', {'bot_id': bot_id})
     
     return jsonify({'status': 'ok', 'bot': bot_instances[bot_id]})
@@ -623,6 +1735,10 @@ def bot_status(bot_id):
     if request.method == 'GET':
         bot = auth_db.get_bot(bot_id)
         if bot:
+            # Overlay a heartbeat that has not been flushed yet
+            buffered = status_buffer.get(bot_id)
+            if buffered:
+                bot['status'], bot['last_active'] = buffered
             return jsonify(bot)
         
         # Fallback to old in-memory system
@@ -640,11 +1756,13 @@ def bot_status(bot_id):
     
     status = payload.get('status', 'unknown')
     extra = payload.get('data', {})
+    
+    return jsonify({'status': 'ok', 'bot': _apply_bot_status(bot_id, status, extra)})
 
-    # Update in database if bot exists
-    bot = auth_db.get_bot(bot_id)
-    if bot:
-        auth_db.update_bot_status(bot_id, status)
+def _apply_bot_status(bot_id, status, extra):
+    """Record a bot heartbeat (HTTP or /bot socket) and notify dashboards"""
+    # Write-behind: the DB row is updated by the next flush (no-op if the bot is not in the DB)
+    status_buffer.record(bot_id, status)
     
     # Also update in-memory for backward compatibility
     if bot_id not in bot_instances:
@@ -665,17 +1783,32 @@ def bot_status(bot_id):
         'data': extra
     }
     
-    emit_bot_update(event_payload)
+    emit_bot_update(bot_id, event_payload)
     add_log('event', f'Bot {bot_id} status: {status}', event_payload, bot_id=bot_id)
     
-    return jsonify({'status': 'ok', 'bot': bot_instances[bot_id]})
+    return bot_instances[bot_id]
 
 @app.route('/api/logs', methods=['GET'])
 def api_get_logs():
-    """Get logs"""
-    limit = int(request.args.get('limit', 100))
-    logs = list(logs_storage)[-limit:]
-    return jsonify({'logs': logs, 'count': len(logs)})
+    """Get logs, optionally filtered by bot_id, type and since/until, or
+    paged by since_seq/before_seq"""
+    try:
+        limit = int(request.args.get('limit', 100))
+        since_seq, before_seq = _seq_cursor_args()
+        bot_id, log_type, since, until = _log_query_args()
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO 8601 or unix timestamps, '
+                                 'limit/since_seq/before_seq integers'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+
+    gap = False
+    if since_seq is not None or before_seq is not None:
+        logs, gap = _page_by_seq(logs_storage, since_seq, before_seq, limit, bot_id,
+                                 _log_filter(log_type, since, until))
+    else:
+        logs = _query_logs(bot_id, log_type, since, until, limit)
+    return jsonify({'logs': logs, 'count': len(logs), 'last_seq': logs_storage.last_seq, 'gap': gap})
 
 @app.route('/api/bot/<bot_id>/logs', methods=['POST'])
 def api_post_logs(bot_id):
@@ -699,8 +1832,17 @@ def api_post_logs(bot_id):
 def api_get_messages():
     """Get messages"""
     limit = int(request.args.get('limit', 100))
-    data = list(messages_storage)[-limit:]
-    return jsonify({'messages': data, 'count': len(data)})
+    try:
+        since_seq, before_seq = _seq_cursor_args()
+    except ValueError:
+        return jsonify({'error': 'since_seq/before_seq must be integers'}), 400
+
+    gap = False
+    if since_seq is not None or before_seq is not None:
+        data, gap = _page_by_seq(messages_storage, since_seq, before_seq, limit, request.args.get('bot_id'))
+    else:
+        data = messages_storage.tail(limit)
+    return jsonify({'messages': data, 'count': len(data), 'last_seq': messages_storage.last_seq, 'gap': gap})
 
 @app.route('/api/bot/<bot_id>/messages', methods=['POST'])
 def api_post_messages(bot_id):
@@ -719,7 +1861,7 @@ def api_post_messages(bot_id):
     }
     
     messages_storage.append(message_entry)
-    socketio.emit('new_message', message_entry, namespace='/')
+    emit_to_bot(bot_id, 'new_message', message_entry)
     
     log_metadata = {
         'author_id': message_entry['author_id'],
@@ -747,26 +1889,94 @@ def api_get_bot_data(bot_id):
     
     return jsonify({**bot_data_store[bot_id], 'source': 'memory'})
 
+@app.route('/api/bot/<bot_id>/data/<collection>', methods=['GET'])
+def api_get_bot_data_page(bot_id, collection):
+    """Get a page of bot groups/friends (?cursor=&limit=&q=)"""
+    if not auth_db.get_bot_data_hash(bot_id):
+        return jsonify({'error': 'Bot data not found'}), 404
+    
+    return _bot_data_page_response(bot_id, collection)
+
+def _sync_payload_error(payload):
+    """Why a sync payload is malformed, or None. Deltas are
+    {collection: {'added'|'changed'|'removed': [...]}}, full syncs
+    {collection: [...]}."""
+    if not isinstance(payload, dict):
+        return 'Payload must be a JSON object'
+    
+    delta = payload.get('mode') == 'delta'
+    for collection in SYNC_COLLECTIONS:
+        value = payload.get(collection)
+        if value is None:
+            continue
+        if not delta:
+            if not isinstance(value, list):
+                return f'{collection} must be a list'
+            continue
+        if not isinstance(value, dict):
+            return f'{collection} delta must be an object with added/changed/removed lists'
+        for action in ('added', 'changed', 'removed'):
+            if value.get(action) is not None and not isinstance(value[action], list):
+                return f'{collection}.{action} must be a list'
+    return None
+
 @app.route('/api/bot/<bot_id>/sync', methods=['POST'])
 def api_sync_bot_data(bot_id):
-    """Sync bot data"""
+    """Sync bot data (full payload, or a delta against the last synced hash)"""
     payload = request.get_json(silent=True) or {}
+    error = _sync_payload_error(payload)
+    if error:
+        return jsonify({'error': error}), 400
     token = payload.get('token') or request.headers.get('X-Bot-Token')
     
     # Verify bot token if provided
     if token and not auth_db.verify_bot_token(bot_id, token):
         return jsonify({'error': 'Invalid bot token'}), 401
     
-    # Save to database if bot exists
     bot = auth_db.get_bot(bot_id)
-    if bot:
-        auth_db.update_bot_data(bot_id, payload)
     
-    # Also save to in-memory store for backward compatibility
-    bot_data_store[bot_id] = {
-        'data': payload,
-        'updated_at': _current_time_iso()
-    }
+    if payload.get('mode') == 'delta':
+        if not bot:
+            return jsonify({'status': 'resync_required', 'hash': None}), 409
+        
+        changes = {collection: payload.get(collection) or {} for collection in SYNC_COLLECTIONS}
+        extra = {
+            key: value for key, value in payload.items()
+            if key not in SYNC_COLLECTIONS and key not in ('mode', 'base_hash', 'token')
+        }
+        
+        result = auth_db.apply_bot_data_delta(bot_id, payload.get('base_hash'), changes, extra)
+        
+        if not result['success']:
+            if 'hash' in result:
+                # Hash mismatch - bot must fall back to a full sync
+                return jsonify({'status': 'resync_required', 'hash': result['hash']}), 409
+            return jsonify({'error': result['error']}), 404
+        
+        records = {
+            collection: {
+                action: len(changes[collection].get(action) or [])
+                for action in ('added', 'changed', 'removed')
+            }
+            for collection in SYNC_COLLECTIONS
+        }
+    else:
+        result = {'hash': None}
+        
+        # Save to database if bot exists
+        if bot:
+            result = auth_db.update_bot_data(bot_id, payload)
+        else:
+            # In-memory store only for bots unknown to the database
+            bot_data_store[bot_id] = {
+                'data': payload,
+                'updated_at': _current_time_iso()
+            }
+        
+        records = {
+            collection: len(payload.get(collection, []) or [])
+            for collection in SYNC_COLLECTIONS
+        }
     
     bot_instances.setdefault(bot_id, {
         'id': bot_id,
@@ -776,29 +1986,53 @@ def api_sync_bot_data(bot_id):
     })
     
     add_log('event', f'Bot {bot_id} synced data', {
+        'mode': payload.get('mode', 'full'),
         'records': {
-            'groups': len(payload.get('groups', []) or []),
-            'friends': len(payload.get('friends', []) or []),
+            **records,
             'bot_id': bot_id
         }
     }, bot_id=bot_id)
     
-    socketio.emit('bot_data_sync', {'bot_id': bot_id, 'data': payload}, namespace='/')
+    emit_to_bot(bot_id, 'bot_data_sync', {
+        'bot_id': bot_id,
+        'mode': payload.get('mode', 'full'),
+        'hash': result['hash'],
+        'records': records
+    })
     
-    return jsonify({'status': 'ok'})
+    return jsonify({'status': 'ok', 'hash': result['hash']})
 
 @app.route('/api/commands', methods=['GET'])
 def api_list_commands():
-    """List all commands"""
+    """List commands, newest first (?bot_id=&cursor=&limit=)"""
     bot_id = request.args.get('bot_id')
     
-    with commands_lock:
-        if bot_id:
-            commands = list(commands_by_bot.get(bot_id, []))
-        else:
-            commands = list(commands_by_id.values())
+    try:
+        limit = min(max(int(request.args.get('limit', COMMAND_PAGE_DEFAULT)), 1), COMMAND_PAGE_MAX)
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    
+    # Both sources are ordered by seq; the cursor is the last seq already returned.
+    def page(source):
+        newest_first = reversed(source)
+        if cursor is not None:
+            newest_first = itertools.dropwhile(lambda c: c['seq'] >= cursor, newest_first)
+        return list(itertools.islice(newest_first, limit + 1))
     
-    return jsonify({'commands': commands, 'count': len(commands)})
+    if bot_id:
+        commands = page(_bot_command_history(bot_id))
+    else:
+        # Other shards insert into commands_by_id concurrently; slice it under its lock
+        with commands_by_id_lock:
+            commands = page(commands_by_id.values())
+    
+    next_cursor = None
+    if len(commands) > limit:
+        commands = commands[:limit]
+        next_cursor = str(commands[-1]['seq'])
+    
+    return jsonify({'commands': commands, 'count': len(commands), 'next_cursor': next_cursor})
 
 @app.route('/api/commands', methods=['POST'])
 def api_create_command():
@@ -810,24 +2044,132 @@ def api_create_command():
     if not bot_id or not command_type:
         return jsonify({'error': 'bot_id and type are required'}), 400
     
-    command = _enqueue_command(bot_id, command_type, payload.get('payload', {}), source='api')
+    try:
+        priority, run_at = _command_options(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    command = _enqueue_command(bot_id, command_type, payload.get('payload', {}), source='api',
+                               priority=priority, run_at=run_at)
     
     return jsonify({'status': 'queued', 'command': command})
 
+@app.route('/api/commands/broadcast', methods=['POST'])
+@require_auth
+def api_broadcast_command(user):
+    """Send the same command to many bots (explicit bot_ids and/or a selector)"""
+    payload = request.get_json(silent=True) or {}
+    command_type = payload.get('type')
+    bot_ids = payload.get('bot_ids')
+    selector = payload.get('selector') or {}
+    
+    if not command_type:
+        return jsonify({'error': 'Command type is required'}), 400
+    if bot_ids is None and not selector:
+        return jsonify({'error': 'bot_ids or selector is required'}), 400
+    if bot_ids is not None and (not isinstance(bot_ids, list) or len(bot_ids) > MAX_BULK_BOTS):
+        return jsonify({'error': f'bot_ids must be a list of at most {MAX_BULK_BOTS} bot IDs'}), 400
+    if not isinstance(selector, dict):
+        return jsonify({'error': 'selector must be an object'}), 400
+    for key in ('owner_id', 'status', 'tag'):
+        value = selector.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int))):
+            return jsonify({'error': f'selector.{key} must be a string or integer'}), 400
+    try:
+        priority, run_at = _command_options(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    targets = auth_db.select_bots(
+        user['id'],
+        is_admin=user.get('role') == 'admin',
+        bot_ids=[str(bot_id) for bot_id in bot_ids] if bot_ids is not None else None,
+        owner_id=selector.get('owner_id'),
+        status=selector.get('status'),
+        tag=selector.get('tag')
+    )
+    
+    if not targets:
+        return jsonify({'error': 'No matching bots'}), 404
+    if len(targets) > MAX_BULK_BOTS:
+        return jsonify({'error': f'Selector matches more than {MAX_BULK_BOTS} bots'}), 400
+    
+    batch = _enqueue_broadcast(targets, command_type, payload.get('payload', {}), user,
+                               priority=priority, run_at=run_at)
+    
+    add_log('event', f'Command broadcast: {command_type} to {len(targets)} bots', {
+        'batch_id': batch['id'],
+        'command_type': command_type,
+        'user_id': user['id']
+    })
+    
+    skipped = []
+    if bot_ids is not None:
+        selected = set(targets)
+        skipped = [bot_id for bot_id in bot_ids if str(bot_id) not in selected]
+    
+    return jsonify({'status': 'queued', 'batch': batch, 'count': len(targets), 'skipped': skipped})
+
+@app.route('/api/commands/batches/<batch_id>', methods=['GET'])
+@require_auth
+def api_get_command_batch(user, batch_id):
+    """Get aggregate progress of a broadcast batch"""
+    with command_batches_lock:
+        batch = command_batches.get(batch_id)
+        summary = _batch_summary(batch) if batch else None
+    
+    if not summary:
+        return jsonify({'error': 'Batch not found'}), 404
+    if summary['created_by'] != user['id'] and user.get('role') != 'admin':
+        return jsonify({'error': 'Not authorized'}), 403
+    
+    return jsonify({'batch': summary})
+
 @app.route('/api/bot/<bot_id>/commands', methods=['GET'])
 def api_get_commands(bot_id):
-    """Get pending commands for bot"""
-    limit = int(request.args.get('limit', 10))
-    
-    with commands_lock:
-        pending = []
-        for command in commands_by_bot.get(bot_id, []):
-            if command['status'] == 'pending':
-                command['status'] = 'dispatched'
-                command['dispatched_at'] = _current_time_iso()
-                pending.append(command)
-            if len(pending) >= limit:
+    """Get pending commands for bot, optionally long-polling with ?wait=<seconds>"""
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = None
+    # min()/max() pass NaN through, and a NaN wait never times out
+    if wait is None or not math.isfinite(wait):
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    wait = min(max(wait, 0), COMMAND_WAIT_MAX)
+    
+    shard = _shard_for(bot_id)
+    with shard.lock:
+        pending = _dispatch_commands(shard, bot_id, limit)
+        if pending or wait <= 0:
+            return jsonify({'commands': pending, 'count': len(pending)})
+        
+        waiter = shard.waiters.setdefault(bot_id, [Event(), 0])
+        waiter[1] += 1
+    
+    deadline = time.monotonic() + wait
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not waiter[0].wait(remaining):
                 break
+            
+            with shard.lock:
+                pending = _dispatch_commands(shard, bot_id, limit)
+                if pending:
+                    break
+                # Another poller took the commands; sleep until the next enqueue
+                waiter[0].clear()
+    finally:
+        with shard.lock:
+            waiter[1] -= 1
+            if waiter[1] == 0:
+                shard.waiters.pop(bot_id, None)
+            elif not shard.pending.get(bot_id):
+                waiter[0].clear()
     
     return jsonify({'commands': pending, 'count': len(pending)})
 
@@ -838,16 +2180,9 @@ def api_ack_command(command_id):
     status = payload.get('status', 'completed')
     extra = payload.get('result', {})
 
-    with commands_lock:
-        command = commands_by_id.get(command_id)
-        if not command:
-            return jsonify({'error': 'Command not found'}), 404
-        
-        command['status'] = status
-        command['result'] = extra
-        command['completed_at'] = _current_time_iso()
-
-    _emit_command_update(command)
+    command = _ack_command(command_id, status, extra)
+    if not command:
+        return jsonify({'error': 'Command not found'}), 404
     
     return jsonify({'status': 'ok', 'command': command})
 
@@ -930,6 +2265,28 @@ def api_admin_get_all_bots(user):
     bots = auth_db.get_all_bots()
     return jsonify({'bots': bots, 'count': len(bots)})
 
+@app.route('/api/admin/runtime-stats', methods=['GET'])
+@require_auth
+def api_admin_runtime_stats(user):
+    """Get internal cache/pool counters (admin only)"""
+    if user.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+
+    return jsonify({
+        'session_cache': auth_db.session_cache.get_stats(),
+        'db_pool': dict(auth_db.pool.stats),
+        'status_buffer': dict(status_buffer.stats),
+        'reaper': dict(auth_db.reap_stats),
+        'log_relay': {**log_queue.stats, 'queued': log_queue.qsize(), 'max_size': log_queue.maxsize},
+        'command_journal': {**command_journal.stats, 'unflushed': command_journal.pending(),
+                            'inflight': sum(len(shard.inflight) for shard in command_shards),
+                            'in_memory': len(commands_by_id),
+                            'retired': sum(len(shard.retired) for shard in command_shards)},
+        'log_store': log_store.get_stats(),
+        'socket_replay': {**replay_ring.stats, 'buffered': len(replay_ring),
+                          'bytes': replay_ring.size_bytes(), 'last_seq': replay_ring.last_seq}
+    })
+
 @app.route('/api/bot/<bot_id>/info', methods=['GET'])
 @require_auth
 def api_get_bot_info(user, bot_id):
@@ -943,15 +2300,9 @@ def api_get_bot_info(user, bot_id):
         return jsonify({'error': 'Bot not found'}), 404
     
     # Get bot stats
-    with commands_lock:
-        bot_commands = list(commands_by_bot.get(bot_id, []))
-    
-    stats = {
-        'total_commands': len(bot_commands),
-        'pending_commands': len([c for c in bot_commands if c['status'] == 'pending']),
-        'completed_commands': len([c for c in bot_commands if c['status'] == 'completed']),
-        'failed_commands': len([c for c in bot_commands if c['status'] == 'failed'])
-    }
+    shard = _shard_for(bot_id)
+    with shard.lock:
+        stats = _bot_command_stats(shard, bot_id)
     
     return jsonify({
         'bot': bot,
@@ -968,8 +2319,7 @@ def api_get_bot_commands_history(user, bot_id):
     
     limit = int(request.args.get('limit', 50))
     
-    with commands_lock:
-        commands = list(commands_by_bot.get(bot_id, []))[-limit:]
+    commands = _bot_command_history(bot_id)[-limit:]
     
     return jsonify({'commands': commands, 'count': len(commands)})
 
@@ -988,7 +2338,13 @@ def api_send_bot_command(user, bot_id):
     if not command_type:
         return jsonify({'error': 'Command type is required'}), 400
     
-    command = _enqueue_command(bot_id, command_type, command_payload, source='api')
+    try:
+        priority, run_at = _command_options(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    command = _enqueue_command(bot_id, command_type, command_payload, source='api',
+                               priority=priority, run_at=run_at)
     
     add_log('event', f'Command sent to bot: {command_type}', {
         'bot_id': bot_id,
@@ -1073,9 +2429,9 @@ def api_stats_overview(user):
     
     conn.close()
     
-    with commands_lock:
-        total_commands = len(commands_by_id)
-        pending_commands = len([c for c in commands_by_id.values() if c['status'] == 'pending'])
+    command_totals = _command_overview()
+    total_commands = sum(command_totals.values())
+    pending_commands = command_totals['pending']
     
     return jsonify({
         'total_users': total_users,
@@ -1095,139 +2451,330 @@ def api_stats_bot(user, bot_id):
     if not auth_db.verify_bot_ownership(user['id'], bot_id) and user.get('role') != 'admin':
         return jsonify({'error': 'Not authorized'}), 403
     
-    with commands_lock:
-        bot_commands = list(commands_by_bot.get(bot_id, []))
-    
-    # Count logs
-    bot_logs = [log for log in logs_storage if log.get('bot_id') == bot_id]
-    
-    # Count messages
-    bot_messages = [msg for msg in messages_storage if msg.get('bot_id') == bot_id]
+    shard = _shard_for(bot_id)
+    with shard.lock:
+        command_stats = _bot_command_stats(shard, bot_id)
+        command_types = {
+            cmd_type: count
+            for cmd_type, count in shard.types.get(bot_id, Counter()).items()
+            if count > 0
+        }
     
     stats = {
-        'total_commands': len(bot_commands),
-        'pending_commands': len([c for c in bot_commands if c['status'] == 'pending']),
-        'completed_commands': len([c for c in bot_commands if c['status'] == 'completed']),
-        'failed_commands': len([c for c in bot_commands if c['status'] == 'failed']),
-        'total_logs': len(bot_logs),
-        'total_messages': len(bot_messages),
-        'command_types': {}
+        **command_stats,
+        'total_logs': log_store.count(bot_id),
+        'total_messages': messages_storage.count(bot_id),
+        'command_types': command_types
     }
     
-    # Count by command type
-    for cmd in bot_commands:
-        cmd_type = cmd['type']
-        stats['command_types'][cmd_type] = stats['command_types'].get(cmd_type, 0) + 1
-    
     return jsonify(stats)
 
 # ==================== DATA EXPORT APIS ====================
 
+def _chunked(records):
+    """Lists of up to EXPORT_CHUNK_RECORDS records from any iterable"""
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_RECORDS))
+        if not chunk:
+            return
+        yield chunk
+
+def _ndjson_chunks(records):
+    for chunk in _chunked(records):
+        yield ''.join(app.json.dumps(record) + '\n' for record in chunk)
+
+def _json_chunks(document, list_keys):
+    """Serialize a JSON object piecewise, writing the lists under list_keys
+    EXPORT_CHUNK_RECORDS records at a time"""
+    head = {key: value for key, value in document.items() if key not in list_keys}
+    yield app.json.dumps(head)[:-1]  # keep the object open
+    separator = ', ' if head else ''
+    for key in list_keys:
+        yield f'{separator}"{key}": ['
+        separator = ', '
+        for index, chunk in enumerate(_chunked(document[key])):
+            yield (', ' if index else '') + ', '.join(app.json.dumps(record) for record in chunk)
+        yield ']'
+    yield '}'
+
+def _export_response(chunks, mimetype):
+    """Stream str chunks, gzip-compressed on the fly if the client accepts it.
+    Yields to other greenlets between chunks."""
+    use_gzip = request.accept_encodings['gzip'] > 0
+
+    def generate():
+        compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if use_gzip else None
+        first = True
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            if compressor:
+                data = compressor.compress(data)
+                if first:
+                    data += compressor.flush(zlib.Z_SYNC_FLUSH)  # first bytes out without waiting for a full block
+            first = False
+            if data:
+                yield data
+            time.sleep(0)
+        if compressor:
+            yield compressor.flush()
+
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _export_format():
+    """?format= of an export request; raises ValueError"""
+    export_format = request.args.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return export_format
+
 @app.route('/api/export/logs', methods=['GET'])
 @require_auth
 def api_export_logs(user):
-    """Export logs as JSON"""
-    bot_id = request.args.get('bot_id')
-    limit = int(request.args.get('limit', 1000))
+    """Export logs as JSON or NDJSON, optionally filtered by bot_id, type and since/until"""
+    try:
+        export_format = _export_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        limit = int(request.args.get('limit', 1000))
+        bot_id, log_type, since, until = _log_query_args()
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO 8601 or unix timestamps, limit an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
     
     if bot_id:
         # Check authorization
         if not auth_db.verify_bot_ownership(user['id'], bot_id) and user.get('role') != 'admin':
             return jsonify({'error': 'Not authorized'}), 403
-        
-        logs = [log for log in logs_storage if log.get('bot_id') == bot_id]
-    else:
-        logs = list(logs_storage)
     
-    logs = logs[-limit:]
+    if export_format == 'ndjson':
+        # Without an explicit limit, stream every matching stored log, oldest first
+        if 'limit' in request.args:
+            logs = _query_logs(bot_id, log_type, since, until, limit)
+        else:
+            logs = log_store.iter_records(bot_id, log_type, since, until)
+        return _export_response(_ndjson_chunks(logs), 'application/x-ndjson')
     
-    return jsonify({
-        'exported_at': _current_time_iso(),
+    logs = _query_logs(bot_id, log_type, since, until, limit)
+    
+    return _export_response(_json_chunks({
         'count': len(logs),
+        'exported_at': _current_time_iso(),
         'logs': logs
-    })
+    }, ['logs']), 'application/json')
 
 @app.route('/api/export/messages', methods=['GET'])
 @require_auth
 def api_export_messages(user):
-    """Export messages as JSON"""
+    """Export messages as JSON or NDJSON"""
     bot_id = request.args.get('bot_id')
     limit = int(request.args.get('limit', 1000))
+    try:
+        export_format = _export_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     if bot_id:
         # Check authorization
         if not auth_db.verify_bot_ownership(user['id'], bot_id) and user.get('role') != 'admin':
             return jsonify({'error': 'Not authorized'}), 403
         
-        messages = [msg for msg in messages_storage if msg.get('bot_id') == bot_id]
+        messages = messages_storage.for_bot(bot_id, limit)
     else:
-        messages = list(messages_storage)
+        messages = messages_storage.tail(limit)
     
-    messages = messages[-limit:]
+    if export_format == 'ndjson':
+        return _export_response(_ndjson_chunks(messages), 'application/x-ndjson')
     
-    return jsonify({
-        'exported_at': _current_time_iso(),
+    return _export_response(_json_chunks({
         'count': len(messages),
+        'exported_at': _current_time_iso(),
         'messages': messages
-    })
+    }, ['messages']), 'application/json')
 
 @app.route('/api/export/bot-data/<bot_id>', methods=['GET'])
 @require_auth
 def api_export_bot_data(user, bot_id):
-    """Export bot data"""
+    """Export bot data as JSON or NDJSON"""
     if not auth_db.verify_bot_ownership(user['id'], bot_id) and user.get('role') != 'admin':
         return jsonify({'error': 'Not authorized'}), 403
     
+    try:
+        export_format = _export_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     bot = auth_db.get_bot(bot_id)
     if not bot:
         return jsonify({'error': 'Bot not found'}), 404
     
     bot_data = auth_db.get_bot_data(bot_id)
     
-    with commands_lock:
-        commands = list(commands_by_bot.get(bot_id, []))
-    
-    logs = [log for log in logs_storage if log.get('bot_id') == bot_id]
-    messages = [msg for msg in messages_storage if msg.get('bot_id') == bot_id]
+    commands = _bot_command_history(bot_id)
+    messages = messages_storage.for_bot(bot_id)
+    # Both formats stream the bot's full history from the persistent store
+    logs = log_store.iter_records(bot_id)
+    
+    if export_format == 'ndjson':
+        # One {"section", "record"} line per item
+        sections = itertools.chain(
+            [('export', {'exported_at': _current_time_iso()}), ('bot', bot), ('data', bot_data)],
+            (('command', command) for command in commands),
+            (('log', log) for log in logs),
+            (('message', message) for message in messages)
+        )
+        return _export_response(
+            _ndjson_chunks({'section': section, 'record': record} for section, record in sections),
+            'application/x-ndjson'
+        )
     
-    return jsonify({
-        'exported_at': _current_time_iso(),
+    return _export_response(_json_chunks({
         'bot': bot,
         'data': bot_data,
+        'exported_at': _current_time_iso(),
         'commands': commands,
-        'logs': list(logs),
-        'messages': list(messages)
-    })
+        'logs': logs,
+        'messages': messages
+    }, ['commands', 'logs', 'messages']), 'application/json')
 
 # ==================== SOCKETIO HANDLERS ====================
 
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle client connection"""
     client_id = request.sid
     connected_clients.add(client_id)
+    
+    # Clients that understand batched new_logs events say so in the connect auth payload
+    log_batches = isinstance(auth, dict) and bool(auth.get('log_batches'))
+    
+    # Authenticate with the dashboard session cookie and join only the
+    # rooms this user may see
+    user = None
+    session_token = request.cookies.get('session_token')
+    if session_token:
+        user = auth_db.validate_session(session_token)
+    
+    if user:
+        rooms = [_user_room(user['id'])]
+        if user.get('role') == 'admin':
+            rooms.append(ADMIN_ROOM)
+            bots = None
+        else:
+            bots = auth_db.get_user_bots(user['id'])
+            rooms.extend(_bot_room(bot['id']) for bot in bots)
+        _join_rooms(rooms, log_batches)
+        
+        socket_clients[client_id] = {'user_id': user['id'], 'log_batches': log_batches}
+        user_sids[user['id']].add(client_id)
+    
     print(f'✅ Client connected: {client_id}')
     
     socketio.emit('connection_established', {
         'status': 'connected',
         'client_id': client_id,
+        'authenticated': user is not None,
+        'event_seq': replay_ring.last_seq,
         'timestamp': _current_time_iso()
-    })
+    }, to=client_id)
+    
+    # A reconnecting client sends the last event_seq it saw: replay what it
+    # missed in one batch, or a snapshot if the ring no longer covers the gap
+    last_seq = auth.get('last_seq') if isinstance(auth, dict) else None
+    if user and last_seq is not None:
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            return
+        _replay_to_client(client_id, user, rooms, bots, last_seq)
+
+def _replay_to_client(sid, user, rooms, bots, last_seq):
+    """Send a reconnecting client the events it missed, or a snapshot"""
+    events = replay_ring.since(last_seq, rooms)
+    if events is not None:
+        replay_ring.stats['replays'] += 1
+        replay_ring.stats['replayed_events'] += len(events)
+        socketio.emit('replay', {
+            'events': events,
+            'count': len(events),
+            'event_seq': events[-1]['event_seq'] if events else last_seq
+        }, to=sid)
+        return
+    
+    replay_ring.stats['snapshots'] += 1
+    socketio.emit('snapshot', _dashboard_snapshot(user, bots), to=sid)
+
+def _dashboard_snapshot(user, bots):
+    """Current bots plus the latest logs and messages a user may see"""
+    event_seq = replay_ring.last_seq
+    if bots is None:
+        bots = auth_db.get_all_bots()
+        logs = logs_storage.tail(SOCKET_SNAPSHOT_LIMIT)
+        messages = messages_storage.tail(SOCKET_SNAPSHOT_LIMIT)
+    else:
+        bots = [{key: value for key, value in bot.items() if key != 'token'} for bot in bots]
+        logs = _latest_for_bots(logs_storage, bots)
+        messages = _latest_for_bots(messages_storage, bots)
+    
+    for bot in bots:
+        live = bot_instances.get(bot['id'])
+        if live and live.get('status'):
+            bot['status'] = live['status']
+    
+    return {
+        'event_seq': event_seq,
+        'bots': bots,
+        'logs': logs,
+        'messages': messages,
+        'timestamp': _current_time_iso()
+    }
+
+def _latest_for_bots(buffer, bots):
+    """Newest SOCKET_SNAPSHOT_LIMIT records of the given bots, oldest first"""
+    per_bot = [buffer.for_bot(bot['id'], SOCKET_SNAPSHOT_LIMIT) for bot in bots]
+    merged = list(heapq.merge(*per_bot, key=_record_seq))
+    return merged[-SOCKET_SNAPSHOT_LIMIT:]
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
     client_id = request.sid
     connected_clients.discard(client_id)
+    
+    client = socket_clients.pop(client_id, None)
+    if client:
+        sids = user_sids.get(client['user_id'])
+        if sids is not None:
+            sids.discard(client_id)
+            if not sids:
+                del user_sids[client['user_id']]
+    
     print(f'❌ Client disconnected: {client_id}')
 
 @socketio.on('send_message')
 def handle_send_message(data):
     """Handle send message request from client"""
+    client_id = request.sid
     bot_id = data.get('bot_id')
     
     if not bot_id:
-        socketio.emit('message_sent', {'status': 'error', 'error': 'bot_id required'})
+        socketio.emit('message_sent', {'status': 'error', 'error': 'bot_id required'}, to=client_id)
+        return
+    
+    client = socket_clients.get(client_id)
+    if not client:
+        socketio.emit('message_sent', {'status': 'error', 'error': 'Not authenticated'}, to=client_id)
+        return
+    
+    user = auth_db.get_user_by_id(client['user_id'])
+    if not user or (user.get('role') != 'admin' and not auth_db.verify_bot_ownership(user['id'], bot_id)):
+        socketio.emit('message_sent', {'status': 'error', 'error': 'Not authorized'}, to=client_id)
         return
 
     payload = {
@@ -1244,7 +2791,65 @@ def handle_send_message(data):
         'status': 'queued',
         'command_id': command['id'],
         'timestamp': _current_time_iso()
-    })
+    }, to=client_id)
+
+# ==================== BOT SOCKETIO NAMESPACE ====================
+
+@socketio.on('connect', namespace=BOT_NAMESPACE)
+def handle_bot_connect(auth=None):
+    """Authenticate a bot socket once, then push its pending commands"""
+    auth = auth if isinstance(auth, dict) else {}
+    bot_id = str(auth.get('bot_id') or '').strip()
+    token = str(auth.get('token') or '').strip()
+    
+    if not bot_id or not token or not auth_db.verify_bot_token(bot_id, token):
+        raise ConnectionRefusedError('Invalid bot credentials')
+    
+    # A reconnecting bot replaces its previous socket
+    old_sid = bot_socket_sids.get(bot_id)
+    if old_sid:
+        bot_socket_ids.pop(old_sid, None)
+    bot_socket_sids[bot_id] = request.sid
+    bot_socket_ids[request.sid] = bot_id
+    
+    socketio.emit('connection_established', {
+        'status': 'connected',
+        'bot_id': bot_id,
+        'timestamp': _current_time_iso()
+    }, to=request.sid, namespace=BOT_NAMESPACE)
+    
+    # Deliver whatever queued up while the bot was away
+    socketio.start_background_task(_push_commands, bot_id)
+
+@socketio.on('disconnect', namespace=BOT_NAMESPACE)
+def handle_bot_disconnect():
+    """Forget a bot socket"""
+    bot_id = bot_socket_ids.pop(request.sid, None)
+    if bot_id and bot_socket_sids.get(bot_id) == request.sid:
+        del bot_socket_sids[bot_id]
+
+@socketio.on('status', namespace=BOT_NAMESPACE)
+def handle_bot_status(data=None):
+    """Status heartbeat over the bot socket: {'status': ..., 'data': {...}}"""
+    bot_id = bot_socket_ids.get(request.sid)
+    if not bot_id:
+        return {'status': 'error', 'error': 'Not authenticated'}
+    
+    data = data if isinstance(data, dict) else {}
+    _apply_bot_status(bot_id, data.get('status', 'unknown'), data.get('data', {}))
+    return {'status': 'ok'}
+
+@socketio.on('command_ack', namespace=BOT_NAMESPACE)
+def handle_bot_command_ack(data=None):
+    """Late ack for a pushed command: {'command_id': ..., 'status': ..., 'result': ...}"""
+    bot_id = bot_socket_ids.get(request.sid)
+    data = data if isinstance(data, dict) else {}
+    command = commands_by_id.get(data.get('command_id'))
+    if not bot_id or not command or command['bot_id'] != bot_id:
+        return {'status': 'error', 'error': 'Command not found'}
+    
+    _ack_command(command['id'], data.get('status', 'completed'), data.get('result', {}))
+    return {'status': 'ok'}
 
 # ==================== FILE SERVING ====================
 
@@ -1288,12 +2893,43 @@ def start_web_server(host='0.0.0.0', port=5000, debug=False):
     log_thread = threading.Thread(target=log_worker, daemon=True)
     log_thread.start()
 
+    # Bot token last_used flush thread
+    token_usage_thread = threading.Thread(target=token_usage_worker, daemon=True)
+    token_usage_thread.start()
+    atexit.register(auth_db.flush_token_usage)
+
+    # Bot heartbeat write-behind flush thread
+    status_flush_thread = threading.Thread(target=status_flush_worker, daemon=True)
+    status_flush_thread.start()
+    atexit.register(status_buffer.flush)
+
+    # Expired session / reset token reaper thread
+    reaper_thread = threading.Thread(target=session_reaper_worker, daemon=True)
+    reaper_thread.start()
+
+    # Durable command queue: replay, group commit and redelivery threads
+    replayed = _replay_commands()
+    purged = auth_db.purge_closed_commands(COMMAND_RETENTION_SECONDS)
+    command_journal_thread = threading.Thread(target=command_journal_worker, daemon=True)
+    command_journal_thread.start()
+    atexit.register(command_journal.flush)
+    redelivery_thread = threading.Thread(target=command_redelivery_worker, daemon=True)
+    redelivery_thread.start()
+    scheduler_thread = threading.Thread(target=command_scheduler_worker, daemon=True)
+    scheduler_thread.start()
+
+    # Persistent log store write-behind thread
+    log_store_thread = threading.Thread(target=log_store_worker, daemon=True)
+    log_store_thread.start()
+    atexit.register(log_store.flush)
+
     print(f'\n🌐 Starting Web Server...')
     print(f'🔗 URL: http://{host}:{port}')
     print(f'📁 Serving files from: {web_dir}')
     print(f'🔐 Authentication: Enabled (SQLite)')
     print(f'💾 Database: data/users.db')
     print(f'🤖 Bot Management: Enabled')
+    print(f'📬 Commands replayed: {replayed} (purged {purged} closed)')
     print('=' * 50)
 
     # Create web directory if not exists